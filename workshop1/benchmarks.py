@@ -0,0 +1,423 @@
+# End-to-End Performance Benchmarks (against the local mock server)
+
+"""
+demo for:
+- Driving the real exercise code paths (exercise3, exercise4_enhanced, exercise6_enhanced,
+  exercise7, exercise8_advanced) against workshop1.mock_openai_server — no quota, no credentials
+- Throughput, p50/p95/p99 latency, error counts and peak Python memory per scenario
+- Injected latency, 429s and 5xx errors to see how each path behaves under pressure
+- Every run is appended to a JSONL results file so runs can be compared over time
+
+Usage:
+    python -m workshop1.benchmarks --requests 200 --concurrency 8 --label baseline
+    python -m workshop1.benchmarks --scenarios exercise7,exercise8_advanced --rate-429 0.05 --compare
+    python -m workshop1.benchmarks --list
+    python -m workshop1.benchmarks --async-scaling --concurrency 32 --latency fixed:0.1
+"""
+
+import argparse
+import asyncio
+import builtins
+import contextlib
+import importlib
+import io
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import types
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Callable, Optional
+from workshop1.mock_openai_server import MockOpenAIServer, start_mock_server, mock_credentials
+
+# -------------------------
+# Configuration
+# -------------------------
+
+DEFAULT_RESULTS_PATH = "bench_results.jsonl"
+DEFAULT_REQUESTS = 100
+DEFAULT_CONCURRENCY = 8
+MOCK_DEPLOYMENT = "mock-deployment"
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SAMPLE_INCIDENTS = [
+    "Production database is down; no connections possible for any app.",
+    "Some users cannot reach the VPN, intermittent timeouts since this morning.",
+    "The intranet homepage is slightly slow to load for a single user.",
+    "Payments API returns 503 for all users after the last deploy.",
+    "Disk almost full on the reporting server, jobs are degraded.",
+    "Printer on floor 3 shows a cosmetic error message but prints fine.",
+]
+
+CHAT_TURNS = [
+    "My laptop will not connect to the office wifi.",
+    "It is a Windows 11 Dell laptop, other devices connect fine.",
+    "I already restarted it twice.",
+    "show history",
+    "quit",
+]
+
+
+# -------------------------
+# Pointing the exercises at the mock
+# -------------------------
+
+def install_mock_config(server: MockOpenAIServer) -> None:
+    """
+    Make common.bc_config hand out mock credentials. Must run before any exercise
+    module is imported: they build their clients at import time. On a machine
+    without the workshop config, an in-memory stand-in is registered instead.
+    """
+    def get_api_credentials() -> Dict[str, str]:
+        return mock_credentials(server)
+
+    def get_model_deployment_name() -> str:
+        return MOCK_DEPLOYMENT
+
+    try:
+        config = importlib.import_module("common.bc_config")
+    except ImportError:
+        package = sys.modules.setdefault("common", types.ModuleType("common"))
+        package.__path__ = getattr(package, "__path__", [])
+        config = types.ModuleType("common.bc_config")
+        config.get_email_receiver = lambda: "oncall@example.com"
+        config.get_email_api_info = lambda: (server.url + "/email", "mock-key")
+        sys.modules["common.bc_config"] = config
+        package.bc_config = config
+    config.get_api_credentials = get_api_credentials
+    config.get_model_deployment_name = get_model_deployment_name
+
+
+# -------------------------
+# Scenarios
+# -------------------------
+# Each scenario returns one operation: a callable taking the request index.
+
+def scenario_exercise3(args: argparse.Namespace) -> Callable[[int], Any]:
+    ex = importlib.import_module("workshop1.exercise3")
+    return lambda i: ex.basic_it_support(SAMPLE_INCIDENTS[i % len(SAMPLE_INCIDENTS)])
+
+
+def scenario_exercise4_enhanced(args: argparse.Namespace) -> Callable[[int], Any]:
+    """One operation = one scripted chat session (input() is patched, so always sequential)."""
+    ex = importlib.import_module("workshop1.exercise4_enhanced")
+
+    def op(i: int) -> None:
+        turns = iter(CHAT_TURNS)
+        original = builtins.input
+        builtins.input = lambda prompt="": next(turns)
+        try:
+            ex.run_chat_loop()
+        finally:
+            builtins.input = original
+    return op
+
+
+def scenario_exercise6_enhanced(args: argparse.Namespace) -> Callable[[int], Any]:
+    ex = importlib.import_module("workshop1.exercise6_enhanced")
+    ex.USE_RESPONSE_CACHE = args.use_shortcuts
+    return lambda i: ex.improved_it_support_json(ex.prompt + f"\n(request {i})")
+
+
+def _exercise7(args: argparse.Namespace) -> types.ModuleType:
+    ex = importlib.import_module("workshop1.exercise7")
+    # Measure the LLM path unless asked to keep the cache / fast path / dedup shortcuts
+    ex.USE_RESPONSE_CACHE = args.use_shortcuts
+    ex.USE_FAST_PATH = args.use_shortcuts
+    ex.USE_DEDUP = args.use_shortcuts
+    return ex
+
+
+def scenario_exercise7(args: argparse.Namespace) -> Callable[[int], Any]:
+    ex = _exercise7(args)
+    return lambda i: ex.run_workflow(f"{SAMPLE_INCIDENTS[i % len(SAMPLE_INCIDENTS)]} (#{i})",
+                                     ex.DEFAULT_TEMPERATURE, ex.DEFAULT_MAX_TOKENS)
+
+
+def scenario_exercise7_streaming(args: argparse.Namespace) -> Callable[[int], Any]:
+    ex = _exercise7(args)
+    return lambda i: ex.run_workflow_streaming(f"{SAMPLE_INCIDENTS[i % len(SAMPLE_INCIDENTS)]} (#{i})",
+                                               ex.DEFAULT_TEMPERATURE, ex.DEFAULT_MAX_TOKENS)
+
+
+def scenario_exercise8_advanced(args: argparse.Namespace) -> Callable[[int], Any]:
+    ex = importlib.import_module("workshop1.exercise8_advanced")
+    return lambda i: ex.call_triage_llm_with_tools(SAMPLE_INCIDENTS[i % len(SAMPLE_INCIDENTS)],
+                                                   ex.DEFAULT_TEMPERATURE, ex.DEFAULT_MAX_TOKENS)
+
+
+SCENARIOS: Dict[str, Callable[[argparse.Namespace], Callable[[int], Any]]] = {
+    "exercise3": scenario_exercise3,
+    "exercise4_enhanced": scenario_exercise4_enhanced,
+    "exercise6_enhanced": scenario_exercise6_enhanced,
+    "exercise7": scenario_exercise7,
+    "exercise7_streaming": scenario_exercise7_streaming,
+    "exercise8_advanced": scenario_exercise8_advanced,
+}
+
+# input() is process-wide: these scenarios always run with concurrency 1
+SEQUENTIAL_SCENARIOS = {"exercise4_enhanced"}
+
+
+# -------------------------
+# Runner
+# -------------------------
+
+def run_scenario(name: str, op: Callable[[int], Any], requests: int, concurrency: int,
+                 server: MockOpenAIServer, track_memory: bool = True) -> Dict[str, Any]:
+    """Run `requests` operations on `concurrency` threads; exercise output is discarded."""
+    from workshop1.exercise7_batch import percentile
+
+    latencies: List[float] = []
+    errors: Dict[str, int] = {}
+    lock = threading.Lock()
+
+    def timed(i: int) -> None:
+        started = time.perf_counter()
+        try:
+            op(i)
+        except BaseException as e:   # the exercises sys.exit() on API errors
+            with lock:
+                key = type(e).__name__
+                errors[key] = errors.get(key, 0) + 1
+            return
+        elapsed = time.perf_counter() - started
+        with lock:
+            latencies.append(elapsed * 1000)
+
+    before = server.snapshot_stats()
+    if track_memory:
+        tracemalloc.start()
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(timed, range(requests)))
+    elapsed = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1] if track_memory else None
+    if track_memory:
+        tracemalloc.stop()
+    after = server.snapshot_stats()
+
+    latencies.sort()
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "succeeded": len(latencies),
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_per_s": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "mean_ms": round(sum(latencies) / len(latencies), 1) if latencies else 0.0,
+        "p50_ms": round(percentile(latencies, 50), 1),
+        "p95_ms": round(percentile(latencies, 95), 1),
+        "p99_ms": round(percentile(latencies, 99), 1),
+        "peak_traced_kb": round(peak / 1024, 1) if peak is not None else None,
+        "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "server": {k: after.get(k, 0) - before.get(k, 0) for k in after},
+    }
+
+
+async def _async_scaling(sizes: List[int], concurrency: int) -> List[Dict[str, Any]]:
+    # One event loop for every size: the async client's connection pool belongs to it
+    ex = importlib.import_module("workshop1.exercise8_async")
+    # Warm-up: open the pool's connections and the tool threads before measuring
+    client = ex.IncidentEngine().client
+    await ex.IncidentEngine(client, concurrency=concurrency).run_many(
+        {"id": str(i), "description": SAMPLE_INCIDENTS[0]} for i in range(concurrency))
+    rows = []
+    for n in sizes:
+        engine = ex.IncidentEngine(client, concurrency=concurrency)
+        descriptions = [f"{SAMPLE_INCIDENTS[i % len(SAMPLE_INCIDENTS)]} (#{i})" for i in range(n)]
+        started = time.perf_counter()
+        results = await engine.run_many({"id": str(i), "description": d} for i, d in enumerate(descriptions))
+        elapsed = time.perf_counter() - started
+        rows.append({"incidents": n, "ok": sum(1 for r in results if r["ok"]), "elapsed_s": elapsed,
+                     "throughput_per_s": n / elapsed, "peak_in_flight": engine.stats["peak_in_flight"]})
+    await client.close()
+    return rows
+
+
+def run_async_scaling(concurrency: int) -> None:
+    """
+    exercise8_async: throughput for 1, 2, 4, ... simultaneous incidents under one global limit.
+    Throughput should grow ~linearly with the number of incidents until it reaches the
+    limit, then flatten (extra incidents queue for a slot).
+    """
+    sizes, n = [], 1
+    while n <= concurrency * 4:
+        sizes.append(n)
+        n *= 2
+    with contextlib.redirect_stdout(io.StringIO()):
+        rows = asyncio.run(_async_scaling(sizes, concurrency))
+
+    base = rows[0]["throughput_per_s"]
+    print(f"\n=== exercise8_async scaling (limit {concurrency} requests in flight) ===")
+    print(f"{'incidents':>9} {'ok':>5} {'elapsed s':>10} {'incid/s':>9} {'speed-up':>9} {'ideal':>6} {'peak':>5}")
+    for r in rows:
+        ideal = min(r["incidents"], concurrency)
+        print(f"{r['incidents']:>9} {r['ok']:>5} {r['elapsed_s']:>10.3f} {r['throughput_per_s']:>9.1f} "
+              f"{r['throughput_per_s'] / base:>8.1f}x {ideal:>5}x {r['peak_in_flight']:>5}")
+
+
+# -------------------------
+# Results storage and comparison
+# -------------------------
+
+def _git_revision() -> Optional[str]:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT,
+                             capture_output=True, text=True, timeout=5)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return out.stdout.strip() or None
+
+
+def load_runs(path: str) -> List[Dict[str, Any]]:
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def save_run(path: str, run: Dict[str, Any]) -> None:
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(run) + "\n")
+
+
+def find_run(runs: List[Dict[str, Any]], ref: str) -> Optional[Dict[str, Any]]:
+    """Latest run whose run_id, label or git revision matches ref."""
+    for run in reversed(runs):
+        if ref in (run.get("run_id"), run.get("label"), run.get("git_rev")):
+            return run
+    return None
+
+
+def _change(new: float, old: float) -> str:
+    if not old:
+        return "   n/a"
+    return f"{(new - old) / old:+6.1%}"
+
+
+def print_comparison(current: Dict[str, Any], baseline: Dict[str, Any]) -> None:
+    print(f"\n=== Compared with {baseline['run_id']} ({baseline.get('label') or baseline.get('git_rev')}, "
+          f"{baseline['timestamp']}) ===")
+    print(f"{'scenario':<22} {'throughput/s':>20} {'p50 ms':>20} {'p95 ms':>20} {'peak KB':>20}")
+    for name, new in current["scenarios"].items():
+        old = baseline["scenarios"].get(name)
+        if old is None:
+            print(f"{name:<22} (not in baseline)")
+            continue
+        cells = []
+        for key in ("throughput_per_s", "p50_ms", "p95_ms", "peak_traced_kb"):
+            n, o = new.get(key) or 0, old.get(key) or 0
+            cells.append(f"{n:>10} {_change(n, o)}")
+        print(f"{name:<22} " + " ".join(f"{c:>20}" for c in cells))
+
+
+def print_results(run: Dict[str, Any]) -> None:
+    print(f"\n=== Benchmark {run['run_id']} ({run.get('label') or 'unlabelled'}, git {run.get('git_rev')}) ===")
+    print(f"Mock: latency={run['mock']['latency']} 429={run['mock']['rate_429']} "
+          f"errors={run['mock']['error_rate']}")
+    print(f"{'scenario':<22} {'ok':>5} {'err':>4} {'req/s':>8} {'p50':>8} {'p95':>8} {'p99':>8} "
+          f"{'peak KB':>9} {'calls':>6} {'429s':>5}")
+    for name, r in run["scenarios"].items():
+        print(f"{name:<22} {r['succeeded']:>5} {sum(r['errors'].values()):>4} {r['throughput_per_s']:>8} "
+              f"{r['p50_ms']:>8} {r['p95_ms']:>8} {r['p99_ms']:>8} {str(r['peak_traced_kb']):>9} "
+              f"{r['server'].get('requests', 0):>6} {r['server'].get('429', 0):>5}")
+
+
+# -------------------------
+# Main entry point
+# -------------------------
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="End-to-end benchmarks against the mock Azure OpenAI server.")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS),
+                        help=f"Comma-separated subset of: {', '.join(SCENARIOS)}")
+    parser.add_argument("--requests", "-n", type=int, default=DEFAULT_REQUESTS)
+    parser.add_argument("--concurrency", "-c", type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument("--latency", default="lognormal:0.05,0.5", help="Mock latency distribution")
+    parser.add_argument("--token-delay", type=float, default=0.001)
+    parser.add_argument("--rate-429", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--use-shortcuts", action="store_true",
+                        help="Keep response cache / fast path / dedup on (default: measure the LLM path)")
+    parser.add_argument("--no-memory", action="store_true", help="Skip tracemalloc (it slows Python code)")
+    parser.add_argument("--label", default=None, help="Name for this run, e.g. 'baseline'")
+    parser.add_argument("--results", default=DEFAULT_RESULTS_PATH)
+    parser.add_argument("--compare", nargs="?", const="previous", default=None,
+                        help="Compare with the previous run, or with a run_id / label / git revision")
+    parser.add_argument("--list", action="store_true", help="List stored runs and exit")
+    parser.add_argument("--async-scaling", action="store_true",
+                        help="Sweep exercise8_async from 1 to 4x --concurrency incidents and exit")
+    args = parser.parse_args()
+
+    results_path = os.path.abspath(args.results)
+    runs = load_runs(results_path)
+    if args.list:
+        for run in runs:
+            names = ", ".join(f"{n}={r['throughput_per_s']}/s" for n, r in run["scenarios"].items())
+            print(f"{run['run_id']}  {run['timestamp']}  git={run.get('git_rev')}  "
+                  f"label={run.get('label')}  {names}")
+        return
+
+    names = [n.strip() for n in args.scenarios.split(",") if n.strip()]
+    unknown = [n for n in names if n not in SCENARIOS]
+    if unknown:
+        parser.error(f"Unknown scenario(s): {', '.join(unknown)}")
+
+    server = start_mock_server(latency=args.latency, token_delay=args.token_delay, rate_429=args.rate_429,
+                               error_rate=args.error_rate, retry_after=args.retry_after, seed=args.seed)
+    install_mock_config(server)
+    # Caches, incident DB and outbox files land in a scratch directory, not the checkout
+    if REPO_ROOT not in sys.path:
+        sys.path.insert(0, REPO_ROOT)
+    workdir = tempfile.mkdtemp(prefix="workshop_bench_")
+    os.chdir(workdir)
+
+    if args.async_scaling:
+        run_async_scaling(args.concurrency)
+        server.shutdown()
+        return
+
+    run = {
+        "run_id": uuid.uuid4().hex[:8],
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "git_rev": _git_revision(),
+        "label": args.label,
+        "python": sys.version.split()[0],
+        "mock": {"latency": args.latency, "token_delay": args.token_delay, "rate_429": args.rate_429,
+                 "error_rate": args.error_rate, "retry_after": args.retry_after, "seed": args.seed},
+        "use_shortcuts": args.use_shortcuts,
+        "scenarios": {},
+    }
+    for name in names:
+        concurrency = 1 if name in SEQUENTIAL_SCENARIOS else args.concurrency
+        print(f"[BENCH] {name}: {args.requests} requests, concurrency {concurrency} ...", file=sys.stderr)
+        with contextlib.redirect_stdout(io.StringIO()):
+            op = SCENARIOS[name](args)
+        run["scenarios"][name] = run_scenario(name, op, args.requests, concurrency,
+                                              server, track_memory=not args.no_memory)
+
+    server.shutdown()
+    print_results(run)
+    if args.compare:
+        baseline = runs[-1] if args.compare == "previous" and runs else find_run(runs, args.compare)
+        if baseline:
+            print_comparison(run, baseline)
+        else:
+            print(f"\n[BENCH] No stored run matches '{args.compare}'.")
+    save_run(results_path, run)
+    print(f"\n[BENCH] Saved run {run['run_id']} to {results_path} (scratch files in {workdir})")
+
+
+if __name__ == "__main__":
+    main()
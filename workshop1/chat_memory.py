@@ -0,0 +1,305 @@
+# Token-Budgeted Conversation Memory
+
+"""
+demo for:
+- Keeping a chat session inside a fixed prompt-token budget instead of resending every turn
+- The system prompt and the most recent turns are pinned; older turns are folded into a
+  running summary that rides along as a single system message
+- Token counts are computed once when a message is added and cached next to it, so the
+  budget check per turn is O(1) (a running total), not a re-count of the whole history
+- Eviction drains down to a low-water mark, so the summarizer runs once every few turns
+  instead of on every turn once the budget is reached
+
+    memory = ConversationMemory(system_prompt, summarize=llm_summarizer(client, DEPLOYMENT_NAME))
+    memory.add("user", user_input)
+    response = client.chat.completions.create(model=DEPLOYMENT_NAME, messages=memory.messages())
+    memory.add("assistant", response.choices[0].message.content)
+
+Token counts use tiktoken when it is installed, otherwise ~4 characters per token.
+
+Benchmark (local mock server; per-turn prompt tokens, full history vs memory):
+    python -m workshop1.chat_memory --bench
+"""
+
+import argparse
+from collections import deque
+from typing import List, Dict, Any, Callable, Deque, Optional, Tuple
+
+try:
+    import tiktoken
+    _ENCODING = tiktoken.get_encoding("cl100k_base")
+except Exception:   # not installed, or no cached encoding file offline
+    _ENCODING = None
+
+# -------------------------
+# Configuration
+# -------------------------
+
+MEMORY_BUDGET_TOKENS = 2000      # prompt tokens sent per request (system + summary + recent turns)
+LOW_WATER = 0.6                  # after eviction, history is trimmed to this fraction of the budget
+KEEP_RECENT_MESSAGES = 6         # last 3 user/assistant exchanges are never summarized
+SUMMARY_MAX_TOKENS = 300         # cap on the running summary
+MESSAGE_OVERHEAD_TOKENS = 4      # role/separator tokens the chat format adds per message
+SUMMARY_LINE_CHARS = 160         # extractive summary keeps this much of each evicted message
+
+SUMMARY_PREFIX = "Summary of the earlier conversation:\n"
+SUMMARIZE_PROMPT = (
+    "You maintain the running summary of an IT support chat. Merge the previous summary and the "
+    "new messages into one short summary. Keep the user's problem, device/system names, error "
+    "messages, steps already tried and anything still unresolved. Reply with the summary only."
+)
+
+Message = Dict[str, Any]
+Summarizer = Callable[[str, List[Message]], str]
+
+
+# -------------------------
+# Token counting
+# -------------------------
+
+def count_tokens(text: str) -> int:
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text))
+    return max(1, len(text) // 4)
+
+
+def message_tokens(message: Message) -> int:
+    return count_tokens(str(message.get("content") or "")) + MESSAGE_OVERHEAD_TOKENS
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Keep the *end* of the text (the newest part of a summary) within max_tokens."""
+    if count_tokens(text) <= max_tokens:
+        return text
+    if _ENCODING is not None:
+        return _ENCODING.decode(_ENCODING.encode(text)[-max_tokens:])
+    return text[-max_tokens * 4:]
+
+
+# -------------------------
+# Summarizers
+# -------------------------
+
+def extractive_summary(previous: str, evicted: List[Message]) -> str:
+    """No API call: one clipped line per evicted message appended to the previous summary."""
+    lines = [previous] if previous else []
+    for m in evicted:
+        text = " ".join(str(m.get("content") or "").split())
+        if len(text) > SUMMARY_LINE_CHARS:
+            text = text[:SUMMARY_LINE_CHARS - 3] + "..."
+        lines.append(f"- {m['role']}: {text}")
+    return "\n".join(lines)
+
+
+def llm_summarizer(client: Any, model: str) -> Summarizer:
+    """Summarize with one small completion; falls back to the extractive summary on any error."""
+    def summarize(previous: str, evicted: List[Message]) -> str:
+        transcript = "\n".join(f"{m['role']}: {m.get('content') or ''}" for m in evicted)
+        try:
+            response = client.chat.completions.create(
+                model=model,
+                messages=[
+                    {"role": "system", "content": SUMMARIZE_PROMPT},
+                    {"role": "user", "content": f"Previous summary:\n{previous or '(none)'}\n\n"
+                                                f"New messages:\n{transcript}"},
+                ],
+                temperature=0.0,
+                max_tokens=SUMMARY_MAX_TOKENS,
+            )
+            summary = (response.choices[0].message.content or "").strip()
+            if summary:
+                return summary
+        except Exception as e:
+            print(f"[MEMORY] summarizer failed ({type(e).__name__}); using extractive summary")
+        return extractive_summary(previous, evicted)
+    return summarize
+
+
+# -------------------------
+# Memory
+# -------------------------
+
+class ConversationMemory:
+    """
+    Messages to send = [system prompt] + [running summary] + recent turns.
+    Every message is stored with its token count, and the total is kept as a running sum,
+    so add() only does work proportional to the new message (plus amortized eviction:
+    each message is evicted and summarized at most once).
+    """
+
+    def __init__(self,
+                 system_prompt: str,
+                 budget_tokens: int = MEMORY_BUDGET_TOKENS,
+                 keep_recent: int = KEEP_RECENT_MESSAGES,
+                 summarize: Optional[Summarizer] = None,
+                 low_water: float = LOW_WATER,
+                 on_summary: Optional[Callable[[str, int], None]] = None):
+        self.budget_tokens = budget_tokens
+        self.keep_recent = keep_recent
+        self.low_water = low_water
+        self.summarize = summarize or extractive_summary
+        # Called with (summary, messages summarized so far), e.g. to persist the summary
+        self.on_summary = on_summary
+        self._system = {"role": "system", "content": system_prompt}
+        self._system_tokens = message_tokens(self._system)
+        self.reset()
+
+    def reset(self) -> None:
+        self._turns: Deque[Tuple[Message, int]] = deque()
+        self._turn_tokens = 0
+        self.summary = ""
+        self._summary_tokens = 0
+        self._counters = {"added": 0, "evicted": 0, "summaries": 0}
+
+    def restore(self, summary: str, messages: List[Message], summarized: int = 0) -> None:
+        """Rebuild the state of a saved session: its summary plus the turns after it."""
+        self.reset()
+        self.summary = summary
+        self._summary_tokens = message_tokens({"content": SUMMARY_PREFIX + summary}) if summary else 0
+        self._counters["evicted"] = summarized
+        for m in messages:
+            message = {"role": m["role"], "content": m["content"]}
+            tokens = message_tokens(message)
+            self._turns.append((message, tokens))
+            self._turn_tokens += tokens
+        if self.total_tokens > self.budget_tokens:
+            self._compact()
+
+    @property
+    def summarized(self) -> int:
+        """How many of the session's messages are folded into the summary."""
+        return self._counters["evicted"]
+
+    @property
+    def total_tokens(self) -> int:
+        return self._system_tokens + self._summary_tokens + self._turn_tokens
+
+    def __len__(self) -> int:
+        return len(self._turns)
+
+    def add(self, role: str, content: str) -> None:
+        message = {"role": role, "content": content}
+        tokens = message_tokens(message)
+        self._turns.append((message, tokens))
+        self._turn_tokens += tokens
+        self._counters["added"] += 1
+        if self.total_tokens > self.budget_tokens:
+            self._compact()
+
+    def pop(self) -> Optional[Message]:
+        """Drop the newest message (e.g. the user turn whose request failed)."""
+        if not self._turns:
+            return None
+        message, tokens = self._turns.pop()
+        self._turn_tokens -= tokens
+        return message
+
+    def messages(self, context: Optional[str] = None) -> List[Message]:
+        """context: extra system text (e.g. retrieved earlier turns) placed before the recent turns."""
+        out = [self._system]
+        if self.summary:
+            out.append({"role": "system", "content": SUMMARY_PREFIX + self.summary})
+        if context:
+            out.append({"role": "system", "content": context})
+        out.extend(m for m, _ in self._turns)
+        return out
+
+    def _compact(self) -> None:
+        target = int(self.budget_tokens * self.low_water)
+        evicted: List[Message] = []
+        while len(self._turns) > self.keep_recent and self.total_tokens > target:
+            message, tokens = self._turns.popleft()
+            self._turn_tokens -= tokens
+            evicted.append(message)
+        # Never leave a reply at the front without the question it answered
+        while len(self._turns) > self.keep_recent and self._turns[0][0]["role"] != "user":
+            message, tokens = self._turns.popleft()
+            self._turn_tokens -= tokens
+            evicted.append(message)
+        if not evicted:
+            return
+
+        summary = truncate_to_tokens(self.summarize(self.summary, evicted), SUMMARY_MAX_TOKENS)
+        self.summary = summary
+        self._summary_tokens = message_tokens({"content": SUMMARY_PREFIX + summary})
+        self._counters["evicted"] += len(evicted)
+        self._counters["summaries"] += 1
+        print(f"[MEMORY] summarized {len(evicted)} older messages; prompt now "
+              f"{self.total_tokens}/{self.budget_tokens} tokens")
+        if self.on_summary is not None:
+            self.on_summary(self.summary, self.summarized)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self._counters,
+            "recent_messages": len(self._turns),
+            "summary_tokens": self._summary_tokens,
+            "prompt_tokens": self.total_tokens,
+            "budget_tokens": self.budget_tokens,
+            "tokenizer": "tiktoken" if _ENCODING is not None else "chars/4",
+        }
+
+
+# -------------------------
+# Benchmark
+# -------------------------
+
+def _session(client: Any, turns: int, memory: Optional[ConversationMemory]) -> List[int]:
+    """Scripted session; returns the prompt_tokens the server reported for each turn."""
+    history: List[Message] = [{"role": "system", "content": "You are an IT support specialist."}]
+    results = []
+    for i in range(turns):
+        user_input = (f"Turn {i}: the VPN client on my laptop still drops every few minutes, "
+                      f"even after the reinstall and the driver update you suggested earlier.")
+        if memory is not None:
+            memory.add("user", user_input)
+            messages = memory.messages()
+        else:
+            history.append({"role": "user", "content": user_input})
+            messages = history
+        response = client.chat.completions.create(model="mock", messages=messages, max_tokens=120)
+        results.append(response.usage.prompt_tokens)
+        reply = response.choices[0].message.content
+        if memory is not None:
+            memory.add("assistant", reply)
+        else:
+            history.append({"role": "assistant", "content": reply})
+    return results
+
+
+def main() -> None:
+    from openai import OpenAI
+    from workshop1.mock_openai_server import start_mock_server
+
+    parser = argparse.ArgumentParser(description="Conversation memory benchmark (local mock server).")
+    parser.add_argument("--bench", action="store_true")
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--budget", type=int, default=MEMORY_BUDGET_TOKENS)
+    parser.add_argument("--llm-summary", action="store_true", help="summarize with the model instead of extractively")
+    args = parser.parse_args()
+    if not args.bench:
+        parser.print_help()
+        return
+
+    server = start_mock_server(latency="fixed:0.01", token_delay=0)
+    client = OpenAI(base_url=server.url + "/v1", api_key="mock")
+    summarize = llm_summarizer(client, "mock") if args.llm_summary else None
+    memory = ConversationMemory("You are an IT support specialist.", budget_tokens=args.budget, summarize=summarize)
+
+    full = _session(client, args.turns, None)
+    bounded = _session(client, args.turns, memory)
+    checkpoints = sorted({t for t in (1, 10, 25, 50, 100, 200, 500, args.turns) if t <= args.turns})
+    print(f"[BENCH] prompt tokens per turn ({args.turns} turns, budget {args.budget}):")
+    for turn in checkpoints:
+        print(f"[BENCH]   turn {turn:4d}: full history {full[turn - 1]:7d}   memory {bounded[turn - 1]:6d}")
+    full_total = sum(full)
+    bounded_total = sum(bounded)
+    print(f"[BENCH] total prompt tokens: full history {full_total}, memory {bounded_total} "
+          f"({1 - bounded_total / full_total:.0%} fewer)")
+    print(f"[BENCH] max prompt tokens  : full history {max(full)}, memory {max(bounded)}")
+    print(f"[BENCH] memory: {memory.stats()}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
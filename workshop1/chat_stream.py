@@ -0,0 +1,144 @@
+# Streaming Chat Replies to the Terminal
+
+"""
+demo for:
+- Printing a chat reply delta by delta (stream=True) instead of waiting for the whole answer
+- Still assembling the full text, so it can go into the conversation history
+- Ctrl-C cancels only the in-flight reply: the stream is closed and the partial text is returned,
+  so the chat session keeps going
+- Per-turn time-to-first-token (TTFT) and generation speed (tokens/s)
+
+    result = stream_reply(client, model=DEPLOYMENT_NAME, messages=messages)
+    print(format_stats(result))      # [STREAM] ttft 310 ms | 182 tokens in 2.41 s (75.5 tok/s)
+
+Token counts come from the usage chunk when include_usage=True (needs a recent api_version
+on Azure); otherwise each content delta is counted as one token, which is how the service
+streams text.
+
+Demo (local mock server, ~20 ms per delta):
+    python -m workshop1.chat_stream --demo
+"""
+
+import argparse
+import time
+from dataclasses import dataclass
+from typing import List, Dict, Any, Callable, Optional
+
+# -------------------------
+# Result
+# -------------------------
+
+@dataclass
+class StreamResult:
+    text: str
+    ttft: Optional[float] = None          # seconds from request to first content delta
+    elapsed: float = 0.0                  # seconds from request to end of stream
+    tokens: int = 0
+    finish_reason: Optional[str] = None
+    cancelled: bool = False
+
+    @property
+    def tokens_per_s(self) -> float:
+        """Generation speed after the first token (TTFT is reported separately)."""
+        if self.ttft is None or self.tokens < 2:
+            return 0.0
+        generating = self.elapsed - self.ttft
+        return (self.tokens - 1) / generating if generating > 0 else 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"ttft_ms": round(self.ttft * 1000, 1) if self.ttft is not None else None,
+                "elapsed_ms": round(self.elapsed * 1000, 1), "tokens": self.tokens,
+                "tokens_per_s": round(self.tokens_per_s, 1), "finish_reason": self.finish_reason,
+                "cancelled": self.cancelled}
+
+
+def format_stats(result: StreamResult) -> str:
+    ttft = f"{result.ttft * 1000:.0f} ms" if result.ttft is not None else "-"
+    note = " | cancelled" if result.cancelled else ""
+    return (f"[STREAM] ttft {ttft} | {result.tokens} tokens in {result.elapsed:.2f} s "
+            f"({result.tokens_per_s:.1f} tok/s){note}")
+
+
+# -------------------------
+# Streaming
+# -------------------------
+
+def stream_reply(client: Any,
+                 on_delta: Optional[Callable[[str], None]] = None,
+                 include_usage: bool = False,
+                 **request: Any) -> StreamResult:
+    """
+    Run one streamed chat completion, passing each content delta to on_delta
+    (default: print it without a newline). Ctrl-C stops the stream and returns what
+    arrived so far with cancelled=True; API errors are raised as usual.
+    """
+    if on_delta is None:
+        on_delta = lambda delta: print(delta, end="", flush=True)
+    if include_usage:
+        request["stream_options"] = {"include_usage": True}
+
+    parts: List[str] = []
+    result = StreamResult(text="")
+    started = time.perf_counter()
+    stream = None
+    deltas = 0
+    try:
+        stream = client.chat.completions.create(stream=True, **request)
+        for chunk in stream:
+            if getattr(chunk, "usage", None) is not None:
+                result.tokens = chunk.usage.completion_tokens
+            # Azure sends a content-filter chunk with no choices first
+            if not chunk.choices:
+                continue
+            result.finish_reason = chunk.choices[0].finish_reason or result.finish_reason
+            delta = chunk.choices[0].delta.content
+            if not delta:
+                continue
+            if result.ttft is None:
+                result.ttft = time.perf_counter() - started
+            deltas += 1
+            parts.append(delta)
+            on_delta(delta)
+    except KeyboardInterrupt:
+        result.cancelled = True
+        if stream is not None:
+            # Closes the HTTP response so the server stops generating (and billing) tokens
+            stream.close()
+    result.elapsed = time.perf_counter() - started
+    result.text = "".join(parts)
+    if not result.tokens:
+        result.tokens = deltas
+    return result
+
+
+# -------------------------
+# Demo
+# -------------------------
+
+def main() -> None:
+    from openai import OpenAI
+    from workshop1.mock_openai_server import start_mock_server
+
+    parser = argparse.ArgumentParser(description="Streaming chat reply demo (local mock server).")
+    parser.add_argument("--demo", action="store_true")
+    parser.add_argument("--token-delay", type=float, default=0.02, help="mock delay per streamed delta (s)")
+    args = parser.parse_args()
+    if not args.demo:
+        parser.print_help()
+        return
+
+    server = start_mock_server(latency="fixed:0.3", token_delay=args.token_delay)
+    client = OpenAI(base_url=server.url + "/v1", api_key="mock")
+    messages = [{"role": "user", "content": "My laptop will not boot after the update."}]
+
+    print("[DEMO] streaming (press Ctrl-C to cancel the reply):")
+    print("AI: ", end="", flush=True)
+    result = stream_reply(client, model="mock", messages=messages, include_usage=True)
+    print()
+    print(format_stats(result))
+    print(f"[DEMO] assembled {len(result.text)} characters for the history")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,344 @@
+# Circuit Breaker for Model Calls
+
+"""
+demo for:
+- Closed / open / half-open states around every chat.completions call
+- Closed: calls go through; the breaker opens when FAILURE_THRESHOLD of the last
+  WINDOW calls failed (and at least FAILURE_RATE of them)
+- Open: calls fail fast with CircuitOpenError (no network, no waiting on retries);
+  callers fall back to a degraded local triage (KeywordTriage.degraded_result)
+- Half-open: after RESET_TIMEOUT one trial call goes through; success closes the
+  breaker, failure opens it again with a doubled timeout (up to MAX_RESET_TIMEOUT)
+- on_close(callback): run when the service is back, e.g. to re-triage degraded incidents
+- RetriageQueue: degraded incidents waiting for a real triage
+
+    client = guarded(governed(AzureOpenAI(**get_api_credentials())))   # same .chat.completions.create API
+    try:
+        response = client.chat.completions.create(...)
+    except Exception as e:                 # CircuitOpenError, or the API error that was counted
+        data = keyword_triage.degraded_result(description, f"{type(e).__name__}")
+
+4xx request errors (bad request, content filter) are the request's fault and do not count.
+
+Demo (local mock server that fails for a while, then recovers):
+    python -m workshop1.circuit_breaker --demo
+"""
+
+import argparse
+import threading
+import time
+from collections import deque
+from typing import List, Dict, Any, Callable, Optional, Tuple
+from types import SimpleNamespace
+from openai import AsyncOpenAI, BadRequestError
+
+# -------------------------
+# Configuration
+# -------------------------
+
+WINDOW = 20                    # recent calls the failure count is taken over
+FAILURE_THRESHOLD = 5          # failures in the window that open the breaker...
+FAILURE_RATE = 0.5             # ...if they are also at least this share of the window
+RESET_TIMEOUT = 10.0           # seconds open before the first half-open trial
+MAX_RESET_TIMEOUT = 120.0
+HALF_OPEN_CALLS = 1            # trial calls allowed at once while half-open
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+# Request errors: the service answered, the request was wrong
+NOT_COUNTED = (BadRequestError,)
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling the service while the breaker is open."""
+
+    def __init__(self, name: str, retry_in: float):
+        super().__init__(f"Circuit '{name}' is open (next trial in {retry_in:.1f}s)")
+        self.retry_in = retry_in
+
+
+# -------------------------
+# Breaker
+# -------------------------
+
+class CircuitBreaker:
+    """Thread-safe; the same breaker can guard sync and async clients."""
+
+    def __init__(self,
+                 name: str = "llm",
+                 window: int = WINDOW,
+                 failure_threshold: int = FAILURE_THRESHOLD,
+                 failure_rate: float = FAILURE_RATE,
+                 reset_timeout: float = RESET_TIMEOUT,
+                 max_reset_timeout: float = MAX_RESET_TIMEOUT,
+                 half_open_calls: int = HALF_OPEN_CALLS):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.failure_rate = failure_rate
+        self.base_reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+        self.half_open_calls = half_open_calls
+
+        self.state = CLOSED
+        self.reset_timeout = reset_timeout
+        self._outcomes: "deque[bool]" = deque(maxlen=window)   # True = failure
+        self._opened_at = 0.0
+        self._trials = 0
+        self._listeners: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+        self.stats = {"calls": 0, "failures": 0, "rejected": 0, "opened": 0, "closed": 0}
+
+    def on_close(self, callback: Callable[[], None]) -> None:
+        """callback() runs (on the calling thread) each time the breaker closes after an outage."""
+        self._listeners.append(callback)
+
+    # ---- state machine ----
+
+    def _transition(self, state: str, reason: str) -> None:
+        print(f"[BREAKER] {self.name}: {self.state} -> {state} ({reason})")
+        self.state = state
+        if state == OPEN:
+            self._opened_at = time.monotonic()
+            self._trials = 0
+            self.stats["opened"] += 1
+        elif state == CLOSED:
+            self._outcomes.clear()
+            self.reset_timeout = self.base_reset_timeout
+            self.stats["closed"] += 1
+
+    def allow(self) -> bool:
+        """True if a call may go out now (takes a trial slot when half-open)."""
+        with self._lock:
+            if self.state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self._transition(HALF_OPEN, f"{self.reset_timeout:g}s elapsed, sending a trial call")
+            if self.state == CLOSED:
+                self.stats["calls"] += 1
+                return True
+            if self.state == HALF_OPEN and self._trials < self.half_open_calls:
+                self._trials += 1
+                self.stats["calls"] += 1
+                return True
+            self.stats["rejected"] += 1
+            return False
+
+    def retry_in(self) -> float:
+        with self._lock:
+            return max(0.0, self._opened_at + self.reset_timeout - time.monotonic()) if self.state == OPEN else 0.0
+
+    def record_success(self) -> None:
+        closed = False
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._transition(CLOSED, "trial call succeeded")
+                closed = True
+            else:
+                self._outcomes.append(False)
+        if closed:
+            for callback in list(self._listeners):
+                callback()
+
+    def record_failure(self, error: Optional[BaseException] = None) -> None:
+        with self._lock:
+            self.stats["failures"] += 1
+            what = type(error).__name__ if error is not None else "failure"
+            if self.state == HALF_OPEN:
+                self.reset_timeout = min(self.max_reset_timeout, self.reset_timeout * 2)
+                self._transition(OPEN, f"trial call failed: {what}")
+                return
+            if self.state == OPEN:
+                return     # a call that started before the breaker opened
+            self._outcomes.append(True)
+            failures = sum(self._outcomes)
+            if failures >= self.failure_threshold and failures / len(self._outcomes) >= self.failure_rate:
+                self._transition(OPEN, f"{failures} of the last {len(self._outcomes)} calls failed, last: {what}")
+
+    def release(self) -> None:
+        """A call that ended without a verdict (request error, cancelled): free its trial slot."""
+        with self._lock:
+            if self.state == HALF_OPEN and self._trials > 0:
+                self._trials -= 1
+
+    # ---- calls ----
+
+    def _outcome(self, error: Optional[BaseException]) -> None:
+        if error is None:
+            self.record_success()
+        elif isinstance(error, Exception) and not isinstance(error, NOT_COUNTED):
+            self.record_failure(error)
+        else:
+            self.release()
+
+    def call(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        if not self.allow():
+            raise CircuitOpenError(self.name, self.retry_in())
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            self._outcome(e)
+            raise
+        self._outcome(None)
+        return result
+
+    async def acall(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Async twin of call(); fn returns an awaitable."""
+        if not self.allow():
+            raise CircuitOpenError(self.name, self.retry_in())
+        try:
+            result = await fn(*args, **kwargs)
+        except BaseException as e:
+            self._outcome(e)
+            raise
+        self._outcome(None)
+        return result
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            failures = sum(self._outcomes)
+            return {**self.stats, "state": self.state, "window_failures": failures,
+                    "window_calls": len(self._outcomes), "reset_timeout_s": self.reset_timeout}
+
+
+# -------------------------
+# Degraded incidents waiting for a real triage
+# -------------------------
+
+class RetriageQueue:
+    """(ticket_id, description) pairs triaged locally during an outage."""
+
+    def __init__(self) -> None:
+        self._items: "deque[Tuple[str, str]]" = deque()
+        self._lock = threading.Lock()
+        self.stats = {"queued": 0, "retriaged": 0}
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._items)
+
+    def add(self, ticket_id: str, description: str) -> None:
+        with self._lock:
+            self._items.append((ticket_id, description))
+            self.stats["queued"] += 1
+
+    def drain(self) -> List[Tuple[str, str]]:
+        with self._lock:
+            items = list(self._items)
+            self._items.clear()
+        return items
+
+    def requeue(self, ticket_id: str, description: str) -> None:
+        """Put an item back (its re-triage was degraded again)."""
+        with self._lock:
+            self._items.appendleft((ticket_id, description))
+
+    def mark_done(self, n: int = 1) -> None:
+        with self._lock:
+            self.stats["retriaged"] += n
+
+
+# -------------------------
+# Guarded clients
+# -------------------------
+
+# Shared by every guarded client in this process: one view of the service's health
+breaker = CircuitBreaker()
+
+
+class _GuardedCompletions:
+    def __init__(self, completions: Any, circuit: CircuitBreaker, is_async: bool):
+        self._completions = completions
+        self._breaker = circuit
+        self._is_async = is_async
+
+    def create(self, **request: Any) -> Any:
+        if self._is_async:
+            return self._breaker.acall(self._completions.create, **request)   # awaitable, like the SDK's
+        return self._breaker.call(self._completions.create, **request)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._completions, name)
+
+
+class GuardedClient:
+    """
+    Drop-in wrapper for a (governed, hedged or routed) client: chat.completions.create goes
+    through the breaker, everything else is the wrapped client. Wrap the outermost client,
+    so the breaker sees what the caller sees (after the governor's retries and failover).
+    """
+
+    def __init__(self, client: Any, circuit: Optional[CircuitBreaker] = None):
+        self._client = client
+        self.breaker = circuit or breaker
+        is_async = getattr(client.chat.completions, "_is_async", None)
+        if is_async is None:
+            is_async = isinstance(client, AsyncOpenAI)
+        self.chat = SimpleNamespace(completions=_GuardedCompletions(client.chat.completions, self.breaker, is_async))
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._client, name)
+
+
+def guarded(client: Any, circuit: Optional[CircuitBreaker] = None) -> GuardedClient:
+    return client if isinstance(client, GuardedClient) else GuardedClient(client, circuit)
+
+
+# -------------------------
+# Demo
+# -------------------------
+
+def main() -> None:
+    from openai import OpenAI
+    from workshop1.fast_triage import KeywordTriage
+    from workshop1.mock_openai_server import start_mock_server
+
+    parser = argparse.ArgumentParser(description="Circuit breaker demo (local mock server with an outage).")
+    parser.add_argument("--demo", action="store_true")
+    parser.add_argument("--incidents", type=int, default=60)
+    parser.add_argument("--outage", type=float, default=3.0, help="seconds the mock returns 500s")
+    args = parser.parse_args()
+    if not args.demo:
+        parser.print_help()
+        return
+
+    server = start_mock_server(latency="fixed:0.05", token_delay=0)
+    client = guarded(OpenAI(base_url=server.url + "/v1", api_key="mock", max_retries=0),
+                     CircuitBreaker(reset_timeout=1.0))
+    keywords = KeywordTriage()
+    retriage = RetriageQueue()
+    client.breaker.on_close(lambda: print(f"[DEMO] service back: {len(retriage)} incidents queued for re-triage"))
+
+    descriptions = ["Production database is down for all users", "Some users cannot reach the VPN, intermittent",
+                    "Cosmetic typo on the intranet homepage"]
+    outage_from = args.incidents // 4
+    counts = {"model": 0, "degraded": 0}
+    shown = set()
+    started = time.perf_counter()
+    for i in range(args.incidents):
+        if i == outage_from:
+            server.config.error_rate = 1.0
+            outage_started = time.monotonic()
+        if i > outage_from and server.config.error_rate and time.monotonic() - outage_started > args.outage:
+            server.config.error_rate = 0.0
+        description = descriptions[i % len(descriptions)]
+        try:
+            client.chat.completions.create(model="mock", max_tokens=50,
+                                           messages=[{"role": "user", "content": description}])
+            counts["model"] += 1
+        except Exception as e:
+            data = keywords.degraded_result(description, type(e).__name__)
+            retriage.add(f"INC-{i}", description)
+            counts["degraded"] += 1
+            if type(e).__name__ not in shown:      # first incident degraded by each kind of error
+                shown.add(type(e).__name__)
+                print(f"[DEMO] #{i} degraded ({type(e).__name__}): {data['severity']}, "
+                      f"needs_retriage={data['needs_retriage']}")
+        time.sleep(0.1)
+    elapsed = time.perf_counter() - started
+    stats = server.snapshot_stats()
+    print(f"[DEMO] {args.incidents} incidents in {elapsed:.1f}s: {counts['model']} triaged by the model, "
+          f"{counts['degraded']} degraded, {stats.get('500', 0)} requests hit the failing server")
+    print(f"[DEMO] breaker: {client.breaker.snapshot()}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
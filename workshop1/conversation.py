@@ -0,0 +1,228 @@
+# Forkable Conversations (copy-on-write message history)
+
+"""
+demo for:
+- A conversation stored as a persistent linked list: each message is an immutable node that
+  points to the message before it, and a Conversation is just a pointer to its newest node
+- fork() is O(1): the fork points at the same node, so N forks of a long conversation share
+  one copy of the prefix and only store their own new messages (no deepcopy of dicts)
+- Appending never changes a node, so forks can be extended from many threads at once;
+  a failed request simply leaves the conversation where it was (nothing to roll back)
+- Forks can swap the system prompt without copying the history
+- Cached running token count per node: prompt size of any fork is O(1)
+- Running several what-if follow-ups concurrently (threads for sync clients, gather for async)
+
+    base = Conversation("You are an IT support specialist.")
+    base.ask(client, "My computer is slow", model=DEPLOYMENT_NAME)
+    forks = [base.fork() for _ in follow_ups]
+    answers = run_forks(client, list(zip(forks, follow_ups)), model=DEPLOYMENT_NAME)
+
+Benchmark (memory of N forks vs copying the message list):
+    python -m workshop1.conversation --bench --turns 1000 --forks 100
+"""
+
+import argparse
+import asyncio
+import copy
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Iterable, Optional, Tuple
+from workshop1.chat_memory import message_tokens
+
+# -------------------------
+# Configuration
+# -------------------------
+
+MAX_FORK_WORKERS = 8              # concurrent requests when running forks on a sync client
+
+Message = Dict[str, Any]
+
+
+# -------------------------
+# Nodes
+# -------------------------
+
+class _Node:
+    """One message. Never modified after creation, so any number of conversations can share it."""
+
+    __slots__ = ("message", "parent", "depth", "tokens")
+
+    def __init__(self, message: Message, parent: Optional["_Node"]):
+        self.message = message
+        self.parent = parent
+        self.depth = 1 + (parent.depth if parent is not None else 0)
+        self.tokens = message_tokens(message) + (parent.tokens if parent is not None else 0)
+
+
+# -------------------------
+# Conversation
+# -------------------------
+
+class Conversation:
+    """
+    System prompt + a pointer to the newest message node.
+    messages() builds a fresh list for each request; the message dicts inside it are shared
+    between forks and must be treated as read-only. Forks are independent objects: run them
+    concurrently, but use each single Conversation from one thread/task at a time.
+    """
+
+    def __init__(self, system_prompt: Optional[str] = None, head: Optional[_Node] = None):
+        self._system = {"role": "system", "content": system_prompt} if system_prompt is not None else None
+        self._head = head
+
+    @property
+    def system_prompt(self) -> Optional[str]:
+        return self._system["content"] if self._system is not None else None
+
+    def fork(self, system_prompt: Optional[str] = None) -> "Conversation":
+        """New conversation sharing this one's history; optionally with a different system prompt."""
+        forked = Conversation(head=self._head)
+        forked._system = {"role": "system", "content": system_prompt} if system_prompt is not None else self._system
+        return forked
+
+    def append(self, role: str, content: Optional[str], **fields: Any) -> "Conversation":
+        self._head = _Node({"role": role, "content": content, **fields}, self._head)
+        return self
+
+    def __len__(self) -> int:
+        return (self._head.depth if self._head is not None else 0) + (1 if self._system is not None else 0)
+
+    @property
+    def prompt_tokens(self) -> int:
+        """Estimated prompt tokens of messages(), from the cached per-node running total."""
+        tokens = self._head.tokens if self._head is not None else 0
+        return tokens + (message_tokens(self._system) if self._system is not None else 0)
+
+    @property
+    def last(self) -> Optional[Message]:
+        return self._head.message if self._head is not None else None
+
+    def messages(self) -> List[Message]:
+        out: List[Message] = []
+        node = self._head
+        while node is not None:
+            out.append(node.message)
+            node = node.parent
+        if self._system is not None:
+            out.append(self._system)
+        out.reverse()
+        return out
+
+    def _reply(self, content: str, response: Any) -> str:
+        # The user turn and the reply are committed together, only once the call succeeded
+        user = _Node({"role": "user", "content": content}, self._head)
+        reply = response.choices[0].message.content
+        self._head = _Node({"role": "assistant", "content": reply}, user)
+        return reply
+
+    def ask(self, client: Any, content: str, **request: Any) -> str:
+        """Send `content` as the next user turn and append the reply; raises on API errors."""
+        messages = self.messages() + [{"role": "user", "content": content}]
+        response = client.chat.completions.create(messages=messages, **request)
+        return self._reply(content, response)
+
+    async def aask(self, client: Any, content: str, **request: Any) -> str:
+        messages = self.messages() + [{"role": "user", "content": content}]
+        response = await client.chat.completions.create(messages=messages, **request)
+        return self._reply(content, response)
+
+
+# -------------------------
+# Running forks
+# -------------------------
+
+def run_forks(client: Any,
+              forks: List[Tuple[Conversation, str]],
+              max_workers: int = MAX_FORK_WORKERS,
+              **request: Any) -> List[Any]:
+    """
+    ask() every (conversation, follow-up) pair concurrently on a sync client.
+    Returns the replies in order; a failed fork returns its exception instead.
+    """
+    def one(pair: Tuple[Conversation, str]) -> Any:
+        conversation, content = pair
+        try:
+            return conversation.ask(client, content, **request)
+        except Exception as e:
+            return e
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        return list(pool.map(one, forks))
+
+
+async def arun_forks(client: Any, forks: List[Tuple[Conversation, str]], **request: Any) -> List[Any]:
+    """Async-client version of run_forks."""
+    return await asyncio.gather(*(c.aask(client, content, **request) for c, content in forks),
+                                return_exceptions=True)
+
+
+def shared_messages(conversations: Iterable[Conversation]) -> Tuple[int, int]:
+    """(message nodes actually stored, messages the conversations hold in total)."""
+    seen = set()
+    total = 0
+    for conversation in conversations:
+        node = conversation._head
+        total += node.depth if node is not None else 0
+        while node is not None and id(node) not in seen:
+            seen.add(id(node))
+            node = node.parent
+    return len(seen), total
+
+
+# -------------------------
+# Benchmark
+# -------------------------
+
+def _measure(build: Any) -> Tuple[Any, int]:
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = build()
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return result, used
+
+
+def run_benchmark(turns: int, forks: int) -> None:
+    base = Conversation("You are an IT support specialist.")
+    for i in range(turns):
+        base.append("user", f"Turn {i}: the VPN still drops every few minutes after the driver update.")
+        base.append("assistant", "Let's check the adapter power settings and the VPN client logs next.")
+    history = base.messages()
+
+    def forked() -> List[Conversation]:
+        out = [base.fork() for _ in range(forks)]
+        for i, c in enumerate(out):
+            c.append("user", f"What if I try fix #{i}?").append("assistant", f"Fix #{i} would mean ...")
+        return out
+
+    def copied() -> List[List[Message]]:
+        out = [copy.deepcopy(history) for _ in range(forks)]
+        for i, m in enumerate(out):
+            m.append({"role": "user", "content": f"What if I try fix #{i}?"})
+            m.append({"role": "assistant", "content": f"Fix #{i} would mean ..."})
+        return out
+
+    conversations, fork_bytes = _measure(forked)
+    _, copy_bytes = _measure(copied)
+    stored, total = shared_messages(conversations)
+    print(f"[BENCH] {forks} forks of a {2 * turns + 1}-message conversation, 2 new messages each")
+    print(f"[BENCH] deepcopy of the message list: {copy_bytes / 1e6:8.2f} MB")
+    print(f"[BENCH] fork()                      : {fork_bytes / 1e6:8.2f} MB "
+          f"({copy_bytes / max(1, fork_bytes):.0f}x less)")
+    print(f"[BENCH] message nodes stored: {stored} for {total} messages held by the forks")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Forkable conversation benchmark.")
+    parser.add_argument("--bench", action="store_true")
+    parser.add_argument("--turns", type=int, default=1000)
+    parser.add_argument("--forks", type=int, default=100)
+    args = parser.parse_args()
+    if not args.bench:
+        parser.print_help()
+        return
+    run_benchmark(args.turns, args.forks)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+# Near-Duplicate Incident Collapsing for Alert Storms (MinHash + LSH)
+
+"""
+demo for:
+- MinHash signatures over word unigrams + bigrams (estimates Jaccard similarity)
+- LSH banding: 16 bands x 4 rows, so only incidents sharing a band are compared
+  (pairs with Jaccard 0.8 collide in some band with ~99.9% probability)
+- A sliding time window: clusters expire when no duplicate has arrived for window_seconds
+- Near-duplicates attach to the first incident's cluster and reuse its ticket and triage result
+
+Benchmark:
+    python -m workshop1.dedup --bench --count 60000
+"""
+
+import argparse
+import hashlib
+import operator
+import random
+import re
+import threading
+import time
+from array import array
+from collections import deque
+from dataclasses import dataclass, field
+from typing import List, Dict, Any, Optional, Set, Tuple
+
+# -------------------------
+# Configuration
+# -------------------------
+
+DEFAULT_WINDOW_SECONDS = 600.0
+DEFAULT_THRESHOLD = 0.6           # min estimated Jaccard similarity to count as a near-duplicate
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+
+_MASK64 = (1 << 64) - 1
+_rng = random.Random(0x5EED)      # fixed seed: signatures are stable across runs
+_PERMS = [(_rng.getrandbits(64) | 1, _rng.getrandbits(64)) for _ in range(NUM_PERM)]
+FEATURE_CACHE_SIZE = 50_000       # ~256 bytes per cached feature
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+# -------------------------
+# MinHash
+# -------------------------
+
+_feature_cache: Dict[str, array] = {}
+
+
+def _feature_signature(feature: str) -> array:
+    """
+    The feature's value under all NUM_PERM hash functions (multiply-shift, 64 → 32 bits).
+    Alert storms reuse the same vocabulary, so these are cached and a document's
+    MinHash becomes a C-level element-wise min over cached rows.
+    """
+    sig = _feature_cache.get(feature)
+    if sig is None:
+        x = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+        sig = array("I", [((a * x + b) & _MASK64) >> 32 for a, b in _PERMS])
+        if len(_feature_cache) < FEATURE_CACHE_SIZE:
+            _feature_cache[feature] = sig
+    return sig
+
+
+def features(text: str) -> Set[str]:
+    """Word unigrams and bigrams."""
+    tokens = _TOKEN_RE.findall(text.lower())
+    feats = set(tokens)
+    feats.update(a + " " + b for a, b in zip(tokens, tokens[1:]))
+    return feats
+
+
+def minhash(text: str) -> Tuple[int, ...]:
+    """NUM_PERM minimum hash values, one per hash function."""
+    rows = [_feature_signature(f) for f in features(text)] or [_feature_signature("")]
+    return tuple(map(min, zip(*rows)))
+
+
+def similarity(sig_a: Tuple[int, ...], sig_b: Tuple[int, ...]) -> float:
+    """Estimated Jaccard similarity: share of matching MinHash slots."""
+    return sum(map(operator.eq, sig_a, sig_b)) / len(sig_a)
+
+
+def band_keys(signature: Tuple[int, ...]) -> List[int]:
+    return [hash(signature[i * ROWS:(i + 1) * ROWS]) for i in range(BANDS)]
+
+
+# -------------------------
+# Sliding-window deduper
+# -------------------------
+
+@dataclass
+class Cluster:
+    """One storm: the first incident plus every near-duplicate attached to it."""
+    cluster_id: int
+    signature: Tuple[int, ...]
+    description: str
+    first_seen: float
+    last_seen: float
+    count: int = 1
+    ticket_id: Optional[str] = None
+    result: Optional[Dict[str, Any]] = None
+    ready: threading.Event = field(default_factory=threading.Event)
+
+    def resolve(self, result: Dict[str, Any], ticket_id: Optional[str] = None) -> None:
+        """Publish the leader's triage result (and ticket) to waiting duplicates."""
+        self.result = result
+        if ticket_id is not None:
+            self.ticket_id = ticket_id
+        self.ready.set()
+
+    def fail(self) -> None:
+        """Release waiting duplicates without a result (the leader failed); they triage on their own."""
+        self.ready.set()
+
+
+class IncidentDeduper:
+    """
+    In-memory LSH index over live clusters.
+    observe() returns (cluster, is_new): new clusters need a real triage; for
+    duplicates, wait on cluster.ready (or read cluster.result) instead.
+    """
+
+    def __init__(self,
+                 window_seconds: float = DEFAULT_WINDOW_SECONDS,
+                 threshold: float = DEFAULT_THRESHOLD):
+        self.window_seconds = window_seconds
+        self.threshold = threshold
+        self._bands: List[Dict[int, Set[int]]] = [{} for _ in range(BANDS)]
+        self._clusters: Dict[int, Cluster] = {}
+        self._expiry: "deque[Tuple[float, int]]" = deque()   # (last_seen when queued, cluster_id)
+        self._next_id = 1
+        self._lock = threading.Lock()
+        self.stats = {"observed": 0, "new_clusters": 0, "duplicates": 0, "expired": 0}
+
+    def _expire(self, now: float) -> None:
+        cutoff = now - self.window_seconds
+        while self._expiry and self._expiry[0][0] <= cutoff:
+            queued_at, cid = self._expiry.popleft()
+            cluster = self._clusters.get(cid)
+            # Skip stale entries: the cluster was refreshed after this entry was queued
+            if cluster is None or cluster.last_seen != queued_at:
+                continue
+            for band, key in zip(self._bands, band_keys(cluster.signature)):
+                members = band.get(key)
+                if members is not None:
+                    members.discard(cid)
+                    if not members:
+                        del band[key]
+            del self._clusters[cid]
+            self.stats["expired"] += 1
+
+    def observe(self, description: str, now: Optional[float] = None) -> Tuple[Cluster, bool]:
+        """Attach the incident to a live near-duplicate cluster, or start a new one."""
+        signature = minhash(description)
+        now = time.time() if now is None else now
+        keys = band_keys(signature)
+        with self._lock:
+            self._expire(now)
+            self.stats["observed"] += 1
+
+            best: Optional[Cluster] = None
+            best_score = self.threshold
+            seen: Set[int] = set()
+            for band, key in zip(self._bands, keys):
+                for cid in band.get(key, ()):
+                    if cid in seen:
+                        continue
+                    seen.add(cid)
+                    score = similarity(signature, self._clusters[cid].signature)
+                    if score >= best_score:
+                        best, best_score = self._clusters[cid], score
+
+            if best is not None:
+                best.count += 1
+                best.last_seen = now
+                self._expiry.append((now, best.cluster_id))
+                self.stats["duplicates"] += 1
+                return best, False
+
+            cluster = Cluster(self._next_id, signature, description, now, now)
+            self._next_id += 1
+            self._clusters[cluster.cluster_id] = cluster
+            for band, key in zip(self._bands, keys):
+                band.setdefault(key, set()).add(cluster.cluster_id)
+            self._expiry.append((now, cluster.cluster_id))
+            self.stats["new_clusters"] += 1
+            return cluster, True
+
+    def live_clusters(self) -> int:
+        with self._lock:
+            return len(self._clusters)
+
+
+# -------------------------
+# Benchmark
+# -------------------------
+
+def _storm(count: int, storms: int = 20, noise_ratio: float = 0.2) -> List[str]:
+    """Synthetic feed: a few storms of reworded alerts plus unrelated noise."""
+    services = ["payments-api", "auth-service", "orders-db", "search-cluster", "vpn-gateway",
+                "email-relay", "inventory-api", "reporting-etl", "sso-portal", "file-share"]
+    templates = [
+        "{svc} is down, users get 503 errors when calling {svc} from the web app in region {r}",
+        "Production database for {svc} refuses all connections, every app that depends on it fails",
+        "Monitoring shows {svc} latency above 5 seconds and error rate at 40 percent since {t}",
+    ]
+    base = []
+    for s in range(storms):
+        svc = services[s % len(services)] + f"-{s}"
+        base.append(random.choice(templates).format(svc=svc, r=s % 4, t=f"{s % 12}:00"))
+    feed = []
+    for i in range(count):
+        if random.random() < noise_ratio:
+            words = random.sample(["printer", "laptop", "monitor", "wifi", "badge", "teams",
+                                   "outlook", "password", "keyboard", "license", "vpn", "disk"], 6)
+            feed.append(f"User {i} reports " + " ".join(words))
+        else:
+            text = random.choice(base)
+            feed.append(text + random.choice(["", " please help", " (reported again)", " urgent"]))
+    return feed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Near-duplicate incident collapsing.")
+    parser.add_argument("--bench", action="store_true")
+    parser.add_argument("--count", type=int, default=60000)
+    parser.add_argument("--storms", type=int, default=20)
+    args = parser.parse_args()
+    if not args.bench:
+        parser.print_help()
+        return
+
+    feed = _storm(args.count, args.storms)
+    deduper = IncidentDeduper()
+    started = time.perf_counter()
+    now = time.time()
+    for i, text in enumerate(feed):
+        # Spread the feed over one simulated minute
+        deduper.observe(text, now=now + 60.0 * i / len(feed))
+    elapsed = time.perf_counter() - started
+    s = deduper.stats
+    print(f"[BENCH] {s['observed']} incidents in {elapsed:.2f}s = {s['observed'] / elapsed:,.0f} incidents/s")
+    print(f"[BENCH] {s['new_clusters']} clusters (LLM calls/tickets), {s['duplicates']} collapsed "
+          f"({s['duplicates'] / s['observed']:.1%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,369 @@
+# Escalation Email Outbox (persistent queue + pooled, retrying delivery)
+
+"""
+demo for:
+- Triage never blocks on email: alerts go into a persistent SQLite outbox
+- A background worker pool shares one keep-alive requests.Session (connection pool)
+- Connect/read timeouts, bounded retries with jittered exponential backoff, Retry-After
+- Idempotency keys: an alert is enqueued once per key and the key is sent as an
+  Idempotency-Key header, so a retry after a lost response is never delivered twice
+- Alerts left undelivered by a crashed run are resumed at the next startup
+- A local HTTP stub mail API for testing
+
+Try it locally:
+    python -m workshop1.email_outbox --stub-server --port 8766 --fail-rate 0.3
+    python -m workshop1.email_outbox --demo --url http://127.0.0.1:8766/send --count 50
+"""
+
+import argparse
+import atexit
+import hashlib
+import json
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, Optional, Tuple
+import requests
+from requests.adapters import HTTPAdapter
+from workshop1.ticket_ids import new_id
+
+# -------------------------
+# Configuration
+# -------------------------
+
+DEFAULT_OUTBOX_PATH = "email_outbox.sqlite3"
+DEFAULT_WORKERS = 4
+DEFAULT_MAX_ATTEMPTS = 6
+DEFAULT_BASE_DELAY = 0.5          # seconds, first retry window
+DEFAULT_MAX_DELAY = 30.0          # seconds, cap for one backoff window
+DEFAULT_TIMEOUT = (3.05, 10.0)    # (connect, read) seconds
+
+RETRYABLE_STATUS = {408, 425, 429, 500, 502, 503, 504}
+
+
+def backoff_delay(attempt: int, base: float = DEFAULT_BASE_DELAY, cap: float = DEFAULT_MAX_DELAY) -> float:
+    """'Full jitter' backoff: random delay in [0, min(cap, base * 2^attempt)]."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+# -------------------------
+# Outbox
+# -------------------------
+
+class EmailOutbox:
+    """Persistent outbox drained by a pool of delivery threads."""
+
+    def __init__(self,
+                 api_url: str,
+                 api_key: str,
+                 path: str = DEFAULT_OUTBOX_PATH,
+                 workers: int = DEFAULT_WORKERS,
+                 max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+                 timeout: Tuple[float, float] = DEFAULT_TIMEOUT,
+                 verbose: bool = True):
+        self.api_url = api_url
+        self.api_key = api_key
+        self.max_attempts = max_attempts
+        self.timeout = timeout
+        self.verbose = verbose
+        self.stats = {"enqueued": 0, "duplicates_skipped": 0, "sent": 0, "retries": 0, "failed": 0}
+
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS outbox ("
+            " id TEXT PRIMARY KEY,"
+            " idempotency_key TEXT NOT NULL UNIQUE,"
+            " payload TEXT NOT NULL,"
+            " status TEXT NOT NULL,"           # pending | sending | sent | failed
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " next_attempt_at REAL NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " last_error TEXT)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_outbox_due ON outbox(status, next_attempt_at)")
+        # Rows left in 'sending' by a crashed process go back to the queue;
+        # the idempotency key makes re-sending them safe.
+        self._db.execute("UPDATE outbox SET status = 'pending' WHERE status = 'sending'")
+
+        # One shared keep-alive connection pool for all workers
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(workers, 1))
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({"Content-Type": "application/json", "X-API-Key": api_key})
+
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._stopping = False
+        self._threads = [
+            threading.Thread(target=self._worker, name=f"email-outbox-{i}", daemon=True)
+            for i in range(max(workers, 1))
+        ]
+        for t in self._threads:
+            t.start()
+        atexit.register(self.close)
+
+    # ---- producer side ----
+
+    def enqueue(self,
+                to: Any,
+                subject: str,
+                body: str,
+                idempotency_key: Optional[str] = None) -> Optional[str]:
+        """
+        Persist an email and return its outbox id immediately.
+        Returns None if an email with the same idempotency key was already queued.
+        """
+        payload = {"to": to, "subject": subject, "body": body}
+        if idempotency_key is None:
+            canonical = json.dumps(payload, sort_keys=True)
+            idempotency_key = hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+        outbox_id = new_id("MAIL-")   # time-ordered: ids sort by enqueue time
+        now = time.time()
+        with self._wakeup:
+            cur = self._db.execute(
+                "INSERT OR IGNORE INTO outbox (id, idempotency_key, payload, status, next_attempt_at, created_at)"
+                " VALUES (?, ?, ?, 'pending', ?, ?)",
+                (outbox_id, idempotency_key, json.dumps(payload), now, now),
+            )
+            if cur.rowcount == 0:
+                self.stats["duplicates_skipped"] += 1
+                return None
+            self.stats["enqueued"] += 1
+            self._wakeup.notify()
+        return outbox_id
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return self._db.execute(
+                "SELECT COUNT(*) FROM outbox WHERE status IN ('pending', 'sending')"
+            ).fetchone()[0]
+
+    def drain(self, timeout: float = 30.0) -> bool:
+        """Wait until nothing is pending (or timeout). Returns True if fully drained."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.pending_count() == 0:
+                return True
+            time.sleep(0.05)
+        return self.pending_count() == 0
+
+    def close(self, drain_timeout: float = 10.0) -> None:
+        """Give in-flight alerts a chance to go out, then stop the workers.
+        Anything still pending stays in the outbox for the next run."""
+        if self._stopping:
+            return
+        self.drain(drain_timeout)
+        with self._wakeup:
+            self._stopping = True
+            self._wakeup.notify_all()
+        for t in self._threads:
+            t.join(timeout=self.timeout[0] + self.timeout[1])
+        self.session.close()
+
+    # ---- consumer side ----
+
+    def _claim(self) -> Optional[Tuple[str, str, str, int]]:
+        """Pick the next due message and mark it 'sending' (caller holds the lock)."""
+        row = self._db.execute(
+            "SELECT id, idempotency_key, payload, attempts FROM outbox"
+            " WHERE status = 'pending' AND next_attempt_at <= ?"
+            " ORDER BY next_attempt_at LIMIT 1",
+            (time.time(),),
+        ).fetchone()
+        if row is not None:
+            self._db.execute("UPDATE outbox SET status = 'sending' WHERE id = ?", (row[0],))
+        return row
+
+    def _next_due_in(self) -> float:
+        row = self._db.execute(
+            "SELECT MIN(next_attempt_at) FROM outbox WHERE status = 'pending'"
+        ).fetchone()
+        if row[0] is None:
+            return 1.0
+        return max(0.0, min(1.0, row[0] - time.time()))
+
+    def _worker(self) -> None:
+        while True:
+            with self._wakeup:
+                claimed = None
+                while not self._stopping:
+                    claimed = self._claim()
+                    if claimed is not None:
+                        break
+                    self._wakeup.wait(timeout=self._next_due_in())
+                if claimed is None:
+                    return
+            self._deliver(*claimed)
+
+    def _deliver(self, outbox_id: str, key: str, payload: str, attempts: int) -> None:
+        """One delivery attempt; the HTTP call happens outside the lock."""
+        retry_after: Optional[float] = None
+        try:
+            response = self.session.post(
+                self.api_url,
+                data=payload,
+                headers={"Idempotency-Key": key},
+                timeout=self.timeout,
+            )
+            status = response.status_code
+            # 409 = the mail API already processed this key: treat as delivered
+            if 200 <= status < 300 or status == 409:
+                self._finish(outbox_id, "sent", None)
+                return
+            error = f"HTTP {status}: {response.text[:200]}"
+            retryable = status in RETRYABLE_STATUS
+            if response.headers.get("Retry-After", "").isdigit():
+                retry_after = float(response.headers["Retry-After"])
+        except Exception as e:
+            # Not only RequestException: any error here must not kill the worker and
+            # leave the row stuck in 'sending'
+            error = f"{type(e).__name__}: {e}"
+            retryable = True
+
+        attempts += 1
+        if not retryable or attempts >= self.max_attempts:
+            self._finish(outbox_id, "failed", error, attempts)
+            return
+        delay = max(backoff_delay(attempts), retry_after or 0.0)
+        with self._wakeup:
+            self.stats["retries"] += 1
+            self._db.execute(
+                "UPDATE outbox SET status = 'pending', attempts = ?, next_attempt_at = ?, last_error = ?"
+                " WHERE id = ?",
+                (attempts, time.time() + delay, error, outbox_id),
+            )
+            self._wakeup.notify()
+        if self.verbose:
+            print(f"[OUTBOX] Retry {attempts}/{self.max_attempts - 1} for {outbox_id} in {delay:.2f}s ({error})")
+
+    def _finish(self, outbox_id: str, status: str, error: Optional[str], attempts: Optional[int] = None) -> None:
+        with self._lock:
+            self.stats[status] += 1
+            self._db.execute(
+                "UPDATE outbox SET status = ?, last_error = ?, attempts = COALESCE(?, attempts + 1) WHERE id = ?",
+                (status, error, attempts, outbox_id),
+            )
+        if self.verbose:
+            print(f"[OUTBOX] {outbox_id} {status}" + (f" ({error})" if error else ""))
+
+
+def unsent_count(path: str = DEFAULT_OUTBOX_PATH) -> int:
+    """Alerts still pending/sending in the outbox at `path` (0 if it does not exist); starts no workers."""
+    if not os.path.exists(path):
+        return 0
+    db = sqlite3.connect(path, timeout=30)
+    try:
+        return db.execute(
+            "SELECT COUNT(*) FROM outbox WHERE status IN ('pending', 'sending')"
+        ).fetchone()[0]
+    except sqlite3.OperationalError:   # file without an outbox table
+        return 0
+    finally:
+        db.close()
+
+
+# -------------------------
+# Local stub mail API (for testing)
+# -------------------------
+
+def run_stub_server(port: int = 8766, fail_rate: float = 0.0, latency: float = 0.0) -> ThreadingHTTPServer:
+    """
+    Start a stub mail API in a background thread and return the server.
+    It fails a fraction of requests with 503 and records delivered idempotency keys,
+    so duplicate deliveries show up in server.delivered_counts.
+    """
+    delivered: Dict[str, int] = {}
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, so pooled connections get reused
+
+        def log_message(self, *args: Any) -> None:
+            pass
+
+        def _reply(self, status: int, body: Dict[str, Any]) -> None:
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_POST(self) -> None:
+            length = int(self.headers.get("Content-Length", 0))
+            self.rfile.read(length)
+            if latency:
+                time.sleep(latency)
+            if random.random() < fail_rate:
+                self._reply(503, {"error": "temporarily unavailable"})
+                return
+            key = self.headers.get("Idempotency-Key", "")
+            with lock:
+                delivered[key] = delivered.get(key, 0) + 1
+                duplicate = delivered[key] > 1
+            self._reply(200, {"status": "accepted", "duplicate": duplicate})
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    server.delivered_counts = delivered  # type: ignore[attr-defined]
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+# -------------------------
+# Main entry point
+# -------------------------
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Email outbox utilities.")
+    parser.add_argument("--stub-server", action="store_true", help="Run the stub mail API until Ctrl-C")
+    parser.add_argument("--demo", action="store_true", help="Enqueue test alerts and wait for delivery")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--fail-rate", type=float, default=0.0)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--url", default=None)
+    parser.add_argument("--count", type=int, default=20)
+    parser.add_argument("--db", default=None, help="Outbox path (demo defaults to a temp file)")
+    args = parser.parse_args()
+
+    if args.stub_server:
+        server = run_stub_server(args.port, args.fail_rate, args.latency)
+        print(f"[STUB] Mail API listening on http://127.0.0.1:{args.port}/send (Ctrl-C to stop)")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            server.shutdown()
+        return
+
+    if args.demo:
+        server = None
+        url = args.url
+        if url is None:
+            server = run_stub_server(args.port, args.fail_rate, args.latency)
+            url = f"http://127.0.0.1:{args.port}/send"
+        db_path = args.db or os.path.join(tempfile.mkdtemp(prefix="outbox_demo_"), "outbox.sqlite3")
+        outbox = EmailOutbox(url, "demo-key", path=db_path, verbose=False)
+        started = time.perf_counter()
+        for i in range(args.count):
+            # Each alert is enqueued twice: the second enqueue is dropped by its idempotency key
+            for _ in range(2):
+                outbox.enqueue(["oncall@example.com"], f"[CRISIS] Demo alert {i}", "Body", f"demo-{i}")
+        enqueue_ms = (time.perf_counter() - started) * 1000
+        outbox.drain(timeout=60)
+        elapsed = time.perf_counter() - started
+        print(f"[DEMO] Enqueued {args.count} alerts in {enqueue_ms:.1f} ms (caller never waits on HTTP)")
+        print(f"[DEMO] Delivered in {elapsed:.2f}s: {outbox.stats}")
+        if server is not None:
+            duplicates = sum(1 for n in server.delivered_counts.values() if n > 1)
+            print(f"[DEMO] Stub server saw {len(server.delivered_counts)} unique keys, {duplicates} duplicates")
+        outbox.close()
+
+
+if __name__ == "__main__":
+    main()
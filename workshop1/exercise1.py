@@ -5,15 +5,16 @@
 #    pip install openai
 from openai import AzureOpenAI
 from common.bc_config import get_api_credentials, get_model_deployment_name
+from workshop1.governor import governed
 
 # 2) CREATE THE CLIENT (with credentials)
 # client = AzureOpenAI(**get_api_credentials())
 creds = get_api_credentials()
-client = AzureOpenAI(
+client = governed(AzureOpenAI(
     api_key=creds.get("api_key"),
     azure_endpoint=creds.get("azure_endpoint"),
     api_version=creds.get("api_version")
-)
+))  # rate-limit governor: paces requests to the deployment quota
 
 user_problem = "My computer won't turn on"
 
@@ -5,9 +5,10 @@
 #    pip install openai
 from openai import AzureOpenAI
 from common.bc_config import get_api_credentials, get_model_deployment_name
+from workshop1.governor import governed
 
 # 2) CREATE THE CLIENT (with credentials) — reusable, credentialed handle
-client = AzureOpenAI(**get_api_credentials())
+client = governed(AzureOpenAI(**get_api_credentials()))
 
 # Use your Azure deployment name (the model you've deployed in Azure OpenAI)
 DEPLOYMENT_NAME = get_model_deployment_name()
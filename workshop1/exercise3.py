@@ -2,13 +2,18 @@
 #    pip install openai
 from openai import AzureOpenAI
 from common.bc_config import get_api_credentials, get_model_deployment_name
+from workshop1.governor import governed
+from workshop1.chat_stream import stream_reply, format_stats
 
 # 2) CREATE THE CLIENT (with credentials)
-client = AzureOpenAI(**get_api_credentials())
+client = governed(AzureOpenAI(**get_api_credentials()))
 
 # Use your Azure deployment name (the model you've deployed in Azure OpenAI)
 DEPLOYMENT_NAME = get_model_deployment_name()
 
+# Toggle: if True, the chat below prints the reply as it is generated (Ctrl-C cancels just that reply)
+USE_STREAMING = True
+
 def basic_it_support(problem):
     """Most basic version - just works!"""
     # 3) CALL THE SERVICE (Chat Completion) — send prompt with deployment name
@@ -21,13 +26,31 @@ def basic_it_support(problem):
     return response.choices[0].message.content
 
 
+def basic_it_support_streaming(problem):
+    """Same call with stream=True: prints each delta as it arrives, returns the full text."""
+    result = stream_reply(
+        client,
+        model=DEPLOYMENT_NAME,
+        messages=[{"role": "user", "content": problem}],
+        max_tokens=50
+    )
+    print()
+    print(format_stats(result))
+    return result.text
+
+
 # Test it!
-print("Hello, how can I help you? (type 'quit' to exist.)")
-while True:
-    user_input = input("User: ")
-    if user_input and len(user_input.strip())>0 and user_input.lower() != "quit":
-        result = basic_it_support(user_input)
-        print(f"AI: {result}")
-    else:
-        break
-print("AI: bye.")
+if __name__ == "__main__":
+    print("Hello, how can I help you? (type 'quit' to exist.)")
+    while True:
+        user_input = input("User: ")
+        if user_input and len(user_input.strip())>0 and user_input.lower() != "quit":
+            if USE_STREAMING:
+                print("AI: ", end="", flush=True)
+                basic_it_support_streaming(user_input)
+            else:
+                result = basic_it_support(user_input)
+                print(f"AI: {result}")
+        else:
+            break
+    print("AI: bye.")
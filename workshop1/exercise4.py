@@ -1,64 +1,53 @@
 # IMPORT — SDK to talk to the service
 from openai import AzureOpenAI
 from common.bc_config import get_api_credentials, get_model_deployment_name
+from workshop1.governor import governed
+from workshop1.conversation import Conversation, run_forks
 
 # 2) CREATE THE CLIENT (with credentials)
-client = AzureOpenAI(**get_api_credentials())
+client = governed(AzureOpenAI(**get_api_credentials()))
 
 # Use your Azure deployment name (the model you've deployed in Azure OpenAI)
 DEPLOYMENT_NAME = get_model_deployment_name()  # e.g., "my-gpt4o-mini-deploy"
 
 # Initialize conversation with system message
-messages = [
-    {
-        "role": "system",
-        "content": "You are an IT support specialist. Ask clarifying questions."
-    }
-]
+# (Conversation keeps the messages list for us: conversation.messages() is what gets sent)
+conversation = Conversation("You are an IT support specialist. Ask clarifying questions.")
 print("Hello, how can I help you? ")
 
 # First user message
 user_message = "My computer is slow"
-messages.append({
-    "role": "user",
-    "content": user_message
-})
 print(f"User: {user_message}")
 
 # Get AI response
-response = client.chat.completions.create(
-    model=DEPLOYMENT_NAME,
-    messages=messages
-)
-result = response.choices[0].message.content
+# ask() sends the history + the new user message, then adds both the
+# user message and the AI response to the conversation
+result = conversation.ask(client, user_message, model=DEPLOYMENT_NAME)
 print(f"AI: {result}")
 
-# Add AI response to conversation
-messages.append({
-    "role": "assistant",
-    "content": result
-})
-
 # Continue conversation - AI remembers previous conversation!
 # Second user message
 user_message = "It started after Windows update"
-messages.append({
-    "role": "user",
-    "content": user_message
-})
 print(f"User: {user_message}")
 
 # Get AI response
 # AI can now reference "slow computer" AND "Windows update"
-response = client.chat.completions.create(
-    model=DEPLOYMENT_NAME,
-    messages=messages
-)
-result = response.choices[0].message.content
+result = conversation.ask(client, user_message, model=DEPLOYMENT_NAME)
 print(f"AI: {result}")
 
-# Add AI response to conversation
-messages.append({
-    "role": "assistant",
-    "content": result
-})
+# What-if: try several follow-ups from the same point in the conversation.
+# fork() does not copy the history (all forks share it), and the forks run at the same time.
+follow_ups = [
+    "I already rolled the update back and it is still slow",
+    "Only Outlook and Teams are slow",
+    "The fan has been very loud since then",
+]
+forks = [(conversation.fork(), text) for text in follow_ups]
+# A fork can also swap the system prompt, e.g. to compare answer styles
+forks.append((conversation.fork("You are an IT support specialist. Answer in at most 3 short bullet points."),
+              follow_ups[0]))
+
+for (fork, text), answer in zip(forks, run_forks(client, forks, model=DEPLOYMENT_NAME)):
+    print(f"\n--- what-if ({fork.system_prompt}) ---")
+    print(f"User: {text}")
+    print(f"AI: {answer}")
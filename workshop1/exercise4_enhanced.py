@@ -1,16 +1,59 @@
+import argparse
 from openai import AzureOpenAI
 from common.bc_config import get_api_credentials, get_model_deployment_name
+from workshop1.governor import governed
+from workshop1.chat_memory import ConversationMemory, llm_summarizer
+from workshop1.retrieval_memory import RetrievalMemory
+from workshop1.chat_stream import stream_reply, format_stats
+from workshop1.session_store import SessionStore, HISTORY_PAGE_SIZE
 
-def run_chat_loop(system_prompt=None):
-    client = AzureOpenAI(**get_api_credentials())
+def show_history(store, session_id, system_prompt):
+    """Page through the saved session; only one page at a time is read from disk."""
+    print(f"system: {system_prompt}")
+    total = store.count(session_id)
+    start = 0
+    while start < total:
+        for i, m in enumerate(store.page(session_id, start, HISTORY_PAGE_SIZE), start=start):
+            print(f"[{i}] {m['role']}: {m['content']}")
+        start += HISTORY_PAGE_SIZE
+        if start < total and input(f"-- {start}/{total} shown; Enter for more, 'q' to stop -- ").strip().lower() == "q":
+            break
+
+def run_chat_loop(system_prompt=None, stream=True, session_id=None, store=None, retrieve=True):
+    client = governed(AzureOpenAI(**get_api_credentials()))
 
     DEPLOYMENT_NAME = get_model_deployment_name()
 
-    if system_prompt is None:
-        system_prompt = "You are an IT support specialist. Ask clarifying questions."
+    # Every turn is appended to an on-disk session log, so a session can be resumed by ID
+    store = store or SessionStore()
+    if session_id is not None:
+        meta = store.meta(session_id)
+        system_prompt = meta["system_prompt"]
+    else:
+        if system_prompt is None:
+            system_prompt = "You are an IT support specialist. Ask clarifying questions."
+        session_id = store.create(system_prompt)
 
-    messages = [{"role": "system", "content": system_prompt}]
+    # Pins the system prompt and recent turns; older turns are summarized to stay within the token budget
+    memory = ConversationMemory(
+        system_prompt,
+        summarize=llm_summarizer(client, DEPLOYMENT_NAME),
+        on_summary=lambda summary, summarized: store.update_meta(session_id, summary=summary,
+                                                                  summarized=summarized))
+    # Every finished exchange is indexed; the top-k relevant ones that already left the
+    # recent window are sent with the next question (summaries lose error codes, KB numbers, ...)
+    retrieval = RetrievalMemory()
+    resumed = store.count(session_id) > 0
+    if resumed:
+        # Resume from the saved summary plus the turns after it, not the whole log
+        meta = store.meta(session_id)
+        memory.restore(meta["summary"], list(store.iter_messages(session_id, meta["summarized"])),
+                       meta["summarized"])
+        retrieval.add_messages(store.iter_messages(session_id))
+    # One entry per streamed turn: time-to-first-token, tokens, tokens/s
+    turn_stats = []
 
+    print(f"Session {session_id} ({'resumed, ' if resumed else ''}{store.count(session_id)} messages)")
     print("Interactive chat. Type 'exit' or 'quit' to stop, 'reset' to clear conversation.")
     try:
         while True:
@@ -21,33 +64,80 @@ def run_chat_loop(system_prompt=None):
                 print("Exiting.")
                 break
             if user_input.lower() == "reset":
-                messages = [{"role": "system", "content": system_prompt}]
-                print("Conversation reset.")
+                memory.reset()
+                retrieval = RetrievalMemory()
+                session_id = store.create(system_prompt)
+                print(f"Conversation reset. New session {session_id}")
                 continue
             if user_input.lower() == "show history":
-                for m in messages:
-                    print(f"{m['role']}: {m['content']}")
+                show_history(store, session_id, system_prompt)
+                continue
+            if user_input.lower() == "show memory":
+                print(memory.stats())
+                print(retrieval.stats())
+                continue
+            if user_input.lower() == "show stats":
+                for i, stats in enumerate(turn_stats, start=1):
+                    print(f"turn {i}: {stats}")
                 continue
 
-            messages.append({"role": "user", "content": user_input})
+            memory.add("user", user_input)
+            cancelled = False
+            # Search only exchanges already summarized away; the recent window is sent anyway
+            context = retrieval.context_for(user_input, limit=memory.summarized // 2) if retrieve else None
+            messages = memory.messages(context)
+            retrieval.record_request(messages)
 
             try:
-                response = client.chat.completions.create(
-                    model=DEPLOYMENT_NAME,
-                    messages=messages
-                )
-                assistant_text = response.choices[0].message.content
+                if stream:
+                    # Ctrl-C here cancels only this reply; the partial text is kept
+                    print("*******************\nAI: ", end="", flush=True)
+                    result = stream_reply(client, model=DEPLOYMENT_NAME, messages=messages)
+                    print()
+                    print(format_stats(result))
+                    turn_stats.append(result.as_dict())
+                    assistant_text = result.text
+                    cancelled = result.cancelled
+                else:
+                    response = client.chat.completions.create(
+                        model=DEPLOYMENT_NAME,
+                        messages=messages
+                    )
+                    assistant_text = response.choices[0].message.content
+                    print(f"*******************\nAI: {assistant_text}")
             except Exception as e:
-                print(f"API error: {e}")
+                print(f"\nAPI error: {e}")
                 # remove last user message on error or keep depending on desired behavior
-                messages.pop()
+                memory.pop()
                 continue
 
-            print(f"*******************\nAI: {assistant_text}")
-            messages.append({"role": "assistant", "content": assistant_text})
+            if not assistant_text:
+                # Cancelled before the first token: drop the unanswered question
+                memory.pop()
+                continue
+            store.append(session_id, "user", user_input)
+            if cancelled:
+                store.append(session_id, "assistant", assistant_text, cancelled=True)
+            else:
+                store.append(session_id, "assistant", assistant_text)
+            memory.add("assistant", assistant_text)
+            retrieval.add(user_input, assistant_text)
 
     except KeyboardInterrupt:
         print("\nInterrupted. Exiting.")
 
+    stats = retrieval.stats()
+    if stats["full_history_tokens"]:
+        print(f"[MEMORY] prompt tokens sent: {stats['prompt_tokens_sent']} vs {stats['full_history_tokens']} "
+              f"with the full history ({stats['token_savings']:.0%} saved)")
+
 if __name__ == "__main__":
-    run_chat_loop()
+    parser = argparse.ArgumentParser(description="Interactive IT support chat.")
+    parser.add_argument("--session", default=None, help="Resume a saved session by ID")
+    parser.add_argument("--list-sessions", action="store_true", help="Show the most recent sessions")
+    args = parser.parse_args()
+    if args.list_sessions:
+        for session in SessionStore().list_sessions():
+            print(f"{session['session_id']}  {session['messages']:>6} messages")
+    else:
+        run_chat_loop(session_id=args.session)
@@ -5,19 +5,27 @@
 #    pip install openai
 from openai import AzureOpenAI
 from common.bc_config import get_api_credentials, get_model_deployment_name
+from workshop1.governor import governed
+from workshop1.response_cache import ResponseCache
 
 # 2) CREATE THE CLIENT (with credentials) — reusable, credentialed handle
 creds = get_api_credentials()
-client = AzureOpenAI(**creds)
+client = governed(AzureOpenAI(**creds))
 
 # Use your Azure deployment name (the model you've deployed in Azure OpenAI)
 DEPLOYMENT_NAME = get_model_deployment_name()
 
+# Repeat prompts are answered from the cache; set to False to always call the model
+USE_RESPONSE_CACHE = True
+response_cache = ResponseCache()
+
 def improved_it_support(problem: str) -> str:
     """Professional version with system role, low temperature, and token limit."""
     # 3) CALL THE SERVICE (Chat Completion) — send prompt with deployment name
 
-    response = client.chat.completions.create(
+    content = response_cache.get_or_create(
+        client,
+        bypass=not USE_RESPONSE_CACHE,
         model=DEPLOYMENT_NAME,
         messages=[
             {
@@ -33,8 +41,8 @@ def improved_it_support(problem: str) -> str:
         temperature=0.1,  # Low temperature → consistent, reliable guidance
         max_tokens=500    # Bound response length for predictable output
     )
-    # 4) PROCESS THE RESPONSE — extract assistant message
-    return response.choices[0].message.content
+    # 4) PROCESS THE RESPONSE — assistant message (fresh or cached)
+    return content
 
 # Test it
 user_problem = "My computer won't turn on"
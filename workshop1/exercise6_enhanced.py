@@ -3,20 +3,37 @@
 
 from openai import AzureOpenAI
 from common.bc_config import get_api_credentials, get_model_deployment_name
+from workshop1.governor import governed
+from workshop1.response_cache import ResponseCache
 import json
 
 # 2) CREATE THE CLIENT (with credentials) — reusable, credentialed handle
 creds = get_api_credentials()
-client = AzureOpenAI(**creds)
+client = governed(AzureOpenAI(**creds))
 
 # Use your Azure deployment name (the model you've deployed in Azure OpenAI)
 DEPLOYMENT_NAME = get_model_deployment_name()
 
+# Repeat prompts are answered from the cache; set to False to always call the model
+USE_RESPONSE_CACHE = True
+response_cache = ResponseCache()
+
+def _is_json(text: str) -> bool:
+    """Only cache replies that actually parse."""
+    try:
+        json.loads(text)
+    except json.JSONDecodeError:
+        return False
+    return True
+
 def improved_it_support_json(problem: str) -> dict:
     """Enhanced version with structured JSON response format guarantee."""
     # 3) CALL THE SERVICE with response_format to enforce JSON output
 
-    response = client.chat.completions.create(
+    content = response_cache.get_or_create(
+        client,
+        bypass=not USE_RESPONSE_CACHE,
+        cacheable=_is_json,
         model=DEPLOYMENT_NAME,
         messages=[
             {
@@ -34,8 +51,7 @@ def improved_it_support_json(problem: str) -> dict:
         max_tokens=1000   # Bound response length for predictable output
     )
     # 4) PROCESS THE RESPONSE — parse JSON and return as dict
-    result_text = response.choices[0].message.content
-    return json.loads(result_text)
+    return json.loads(content)
 
 # Test it
 user_problem = "Customer's iPhone 12 has cracked screen. Happened yesterday (2025-11-20) when dropped. Touch still works but display shows lines. Customer needs it by Friday."
@@ -71,7 +87,8 @@ Return this JSON structure:
 }}
 """
 
-result = improved_it_support_json(prompt)
-print(f"User: {user_problem}\n")
-print("AI Response (as JSON):")
-print(json.dumps(result, indent=2))
+if __name__ == "__main__":
+    result = improved_it_support_json(prompt)
+    print(f"User: {user_problem}\n")
+    print("AI Response (as JSON):")
+    print(json.dumps(result, indent=2))
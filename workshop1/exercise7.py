@@ -7,19 +7,36 @@ demo for:
 - Simple end-to-end workflow orchestration:
   - LLM triage
   - Ticket creation (simulated)
-  - "Save to DB" (simulated)
-  - Email escalation (simulated or real via SMTP)
+  - "Save to DB" (local SQLite incident store)
+  - Email escalation (simulated, or real via a retrying background outbox)
+- Optional request hedging: a slow triage call gets a duplicate request, first reply wins
+- Optional deployment pool: calls spread over several deployments with failover
+- Circuit breaker: while the LLM is down, incidents get a keyword triage (flagged for
+  re-triage) instead of stopping the program; they are re-triaged when it recovers
 """
 
+import contextvars
 import json
 import os
 import sys
-import uuid
-from typing import List, Dict, Any
-import requests
+import threading
+import time
+from typing import List, Dict, Any, Callable, Optional
 import json
 from openai import AzureOpenAI
 from common.bc_config import get_api_credentials, get_model_deployment_name, get_email_receiver, get_email_api_info
+from workshop1.circuit_breaker import CLOSED, RetriageQueue, guarded
+from workshop1.dedup import IncidentDeduper
+from workshop1.email_outbox import EmailOutbox, unsent_count
+from workshop1.fast_triage import KeywordTriage
+from workshop1.governor import governed
+from workshop1.hedging import hedged
+from workshop1.incident_store import IncidentStore
+from workshop1.router import load_pool, routed
+from workshop1.response_cache import ResponseCache
+from workshop1.stream_json import IncrementalJSONObjectParser
+from workshop1.telemetry import Telemetry
+from workshop1.ticket_ids import new_ticket_id
 
 # -------------------------
 # Configuration
@@ -33,8 +50,53 @@ DEFAULT_MAX_TOKENS = 200
 # Toggle: if False, email is only simulated (printed to console)
 USE_REAL_EMAIL = False  # True  False
 
+# Toggle: if False, every call goes to the model (response cache bypassed)
+USE_RESPONSE_CACHE = True
+
+# Toggle: if True, obvious incidents are triaged by keyword match without calling the LLM
+USE_FAST_PATH = True
+
+# Toggle: if True, near-duplicate incidents (alert storms) reuse the first incident's ticket
+USE_DEDUP = True
+DEDUP_WAIT_SECONDS = 30
+
+# Toggle: if True, stream the completion and act on severity before it finishes
+USE_STREAMING = False
+
+# Toggle: if True, time every stage and count tokens (JSON span logs on stderr)
+USE_TELEMETRY = False
+
+# Toggle: if True, a triage call slower than the recent p95 is sent again (<= 5% extra traffic)
+USE_HEDGING = False
+
+# Toggle: if True, calls go to the deployment pool in $WORKSHOP_DEPLOYMENTS (workshop1.router):
+# latency-weighted choice, failover on 429/5xx, unhealthy deployments ejected
+USE_ROUTER = False
+
 # Initialize Azure OpenAI client (with credentials) — reusable, credentialed handle
-client = AzureOpenAI(**get_api_credentials())
+base_client = routed(load_pool()) if USE_ROUTER else governed(AzureOpenAI(**get_api_credentials()))
+
+# Every model call goes through the process-wide circuit breaker (client.breaker): while it is
+# open, calls fail fast and call_triage_llm falls back to degraded_triage()
+client = guarded(base_client)
+
+# Same client, with slow non-streaming calls hedged; hedged_client.hedger.snapshot() for the metrics
+hedged_client = guarded(hedged(base_client))
+
+# Repeat incident descriptions are answered from memory/disk instead of a new round trip
+response_cache = ResponseCache()
+
+# Durable incident store (SQLite, WAL mode) — replaces the old simulated DB step
+incident_store = IncidentStore()
+
+# Sliding-window near-duplicate index (MinHash + LSH), in memory
+incident_deduper = IncidentDeduper()
+
+# Per-stage spans + token counters; telemetry.prometheus_text() for scraping
+telemetry = Telemetry(enabled=USE_TELEMETRY, service="exercise7")
+
+# Tickets triaged in degraded mode, re-triaged once the breaker closes again
+retriage_queue = RetriageQueue()
 
 
 # -------------------------
@@ -125,39 +187,192 @@ def build_messages(description: str) -> List[Dict[str, Any]]:
     ]
 
 
-def call_triage_llm(description: str, temperature: float, max_tokens: int) -> Dict[str, Any]:
-    """Call the chat completion API in JSON mode and return a Python dict."""
+# Keyword fast path, seeded from the few-shot examples above.
+# 10% of confident hits still go to the LLM so agreement can be measured.
+fast_triage = KeywordTriage(shadow_rate=0.1)
+fast_triage.seed_from_messages(build_messages(""))
+
+
+def call_triage_llm(description: str,
+                    temperature: float,
+                    max_tokens: int,
+                    use_fast_path: bool = True,
+                    use_cache: bool = True) -> Dict[str, Any]:
+    """
+    Call the chat completion API in JSON mode and return a Python dict.
+    use_fast_path / use_cache=False always ask the model (re-triage must not get the
+    keyword verdict or a cached reply back); the USE_* toggles still apply otherwise.
+    """
+    candidate = None
+    if USE_FAST_PATH and use_fast_path:
+        with telemetry.span("fast_path") as span:
+            candidate = fast_triage.match(description)
+            span.set(confident=candidate["confident"], severity=candidate["severity"])
+        if candidate["confident"] and not fast_triage.shadow_sample():
+            print(f"[FAST PATH] {candidate['severity']} from keywords {candidate['matched']} (LLM skipped)")
+            return fast_triage.to_result(description, candidate)
+
     messages = build_messages(description)
 
-    try:
-        response = client.chat.completions.create(
-            model=DEPLOYMENT_NAME,
-            messages=messages,
-            response_format={"type": "json_object"},
-            temperature=temperature,
-            max_tokens=max_tokens,
-        )
-    except Exception as e:
-        print("\n[ERROR] Failed to call OpenAI API:")
-        print(f"        {e}")
-        sys.exit(1)
+    # source stays "cache" unless a real response is recorded
+    with telemetry.span("llm_call", source="cache") as span:
+        try:
+            content = response_cache.get_or_create(
+                hedged_client if USE_HEDGING else client,
+                bypass=not (USE_RESPONSE_CACHE and use_cache),
+                cacheable=is_valid_triage_json,
+                on_response=span.record_response,
+                model=DEPLOYMENT_NAME,
+                messages=messages,
+                response_format={"type": "json_object"},
+                temperature=temperature,
+                max_tokens=max_tokens,
+            )
+        except Exception as e:
+            print("\n[ERROR] Failed to call OpenAI API:")
+            print(f"        {e}")
+            span.fail(type(e).__name__)
+            return degraded_triage(description, f"{type(e).__name__}: {e}")
+
+    with telemetry.span("json_parse"):
+        try:
+            data = json.loads(content)
+        except json.JSONDecodeError as e:
+            print("\n[ERROR] Model did not return valid JSON:")
+            print(f"        Raw content: {content!r}")
+            print(f"        JSON error : {e}")
+            return degraded_triage(description, "invalid JSON from the model")
+
+        # Basic validation
+        if not isinstance(data, dict):
+            print("\n[ERROR] JSON response is not an object:")
+            print(f"        {data!r}")
+            return degraded_triage(description, "reply is not a JSON object")
+
+        data = normalize_triage_data(data)
+    if candidate is not None:
+        fast_triage.record_llm_severity(candidate, data["severity"])
+    # The model answered: a good moment to re-triage anything still queued
+    start_retriage()
+    return data
 
-    content = response.choices[0].message.content
 
-    try:
-        data = json.loads(content)
-    except json.JSONDecodeError as e:
-        print("\n[ERROR] Model did not return valid JSON:")
-        print(f"        Raw content: {content!r}")
-        print(f"        JSON error : {e}")
-        sys.exit(1)
+def call_triage_llm_streaming(description: str,
+                              temperature: float,
+                              max_tokens: int,
+                              on_field: Optional[Callable[[str, Any], None]] = None) -> Dict[str, Any]:
+    """
+    Streaming variant of call_triage_llm (stream=True, no response cache).
+    on_field(key, value) fires as soon as a top-level field is complete in the
+    token stream, so "summary" and "severity" arrive while "actions" is still generating.
+    """
+    messages = build_messages(description)
+    parser = IncrementalJSONObjectParser()
+    # Usage arrives in one extra final chunk, only sent when asked for
+    extra = {"stream_options": {"include_usage": True}} if telemetry.enabled else {}
+
+    with telemetry.span("llm_call", stream=True) as span:
+        finish_reason, usage = None, None
+        try:
+            stream = client.chat.completions.create(
+                model=DEPLOYMENT_NAME,
+                messages=messages,
+                response_format={"type": "json_object"},
+                temperature=temperature,
+                max_tokens=max_tokens,
+                stream=True,
+                **extra,
+            )
+            for chunk in stream:
+                if getattr(chunk, "usage", None) is not None:
+                    usage = chunk.usage
+                # Azure sends a content-filter chunk with no choices first
+                if not chunk.choices:
+                    continue
+                finish_reason = chunk.choices[0].finish_reason or finish_reason
+                if not chunk.choices[0].delta.content:
+                    continue
+                for key, value in parser.feed(chunk.choices[0].delta.content):
+                    if on_field is not None:
+                        on_field(key, value)
+        except Exception as e:
+            print("\n[ERROR] Failed to stream from OpenAI API:")
+            print(f"        {e}")
+            span.fail(type(e).__name__)
+            return degraded_triage(description, f"{type(e).__name__}: {e}")
+        telemetry.record_usage(usage, finish_reason, model=DEPLOYMENT_NAME)
+
+    with telemetry.span("json_parse"):
+        try:
+            return parse_triage_json(parser.text)
+        except ValueError as e:
+            print("\n[ERROR] Streamed reply is not a valid triage object:")
+            print(f"        Raw content: {parser.text!r}")
+            print(f"        {e}")
+            return degraded_triage(description, "invalid JSON from the model")
+
+
+def degraded_triage(description: str, reason: str) -> Dict[str, Any]:
+    """Keyword severity + template actions while the LLM is unavailable (flagged needs_retriage)."""
+    print(f"[DEGRADED] LLM unavailable ({reason}) - keyword triage, ticket will be re-triaged.")
+    return fast_triage.degraded_result(description, reason)
+
+
+def retriage_pending() -> None:
+    """Re-run the LLM triage for tickets handled in degraded mode and update them."""
+    items = retriage_queue.drain()
+    for i, (ticket_id, description) in enumerate(items):
+        # The model itself: the keyword fast path would only repeat the degraded verdict
+        data = call_triage_llm(description, DEFAULT_TEMPERATURE, DEFAULT_MAX_TOKENS,
+                               use_fast_path=False, use_cache=False)
+        if data.get("needs_retriage"):
+            # Down again: keep this ticket and the rest for the next recovery
+            for item in reversed(items[i:]):
+                retriage_queue.requeue(*item)
+            return
+        previous = incident_store.get(ticket_id)
+        old_sev = previous["severity"] if previous else "NORMAL"
+        new_sev = str(data.get("severity", "NORMAL")).upper()
+        print(f"[RETRIAGE] {ticket_id}: {old_sev} -> {new_sev}")
+        save_to_db(ticket_id, description, {**data, "retriaged_from": old_sev})
+        if severity_score(new_sev) > severity_score(old_sev):
+            maybe_escalate_to_email(ticket_id, data)
+        retriage_queue.mark_done()
+
+
+_retriage_thread: Optional[threading.Thread] = None
+_retriage_lock = threading.Lock()
+
+
+def start_retriage() -> None:
+    """
+    Run retriage_pending in the background (one run at a time), so the caller is not held up.
+    Nothing to do while the breaker is not closed: the calls would only fail again.
+    """
+    global _retriage_thread
+    with _retriage_lock:
+        if not len(retriage_queue) or client.breaker.state != CLOSED:
+            return
+        if _retriage_thread is not None and _retriage_thread.is_alive():
+            return
+        _retriage_thread = threading.Thread(target=contextvars.copy_context().run, args=(retriage_pending,),
+                                            name="retriage", daemon=True)
+        _retriage_thread.start()
 
-    # Basic validation
-    if not isinstance(data, dict):
-        print("\n[ERROR] JSON response is not an object:")
-        print(f"        {data!r}")
-        sys.exit(1)
 
+def wait_for_retriage(timeout: float = 30.0) -> None:
+    """Let a running re-triage finish before the program exits (the thread is a daemon)."""
+    thread = _retriage_thread
+    if thread is not None:
+        thread.join(timeout)
+
+
+# Breaker closed again: the outage is over, re-triage what it degraded
+client.breaker.on_close(start_retriage)
+
+
+def normalize_triage_data(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Ensure the triage dict has summary, severity and a list of actions."""
     # Ensure expected keys exist (with fallbacks)
     data.setdefault("summary", "(no summary)")
     data.setdefault("severity", "NORMAL")
@@ -169,46 +384,96 @@ def call_triage_llm(description: str, temperature: float, max_tokens: int) -> Di
     return data
 
 
+def parse_triage_json(content: str) -> Dict[str, Any]:
+    """
+    Parse and normalize a triage reply.
+    Raises ValueError instead of exiting, so batch callers can keep going.
+    """
+    try:
+        data = json.loads(content)
+    except (TypeError, json.JSONDecodeError) as e:
+        raise ValueError(f"Model did not return valid JSON: {e}") from e
+
+    if not isinstance(data, dict):
+        raise ValueError(f"JSON response is not an object: {data!r}")
+
+    return normalize_triage_data(data)
+
+
+def is_valid_triage_json(content: str) -> bool:
+    """Only well-formed triage replies are worth caching."""
+    try:
+        parse_triage_json(content)
+    except ValueError:
+        return False
+    return True
+
+
 # -------------------------
 # Workflow steps
 # -------------------------
 
+@telemetry.instrument("ticket")
 def create_ticket_incident(summary: str, severity: str) -> str:
     """Simulate creating a ticket in a system."""
-    ticket_id = f"TICKET-{uuid.uuid4().hex[:6].upper()}"
+    ticket_id = new_ticket_id()  # time-ordered, collision-free
     print(f"[WORKFLOW] Creating ticket {ticket_id} ({severity}) - {summary}")
     return ticket_id
 
 
-def save_to_db_placeholder(ticket_id: str, description: str, data: Dict[str, Any]) -> None:
-    """Simulate saving the incident to a database."""
-    print(f"[WORKFLOW] (DB) Saving ticket {ticket_id} to database (simulated).")
-    # You could write to a local JSON file here in a real exercise.
+@telemetry.instrument("db_save")
+def save_to_db(ticket_id: str, description: str, data: Dict[str, Any]) -> None:
+    """Save the incident to the local SQLite store (group-committed in the background)."""
+    print(f"[WORKFLOW] (DB) Saving ticket {ticket_id} to {incident_store.path}.")
+    incident_store.add(ticket_id, description, data)
+    if data.get("needs_retriage"):
+        retriage_queue.add(ticket_id, description)
+        # Degraded by a bad reply (invalid JSON, not an object) rather than an outage, no
+        # on_close will come for it: try the model again right away (no-op while the breaker is open)
+        start_retriage()
+
+
+_email_outbox: Optional[EmailOutbox] = None
+_email_outbox_lock = threading.Lock()
 
 
-def _send_real_email(subject: str, body: str) -> None:
+def get_email_outbox() -> EmailOutbox:
+    """Create the outbox on the first real email (it needs the mail API settings)."""
+    global _email_outbox
+    with _email_outbox_lock:
+        if _email_outbox is None:
+            API_URL, API_KEY = get_email_api_info()
+            _email_outbox = EmailOutbox(API_URL, API_KEY)
+        return _email_outbox
+
+
+def resume_email_outbox() -> None:
     """
-    Only used if USE_REAL_EMAIL = True.
+    Start the outbox right away if an earlier run left alerts undelivered
+    (otherwise they would wait until the next CRISIS email is queued).
     """
-    API_URL, API_KEY = get_email_api_info()
-    print(f"[EMAIL] Sending real email to: {API_URL}")
-    email_receiver = json.loads(get_email_receiver())
-
-    payload = {
-        "to": email_receiver,
-        "subject": subject,
-        "body": body
-    }
+    if not USE_REAL_EMAIL:
+        return
+    left = unsent_count()
+    if left:
+        print(f"[EMAIL] Resuming {left} undelivered alert(s) from an earlier run.")
+        get_email_outbox()
 
-    headers = {
-        "Content-Type": "application/json",
-        "X-API-Key": API_KEY,
-    }
 
-    response = requests.post(API_URL, json=payload, headers=headers)
-    print("Status: ", response.status_code)
-    print("Response JSON:", response.json())
+def _send_real_email(subject: str, body: str, idempotency_key: Optional[str] = None) -> None:
+    """
+    Only used if USE_REAL_EMAIL = True.
+    Queues the email in the outbox and returns immediately; background workers
+    deliver it over a pooled session with timeouts and retries.
+    """
+    outbox = get_email_outbox()
+    email_receiver = json.loads(get_email_receiver())
 
+    outbox_id = outbox.enqueue(email_receiver, subject, body, idempotency_key)
+    if outbox_id is None:
+        print(f"[EMAIL] Alert {idempotency_key} is already in the outbox - not sending twice.")
+    else:
+        print(f"[EMAIL] Queued {outbox_id} for delivery to: {outbox.api_url}")
 
 
 def send_email_alert(ticket_id: str, severity: str, summary: str, actions: List[str]) -> None:
@@ -225,9 +490,9 @@ def send_email_alert(ticket_id: str, severity: str, summary: str, actions: List[
     body = "\n".join(body_lines)
 
     if USE_REAL_EMAIL:
-        print("[EMAIL] Sending real email...")
-        _send_real_email(subject, body)
-        print("[EMAIL] Email sent (or attempted).")
+        print("[EMAIL] Queueing real email...")
+        _send_real_email(subject, body, idempotency_key=f"{ticket_id}:{severity}")
+        print("[EMAIL] Email queued (delivery continues in the background).")
     else:
         print("[EMAIL] (Simulated) Would send email with:")
         print(f"        Subject: {subject}")
@@ -236,6 +501,7 @@ def send_email_alert(ticket_id: str, severity: str, summary: str, actions: List[
             print("         ", line)
 
 
+@telemetry.instrument("email")
 def maybe_escalate_to_email(ticket_id: str, data: Dict[str, Any]) -> None:
     """Decide whether to escalate via email based on severity."""
     severity = str(data.get("severity", "NORMAL")).upper()
@@ -245,29 +511,120 @@ def maybe_escalate_to_email(ticket_id: str, data: Dict[str, Any]) -> None:
         print("[WORKFLOW] No email escalation needed for NORMAL severity.")
 
 
+@telemetry.instrument("workflow")
 def run_workflow(description: str, temperature: float, max_tokens: int) -> None:
     """End-to-end workflow: triage → ticket → DB → email → dashboard."""
-    print("\n=== Calling LLM for triage ===")
-    data = call_triage_llm(description, temperature, max_tokens)
+    cluster = None
+    is_new = False
+    if USE_DEDUP:
+        cluster, is_new = incident_deduper.observe(description)
+        if not is_new and cluster.ready.wait(timeout=DEDUP_WAIT_SECONDS):
+            if cluster.result is not None:
+                print(f"\n[DEDUP] Near-duplicate of ticket {cluster.ticket_id} "
+                      f"({cluster.count} similar incidents in the window).")
+                print("[DEDUP] Reusing its triage result - no new LLM call, ticket or email.")
+                return
+            print("\n[DEDUP] The first incident of this storm failed - triaging this one separately.")
 
-    sev = str(data.get("severity", "NORMAL")).upper()
-    score = severity_score(sev)
+    try:
+        print("\n=== Calling LLM for triage ===")
+        data = call_triage_llm(description, temperature, max_tokens)
+
+        sev = str(data.get("severity", "NORMAL")).upper()
+        score = severity_score(sev)
+
+        print("\n=== LLM JSON Response ===")
+        print(f"Summary : {data.get('summary')}")
+        print(f"Severity: {sev} ({score}/100)")
+        print("Actions :")
+        for i, action in enumerate(data.get("actions", []), start=1):
+            print(f"  {i}. {action}")
+
+        print("\n=== Orchestrating Workflow ===")
+        ticket_id = create_ticket_incident(data.get("summary", ""), sev)
+        save_to_db(ticket_id, description, data)
+        maybe_escalate_to_email(ticket_id, data)
+        with telemetry.span("dashboard"):
+            print("[WORKFLOW] Updating dashboards (simulated).")
+        # Only the leader publishes: a follower that triaged itself (wait timed out, or the
+        # leader failed) keeps its own result and must not overwrite the cluster's
+        if is_new:
+            cluster.resolve(data, ticket_id)
+    finally:
+        # Whatever happened, never leave duplicates waiting DEDUP_WAIT_SECONDS on a dead leader
+        if is_new and not cluster.ready.is_set():
+            cluster.fail()
+
+    print("\n=== Workflow Complete ===")
+    print(f"Ticket ID: {ticket_id}")
+    print("Done.")
 
+
+@telemetry.instrument("workflow_streaming")
+def run_workflow_streaming(description: str, temperature: float, max_tokens: int) -> None:
+    """
+    Streaming workflow: ticket creation and the escalation decision start as soon as
+    severity + summary are complete; the email only waits for the actions list.
+    """
+    print("\n=== Streaming LLM triage ===")
+    started = time.perf_counter()
+    early: Dict[str, Any] = {}
+    outcome: Dict[str, Any] = {}
+    actions_ready = threading.Event()
+
+    def act_early() -> None:
+        sev = str(early["severity"]).upper()
+        outcome["ticket_id"] = create_ticket_incident(early["summary"], sev)
+        if sev in ("ALERT", "CRISIS"):
+            print(f"[WORKFLOW] {sev} decided early - email goes out as soon as actions arrive.")
+            actions_ready.wait()
+        maybe_escalate_to_email(outcome["ticket_id"], early)
+
+    # copy_context() so the worker's spans join this workflow's trace
+    worker = threading.Thread(target=contextvars.copy_context().run, args=(act_early,), daemon=True)
+
+    def on_field(key: str, value: Any) -> None:
+        early[key] = value
+        print(f"[STREAM] '{key}' complete after {(time.perf_counter() - started) * 1000:.0f} ms")
+        if "decided_at" not in outcome and "severity" in early and "summary" in early:
+            outcome["decided_at"] = time.perf_counter()
+            worker.start()
+
+    data = call_triage_llm_streaming(description, temperature, max_tokens, on_field=on_field)
+    completed_at = time.perf_counter()
+
+    # The early worker reads the same dict, so it sees the normalized actions
+    early.update(data)
+    actions_ready.set()
+    if "decided_at" in outcome:
+        worker.join()
+    else:
+        # Severity/summary never arrived mid-stream: fall back to the blocking order
+        outcome["decided_at"] = completed_at
+        outcome["ticket_id"] = create_ticket_incident(data.get("summary", ""), str(data["severity"]).upper())
+        maybe_escalate_to_email(outcome["ticket_id"], data)
+
+    sev = str(data.get("severity", "NORMAL")).upper()
     print("\n=== LLM JSON Response ===")
     print(f"Summary : {data.get('summary')}")
-    print(f"Severity: {sev} ({score}/100)")
+    print(f"Severity: {sev} ({severity_score(sev)}/100)")
     print("Actions :")
     for i, action in enumerate(data.get("actions", []), start=1):
         print(f"  {i}. {action}")
 
-    print("\n=== Orchestrating Workflow ===")
-    ticket_id = create_ticket_incident(data.get("summary", ""), sev)
-    save_to_db_placeholder(ticket_id, description, data)
-    maybe_escalate_to_email(ticket_id, data)
-    print("[WORKFLOW] Updating dashboards (simulated).")
+    save_to_db(outcome["ticket_id"], description, data)
+    with telemetry.span("dashboard"):
+        print("[WORKFLOW] Updating dashboards (simulated).")
+
+    decision_ms = (outcome["decided_at"] - started) * 1000
+    complete_ms = (completed_at - started) * 1000
+    print("\n=== Time to Decision ===")
+    print(f"Streaming (severity known): {decision_ms:.0f} ms")
+    print(f"Blocking (full completion): {complete_ms:.0f} ms")
+    print(f"Saved                     : {complete_ms - decision_ms:.0f} ms")
 
     print("\n=== Workflow Complete ===")
-    print(f"Ticket ID: {ticket_id}")
+    print(f"Ticket ID: {outcome['ticket_id']}")
     print("Done.")
 
 
@@ -281,6 +638,7 @@ def main() -> None:
     print("- Few-shot prompt engineering")
     print("- JSON-only output (response_format = json_object)")
     print("- Simple end-to-end workflow (ticket + DB + email)\n")
+    resume_email_outbox()
 
     description = input("Describe the incident: ").strip()
     if not description:
@@ -303,7 +661,22 @@ def main() -> None:
         print(f"Invalid max tokens '{max_tokens_str}', using default {DEFAULT_MAX_TOKENS}.")
         max_tokens = DEFAULT_MAX_TOKENS
 
-    run_workflow(description, temperature, max_tokens)
+    if USE_STREAMING:
+        run_workflow_streaming(description, temperature, max_tokens)
+    else:
+        run_workflow(description, temperature, max_tokens)
+
+    if telemetry.enabled:
+        print("\n=== Telemetry (Prometheus text format) ===")
+        print(telemetry.prometheus_text(), end="")
+        if USE_HEDGING:
+            print(hedged_client.hedger.prometheus_text(service="exercise7"), end="")
+    if USE_ROUTER:
+        print(f"\n[ROUTER] {base_client.router.snapshot()}")
+    wait_for_retriage()
+    if len(retriage_queue):
+        print(f"\n[RETRIAGE] {len(retriage_queue)} ticket(s) triaged by keywords only; "
+              f"they are re-triaged when the LLM is reachable again.")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,360 @@
+# Batch Incident Triage with Async Concurrency
+
+"""
+demo for:
+- Reading many incidents from a JSONL/CSV file (or stdin)
+- Triage through AsyncAzureOpenAI with a configurable concurrency limit
+- Writing one JSON result line per incident as soon as it finishes
+- Keeping going when a single incident fails
+- Keeping throughput during an LLM outage: the circuit breaker opens and incidents get a
+  degraded keyword triage (flagged needs_retriage) instead of waiting on failing calls
+- Reporting throughput, p50/p95/p99 latency and failure counts at the end
+
+Usage:
+    python -m workshop1.exercise7_batch incidents.jsonl --concurrency 16
+    cat incidents.csv | python -m workshop1.exercise7_batch - --format csv
+"""
+
+import argparse
+import asyncio
+import contextlib
+import csv
+import json
+import math
+import sys
+import time
+from typing import List, Dict, Any, Iterator, Optional, TextIO
+from openai import AsyncAzureOpenAI
+from common.bc_config import get_api_credentials
+from workshop1 import exercise7
+from workshop1.exercise7 import (
+    DEPLOYMENT_NAME,
+    DEFAULT_TEMPERATURE,
+    DEFAULT_MAX_TOKENS,
+    response_cache,
+    fast_triage,
+    incident_deduper,
+    build_messages,
+    parse_triage_json,
+    is_valid_triage_json,
+    severity_score,
+    create_ticket_incident,
+    save_to_db,
+    maybe_escalate_to_email,
+    resume_email_outbox,
+    retriage_queue,
+    start_retriage,
+    wait_for_retriage,
+)
+from workshop1.circuit_breaker import guarded
+from workshop1.governor import governed
+
+# -------------------------
+# Configuration
+# -------------------------
+
+DEFAULT_CONCURRENCY = 8
+
+# Initialize async Azure OpenAI client — one shared connection pool for all workers
+# (guarded: same process-wide circuit breaker as exercise7's sync client)
+async_client = guarded(governed(AsyncAzureOpenAI(**get_api_credentials())))
+
+
+# -------------------------
+# Input readers
+# -------------------------
+
+def _incident_from_record(record: Any, line_no: int) -> Dict[str, Any]:
+    """Accept {"id": ..., "description": ...}, {"text": ...} or a bare string."""
+    if isinstance(record, str):
+        return {"id": str(line_no), "description": record}
+    if isinstance(record, dict):
+        description = record.get("description") or record.get("text") or ""
+        return {"id": str(record.get("id", line_no)), "description": str(description)}
+    raise ValueError(f"Unsupported record type: {type(record).__name__}")
+
+
+def read_jsonl(stream: TextIO) -> Iterator[Dict[str, Any]]:
+    """One incident per line; plain-text lines are treated as the description."""
+    for line_no, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith("{") or line.startswith('"'):
+            try:
+                yield _incident_from_record(json.loads(line), line_no)
+                continue
+            except ValueError as e:
+                yield {"id": str(line_no), "description": "", "error": f"Bad input line: {e}"}
+                continue
+        yield {"id": str(line_no), "description": line}
+
+
+def read_csv(stream: TextIO) -> Iterator[Dict[str, Any]]:
+    """CSV with a 'description' (or 'text') column and an optional 'id' column."""
+    reader = csv.DictReader(stream)
+    for row_no, row in enumerate(reader, start=1):
+        yield _incident_from_record(row, row_no)
+
+
+def read_incidents(path: str, fmt: str = "auto") -> Iterator[Dict[str, Any]]:
+    """Read incidents from a file path, or from stdin when path is '-'."""
+    if fmt == "auto":
+        fmt = "csv" if path.lower().endswith(".csv") else "jsonl"
+    reader = read_csv if fmt == "csv" else read_jsonl
+
+    if path == "-":
+        yield from reader(sys.stdin)
+        return
+    with open(path, newline="", encoding="utf-8") as f:
+        yield from reader(f)
+
+
+# -------------------------
+# Async triage
+# -------------------------
+
+async def call_triage_llm_async(description: str, temperature: float, max_tokens: int) -> Dict[str, Any]:
+    """Async twin of exercise7.call_triage_llm (degraded keyword triage if the LLM call fails)."""
+    candidate = None
+    # Toggles are read from exercise7 at call time, so flipping them there (e.g. in benchmarks) applies here too
+    if exercise7.USE_FAST_PATH:
+        candidate = fast_triage.match(description)
+        if candidate["confident"] and not fast_triage.shadow_sample():
+            return fast_triage.to_result(description, candidate)
+
+    try:
+        content = await response_cache.aget_or_create(
+            async_client,
+            bypass=not exercise7.USE_RESPONSE_CACHE,
+            cacheable=is_valid_triage_json,
+            model=DEPLOYMENT_NAME,
+            messages=build_messages(description),
+            response_format={"type": "json_object"},
+            temperature=temperature,
+            max_tokens=max_tokens,
+        )
+        data = parse_triage_json(content)
+    except Exception as e:
+        # Includes CircuitOpenError: while the breaker is open this returns without a network call
+        return fast_triage.degraded_result(description, f"{type(e).__name__}: {e}")
+    if candidate is not None:
+        fast_triage.record_llm_severity(candidate, data["severity"])
+    start_retriage()
+    return data
+
+
+def run_workflow_steps(description: str, data: Dict[str, Any]) -> str:
+    """Ticket → DB → email for one triaged incident (blocking; run in a thread)."""
+    sev = str(data.get("severity", "NORMAL")).upper()
+    ticket_id = create_ticket_incident(data.get("summary", ""), sev)
+    save_to_db(ticket_id, description, data)
+    maybe_escalate_to_email(ticket_id, data)
+    return ticket_id
+
+
+async def triage_one(incident: Dict[str, Any],
+                     temperature: float,
+                     max_tokens: int,
+                     workflow: bool,
+                     leaders: Optional[Dict[int, "asyncio.Future"]] = None) -> Dict[str, Any]:
+    """
+    Triage a single incident and build its result line (never raises).
+    With `leaders`, near-duplicates of an earlier incident in this batch wait for
+    that incident's triage and ticket instead of making their own LLM call.
+    """
+    started = time.perf_counter()
+    result: Dict[str, Any] = {"id": incident["id"]}
+    leader: Optional[asyncio.Future] = None
+    try:
+        if incident.get("error"):
+            raise ValueError(incident["error"])
+        description = incident["description"]
+        if not description.strip():
+            raise ValueError("Empty incident description")
+
+        shared = None
+        if leaders is not None:
+            cluster, is_new = incident_deduper.observe(description)
+            result["cluster_id"] = cluster.cluster_id
+            if is_new:
+                leader = asyncio.get_running_loop().create_future()
+                leaders[cluster.cluster_id] = leader
+            elif cluster.cluster_id in leaders:
+                # Same storm as an earlier incident: reuse its triage (None if that one failed)
+                shared = await asyncio.shield(leaders[cluster.cluster_id])
+
+        if shared is not None:
+            data, ticket_id = shared
+            result["duplicate"] = True
+        else:
+            data = await call_triage_llm_async(description, temperature, max_tokens)
+            ticket_id = None
+            if workflow:
+                ticket_id = await asyncio.to_thread(run_workflow_steps, description, data)
+        if leader is not None:
+            leader.set_result((data, ticket_id))
+
+        sev = str(data.get("severity", "NORMAL")).upper()
+        result.update({
+            "ok": True,
+            "severity": sev,
+            "score": severity_score(sev),
+            "summary": data.get("summary"),
+            "actions": data.get("actions", []),
+        })
+        if data.get("needs_retriage"):
+            result.update({"degraded": True, "needs_retriage": True, "degraded_reason": data["degraded_reason"]})
+        if ticket_id is not None:
+            result["ticket_id"] = ticket_id
+    except Exception as e:
+        result.update({"ok": False, "error": f"{type(e).__name__}: {e}"})
+    finally:
+        # A failed leader releases its followers; they fall back to their own triage
+        if leader is not None and not leader.done():
+            leader.set_result(None)
+
+    result["latency_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return result
+
+
+# -------------------------
+# Batch runner
+# -------------------------
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100.0 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+async def run_batch(incidents: Iterator[Dict[str, Any]],
+                    out: TextIO,
+                    concurrency: int = DEFAULT_CONCURRENCY,
+                    temperature: float = DEFAULT_TEMPERATURE,
+                    max_tokens: int = DEFAULT_MAX_TOKENS,
+                    workflow: bool = False) -> Dict[str, Any]:
+    """
+    Run incidents through a fixed pool of workers.
+    The bounded queue keeps memory flat even for very large input files.
+    """
+    queue: asyncio.Queue = asyncio.Queue(maxsize=concurrency * 2)
+    leaders: Optional[Dict[int, asyncio.Future]] = {} if exercise7.USE_DEDUP else None
+    latencies: List[float] = []
+    failures = 0
+    degraded = 0
+    total = 0
+
+    async def worker() -> None:
+        nonlocal failures, degraded, total
+        while True:
+            incident = await queue.get()
+            if incident is None:
+                queue.task_done()
+                return
+            result = await triage_one(incident, temperature, max_tokens, workflow, leaders)
+            # Write each result as soon as it finishes (completion order, not input order)
+            out.write(json.dumps(result) + "\n")
+            out.flush()
+            total += 1
+            latencies.append(result["latency_ms"])
+            if not result["ok"]:
+                failures += 1
+            if result.get("degraded"):
+                degraded += 1
+            queue.task_done()
+
+    started = time.perf_counter()
+    workers = [asyncio.create_task(worker()) for _ in range(max(1, concurrency))]
+    incidents = iter(incidents)
+    while True:
+        # Read in a worker thread: a slow input pipe must not stall the event loop
+        incident = await asyncio.to_thread(next, incidents, None)
+        if incident is None:
+            break
+        await queue.put(incident)
+    for _ in workers:
+        await queue.put(None)
+    await asyncio.gather(*workers)
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "incidents": total,
+        "succeeded": total - failures,
+        "failed": failures,
+        "degraded": degraded,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_per_s": round(total / elapsed, 2) if elapsed > 0 else 0.0,
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "p99_ms": percentile(latencies, 99),
+    }
+
+
+def print_summary(stats: Dict[str, Any], stream: TextIO = sys.stderr) -> None:
+    """Print the end-of-batch report (to stderr so stdout stays pure JSONL)."""
+    print("\n=== Batch Triage Summary ===", file=stream)
+    print(f"Incidents : {stats['incidents']} ({stats['succeeded']} ok, {stats['failed']} failed)", file=stream)
+    print(f"Elapsed   : {stats['elapsed_s']} s", file=stream)
+    print(f"Throughput: {stats['throughput_per_s']} incidents/s", file=stream)
+    print(f"Latency   : p50 {stats['p50_ms']} ms | p95 {stats['p95_ms']} ms | p99 {stats['p99_ms']} ms",
+          file=stream)
+    cache = response_cache.stats()
+    print(f"Cache     : {cache['memory_hits']} memory hits, {cache['disk_hits']} disk hits, "
+          f"{cache['misses']} misses (hit rate {cache['hit_rate']:.0%})", file=stream)
+    fast = fast_triage.metrics()
+    agreement = "n/a" if fast["agreement_confident"] is None else f"{fast['agreement_confident']:.0%}"
+    print(f"Fast path : {fast['hits']}/{fast['lookups']} answered by keywords (hit rate {fast['hit_rate']:.0%}), "
+          f"agreement with LLM {agreement} over {fast['labelled']} labelled", file=stream)
+    dedup = incident_deduper.stats
+    print(f"Dedup     : {dedup['duplicates']} near-duplicates collapsed into "
+          f"{dedup['new_clusters']} clusters", file=stream)
+    breaker = async_client.breaker.snapshot()
+    print(f"Degraded  : {stats['degraded']} incidents triaged by keywords (LLM unavailable), breaker opened "
+          f"{breaker['opened']}x, {breaker['rejected']} calls short-circuited, "
+          f"{retriage_queue.stats['retriaged']} tickets re-triaged, {len(retriage_queue)} pending", file=stream)
+
+
+# -------------------------
+# Main entry point
+# -------------------------
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Triage many incidents concurrently.")
+    parser.add_argument("input", nargs="?", default="-", help="JSONL/CSV file, or '-' for stdin (default)")
+    parser.add_argument("--format", choices=("auto", "jsonl", "csv"), default="auto")
+    parser.add_argument("--output", "-o", default="-", help="Result JSONL file, or '-' for stdout (default)")
+    parser.add_argument("--concurrency", "-c", type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument("--temperature", type=float, default=DEFAULT_TEMPERATURE)
+    parser.add_argument("--max-tokens", type=int, default=DEFAULT_MAX_TOKENS)
+    parser.add_argument("--workflow", action="store_true",
+                        help="Also run ticket/DB/email steps for each incident")
+    args = parser.parse_args(argv)
+
+    out = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    try:
+        # Workflow output ([WORKFLOW], [EMAIL]) goes to stderr so stdout stays pure JSONL
+        with contextlib.redirect_stdout(sys.stderr):
+            if args.workflow:
+                resume_email_outbox()
+            stats = asyncio.run(run_batch(
+                read_incidents(args.input, args.format),
+                out,
+                concurrency=args.concurrency,
+                temperature=args.temperature,
+                max_tokens=args.max_tokens,
+                workflow=args.workflow,
+            ))
+            wait_for_retriage()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    print_summary(stats)
+
+
+if __name__ == "__main__":
+    main()
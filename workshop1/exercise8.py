@@ -7,15 +7,26 @@ demo for:
 - Escalation tool triggered when severity = CRISIS
 - Cleaner separation of concerns
 - SIMPLIFIED: call model → tool_calls → run tools → show results → stop
+- Circuit breaker: if the model is unavailable, a keyword triage is used instead of exiting
+  (a CRISIS still runs escalate_crisis); the incident is re-triaged when the model is back
 """
 
 import json
 import sys
-import uuid
-from typing import List, Dict, Any
+import threading
+import time
+from typing import Annotated, List, Dict, Any, Literal, Optional
 import requests
 from openai import AzureOpenAI
 from common.bc_config import get_api_credentials, get_model_deployment_name
+from workshop1.circuit_breaker import CLOSED, RetriageQueue, guarded
+from workshop1.fast_triage import KeywordTriage
+from workshop1.governor import governed
+from workshop1.telemetry import Telemetry
+from workshop1.ticket_ids import new_ticket_id
+from workshop1.tool_memo import ToolLoop
+from workshop1.tool_registry import ToolRegistry
+from workshop1.tool_stream import stream_tool_turn
 
 # -------------------------
 # Configuration
@@ -28,52 +39,44 @@ DEFAULT_MAX_TOKENS = 500
 
 USE_REAL_EMAIL = False
 
-# Initialize Azure OpenAI client
-client = AzureOpenAI(**get_api_credentials())
+# Toggle: if True, stream the reply and start the tool as soon as its arguments are complete
+USE_STREAMING_TOOLS = False
+
+# Toggle: if True, time every stage and count tokens (JSON span logs on stderr)
+USE_TELEMETRY = False
+
+# Initialize Azure OpenAI client (calls fail fast through the circuit breaker while the service is down)
+client = guarded(governed(AzureOpenAI(**get_api_credentials())))
+
+# Degraded-mode triage when the model cannot be reached
+keyword_triage = KeywordTriage()
+
+# Incidents triaged in degraded mode, re-triaged once the breaker closes again
+retriage_queue = RetriageQueue()
+
+# Per-stage spans + token counters; telemetry.prometheus_text() for scraping
+telemetry = Telemetry(enabled=USE_TELEMETRY, service="exercise8")
 
 
 # -------------------------
-# Tool definitions (function schema)
+# Tool definitions (schemas generated from the functions below)
 # -------------------------
 
-TOOLS = [
-    {
-        "type": "function",
-        "function": {
-            "name": "escalate_crisis",
-            "description": "Escalate a CRISIS-level incident to on-call team. Generates ticket ID automatically.",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "summary": {
-                        "type": "string",
-                        "description": "Incident summary"
-                    },
-                    "severity": {
-                        "type": "string",
-                        "enum": ["NORMAL", "ALERT", "CRISIS"],
-                        "description": "Severity level"
-                    },
-                    "actions": {
-                        "type": "array",
-                        "items": {"type": "string"},
-                        "description": "Required actions"
-                    }
-                },
-                "required": ["summary", "severity", "actions"]
-            }
-        }
-    }
-]
+registry = ToolRegistry()
 
 
 # -------------------------
 # Tool implementation functions
 # -------------------------
 
-def escalate_crisis(summary: str, severity: str, actions: List[str]) -> Dict[str, Any]:
+# cache="loop": inside one ToolLoop a repeated call returns the first ticket (no second email)
+@registry.tool(description="Escalate a CRISIS-level incident to on-call team. Generates ticket ID automatically.",
+               cache="loop")
+def escalate_crisis(summary: Annotated[str, "Incident summary"],
+                    severity: Annotated[Literal["NORMAL", "ALERT", "CRISIS"], "Severity level"],
+                    actions: Annotated[List[str], "Required actions"]) -> Dict[str, Any]:
     """Handle incident - generates ticket ID internally."""
-    ticket_id = f"TICKET-{uuid.uuid4().hex[:6].upper()}"
+    ticket_id = new_ticket_id()  # time-ordered, collision-free
     print(f"\n[TOOL] escalate_crisis called")
     print(f"       Ticket ID: {ticket_id}")
     print(f"       Severity : {severity}")
@@ -103,37 +106,29 @@ def escalate_crisis(summary: str, severity: str, actions: List[str]) -> Dict[str
     }
 
 
+# JSON schema list for tools=[...], generated once from the registered functions
+TOOLS = registry.schemas()
+
+
 def process_tool_call(tool_name: str, tool_input: Dict[str, Any]) -> str:
-    """Route tool calls to appropriate handler."""
-    if tool_name == "escalate_crisis":
-        result = escalate_crisis(
-            summary=tool_input.get("summary", ""),
-            severity=tool_input.get("severity", ""),
-            actions=tool_input.get("actions", [])
-        )
-    else:
-        result = {"error": f"Unknown tool: {tool_name}"}
-      
-    # Convert a Python object into a JSON string
-    return json.dumps(result)
+    """Route tool calls to appropriate handler (dict lookup + compiled argument checks)."""
+    return registry.dispatch(tool_name, tool_input)
+
+
+def run_tool(tool_name: str, tool_input: Dict[str, Any]) -> str:
+    """Worker-thread entry point for one tool call (streaming variant)."""
+    print(f"\n[CALLING] {tool_name}")
+    with telemetry.span("tool", tool=tool_name):
+        return process_tool_call(tool_name, tool_input)
 
 
 # -------------------------
 # LLM interaction with function calling (SIMPLIFIED)
 # -------------------------
 
-def call_triage_llm_with_tools(description: str,
-                               temperature: float,
-                               max_tokens: int) -> Dict[str, Any]:
-    """
-    Call LLM with function calling enabled.
-
-    SIMPLIFIED for teaching:
-    - Single call to LLM
-    - If a tool is called, execute it once
-    - Collect summary, severity, actions + ticket info
-    """
-    messages = [
+def build_messages(description: str) -> List[Dict[str, str]]:
+    """System prompt + the incident, shared by the blocking and streaming variants."""
+    return [
         {
             "role": "system",
             "content": (
@@ -151,19 +146,104 @@ def call_triage_llm_with_tools(description: str,
             )
         }
     ]
+
+
+def degraded_triage(description: str, reason: str, loop: Optional[ToolLoop] = None) -> Dict[str, Any]:
+    """
+    Keyword triage while the model is unavailable; a CRISIS still runs escalate_crisis.
+    loop: the tool loop of a stream that failed part-way; if it already started
+    escalate_crisis, that call's ticket is reused instead of escalating a second time.
+    """
+    print(f"\n[DEGRADED] LLM unavailable ({reason}) - keyword triage, flagged for re-triage.")
+    result_data = keyword_triage.degraded_result(description, reason)
+    earlier = loop.calls("escalate_crisis") if loop is not None else []
+    if earlier:
+        print("[DEGRADED] escalate_crisis already started from the stream - reusing its ticket.")
+        # Waits for the running call through the loop memo; the tool does not run again
+        tool_result = json.loads(loop.run("escalate_crisis", earlier[0]))
+        result_data["summary"] = earlier[0].get("summary", result_data["summary"])
+        result_data["severity"] = earlier[0].get("severity", result_data["severity"])
+        result_data["actions"] = earlier[0].get("actions", result_data["actions"])
+        result_data["escalated"] = tool_result
+        result_data["ticket_id"] = tool_result.get("ticket_id")
+    elif result_data["severity"] == "CRISIS":
+        print(f"\n[CALLING] escalate_crisis")
+        tool_result = json.loads(process_tool_call("escalate_crisis", {
+            "summary": result_data["summary"],
+            "severity": result_data["severity"],
+            "actions": result_data["actions"],
+        }))
+        result_data["escalated"] = tool_result
+        result_data["ticket_id"] = tool_result.get("ticket_id")
+    retriage_queue.add(result_data.get("ticket_id") or "", description)
+    return result_data
+
+
+def retriage_pending() -> None:
+    """
+    Ask the model again about incidents triaged by keywords during the outage.
+    An incident without a ticket is escalated now if the model says CRISIS;
+    one that already has a ticket is not escalated a second time.
+    """
+    items = retriage_queue.drain()
+    for i, (ticket_id, description) in enumerate(items):
+        try:
+            response = client.chat.completions.create(
+                model=DEPLOYMENT_NAME,
+                messages=build_messages(description),
+                tools=TOOLS,
+                # The verdict is the tool's arguments; the tool itself is not run here
+                tool_choice=registry.tool_choice("escalate_crisis"),
+                temperature=DEFAULT_TEMPERATURE,
+                max_tokens=DEFAULT_MAX_TOKENS,
+            )
+            tool_input = json.loads(response.choices[0].message.tool_calls[0].function.arguments)
+        except Exception as e:
+            # Down again (or no usable verdict): keep this incident and the rest for the next recovery
+            print(f"[RETRIAGE] Stopped ({type(e).__name__}: {e}); {len(items) - i} incident(s) stay queued.")
+            for item in reversed(items[i:]):
+                retriage_queue.requeue(*item)
+            return
+        severity = str(tool_input.get("severity", "NORMAL")).upper()
+        print(f"[RETRIAGE] {ticket_id or '(no ticket)'}: model says {severity} - {tool_input.get('summary', '')}")
+        if not ticket_id and severity == "CRISIS":
+            print(f"\n[CALLING] escalate_crisis")
+            process_tool_call("escalate_crisis", tool_input)
+        retriage_queue.mark_done()
+
+
+# Breaker closed again: re-triage in the background, so the call that closed it is not held up
+client.breaker.on_close(lambda: threading.Thread(target=retriage_pending, name="retriage", daemon=True).start())
+
+
+def call_triage_llm_with_tools(description: str,
+                               temperature: float,
+                               max_tokens: int) -> Dict[str, Any]:
+    """
+    Call LLM with function calling enabled.
+
+    SIMPLIFIED for teaching:
+    - Single call to LLM
+    - If a tool is called, execute it once
+    - Collect summary, severity, actions + ticket info
+    """
+    messages = build_messages(description)
     
-    try:
-        response = client.chat.completions.create(
-            model=DEPLOYMENT_NAME,
-            messages=messages,
-            tools=TOOLS,
-            tool_choice="auto",  # Let model decide when to use tools
-            temperature=DEFAULT_TEMPERATURE,
-            max_tokens=DEFAULT_MAX_TOKENS,
-        )
-    except Exception as e:
-        print(f"\n[ERROR] Failed to call OpenAI API: {e}")
-        sys.exit(1)
+    with telemetry.span("llm_call") as span:
+        try:
+            response = client.chat.completions.create(
+                model=DEPLOYMENT_NAME,
+                messages=messages,
+                tools=TOOLS,
+                tool_choice="auto",  # Let model decide when to use tools
+                temperature=DEFAULT_TEMPERATURE,
+                max_tokens=DEFAULT_MAX_TOKENS,
+            )
+        except Exception as e:
+            print(f"\n[ERROR] Failed to call OpenAI API: {e}")
+            span.fail(type(e).__name__)
+            return degraded_triage(description, f"{type(e).__name__}: {e}")
+        span.record_response(response)
     
     msg = response.choices[0].message
     result_data: Dict[str, Any] = {}
@@ -172,18 +252,30 @@ def call_triage_llm_with_tools(description: str,
     if msg.tool_calls:
         tool_call = msg.tool_calls[0]  # Take the first tool in the list
         tool_name = tool_call.function.name  # get the tool name the model wants to call.
-        tool_input = json.loads(tool_call.function.arguments)  # convert JSON string into Python dict
+        with telemetry.span("json_parse") as span:
+            try:
+                tool_input = json.loads(tool_call.function.arguments)  # convert JSON string into Python dict
+            except ValueError as e:
+                print(f"\n[ERROR] Model sent invalid tool arguments: {e}")
+                span.fail(type(e).__name__)
+                return degraded_triage(description, "invalid tool arguments from the model")
 
         print(f"\n[CALLING] {tool_name}")
-        tool_result_json = process_tool_call(tool_name, tool_input)
+        with telemetry.span("tool", tool=tool_name):
+            tool_result_json = process_tool_call(tool_name, tool_input)
         tool_result = json.loads(tool_result_json)
 
         # Fill result_data in a simple, explicit way for teaching
         result_data["summary"] = tool_input.get("summary", "")
         result_data["severity"] = tool_input.get("severity", "")
         result_data["actions"] = tool_input.get("actions", [])
-        result_data["escalated"] = tool_result
-        result_data["ticket_id"] = tool_result.get("ticket_id")
+        if "error" in tool_result:
+            # Bad or missing arguments: the tool did not run, so there is no ticket
+            print(f"\n[ERROR] {tool_name} failed: {tool_result['error']}")
+            result_data["tool_error"] = tool_result["error"]
+        else:
+            result_data["escalated"] = tool_result
+            result_data["ticket_id"] = tool_result.get("ticket_id")
 
     else:
         # If, for some reason, no tool was called, we just store the model's text
@@ -192,17 +284,82 @@ def call_triage_llm_with_tools(description: str,
     return result_data
 
 
+def call_triage_llm_with_tools_streaming(description: str,
+                                         temperature: float,
+                                         max_tokens: int) -> Dict[str, Any]:
+    """
+    Streaming variant of call_triage_llm_with_tools (stream=True).
+    The tool starts as soon as its argument JSON is complete in the stream,
+    not after the whole response has arrived: the escalation email goes out sooner.
+    """
+    messages = build_messages(description)
+    # Remembers the tool calls started from the stream, in case the stream fails after them
+    loop = ToolLoop(registry, run_tool)
+    # Usage arrives in one extra final chunk, only sent when asked for
+    extra = {"stream_options": {"include_usage": True}} if telemetry.enabled else {}
+
+    with telemetry.span("llm_call", stream=True) as span:
+        started = time.perf_counter()
+        try:
+            stream = client.chat.completions.create(
+                model=DEPLOYMENT_NAME,
+                messages=messages,
+                tools=TOOLS,
+                tool_choice="auto",
+                temperature=DEFAULT_TEMPERATURE,
+                max_tokens=DEFAULT_MAX_TOKENS,
+                stream=True,
+                **extra,
+            )
+            turn = stream_tool_turn(stream, loop.run, started=started)
+        except Exception as e:
+            print(f"\n[ERROR] Failed to stream from OpenAI API: {e}")
+            span.fail(type(e).__name__)
+            return degraded_triage(description, f"{type(e).__name__}: {e}", loop)
+        telemetry.record_usage(turn.usage, turn.finish_reason, model=DEPLOYMENT_NAME)
+
+    result_data: Dict[str, Any] = {}
+
+    # Same teaching assumption: the model calls our tool once
+    if turn.tool_calls:
+        tool_call = turn.tool_calls[0]
+        outcome = turn.outcomes[0]
+        print(f"[STREAM] {tool_call.function.name} started {turn.dispatch_seconds[tool_call.id] * 1000:.0f} ms "
+              f"after the request (response finished at {turn.stream_seconds * 1000:.0f} ms)")
+        tool_input = outcome.arguments
+        tool_result = json.loads(outcome.content)
+
+        result_data["summary"] = tool_input.get("summary", "")
+        result_data["severity"] = tool_input.get("severity", "")
+        result_data["actions"] = tool_input.get("actions", [])
+        if not outcome.ok:
+            print(f"\n[ERROR] {outcome.name} failed: {tool_result['error']}")
+            result_data["tool_error"] = tool_result["error"]
+        else:
+            result_data["escalated"] = tool_result
+            result_data["ticket_id"] = tool_result.get("ticket_id")
+
+    else:
+        result_data["message"] = turn.content or "(no tool call, text response only)"
+    
+    return result_data
+
+
 # -------------------------
 # Workflow
 # -------------------------
 
+@telemetry.instrument("workflow")
 def run_workflow_with_function_calling(description: str,
                                        temperature: float,
                                        max_tokens: int) -> None:
     """End-to-end workflow using function calling."""
     print("\n=== Calling LLM with Function Calling ===")
     print(f"(Using temperature={temperature}, max_tokens={max_tokens})")
-    data = call_triage_llm_with_tools(description, temperature, max_tokens)
+    if USE_STREAMING_TOOLS:
+        data = call_triage_llm_with_tools_streaming(description, temperature, max_tokens)
+    else:
+        data = call_triage_llm_with_tools(description, temperature, max_tokens)
     
     print("\n=== Workflow Results ===")
     print(f"Summary : {data.get('summary', '(none)')}")
@@ -213,8 +370,12 @@ def run_workflow_with_function_calling(description: str,
     
     if data.get("escalated"):
         print(f"\n✓ Crisis escalated - Ticket: {data.get('ticket_id')}")
+    elif data.get("tool_error"):
+        print(f"\n✗ Escalation failed, no ticket created: {data['tool_error']}")
     else:
         print("\nIncident triaged and logged (no escalation tool used).")
+    if data.get("needs_retriage"):
+        print("[DEGRADED] Triaged by keywords only - re-triage this ticket once the LLM is back.")
     
     print("\n=== Workflow Complete ===")
 
@@ -237,6 +398,15 @@ def main() -> None:
 
     run_workflow_with_function_calling(description, DEFAULT_TEMPERATURE, DEFAULT_MAX_TOKENS)
 
+    # Degraded by a bad reply rather than an outage: no breaker close will come, ask again now
+    if len(retriage_queue) and client.breaker.state == CLOSED:
+        print("\n=== Re-triage ===")
+        retriage_pending()
+
+    if telemetry.enabled:
+        print("\n=== Telemetry (Prometheus text format) ===")
+        print(telemetry.prometheus_text(), end="")
+
 
 if __name__ == "__main__":
     main()
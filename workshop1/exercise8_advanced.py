@@ -7,15 +7,27 @@ demo for:
 - Escalation tool triggered when severity = CRISIS
 - Cleaner separation of concerns
 - Call model → get tool_calls → run tools → send tool results back → call model again → (repeat while there are tool calls)
+- Circuit breaker: if the model is unavailable, a keyword triage runs escalate_crisis directly
+  (flagged needs_retriage) instead of exiting
 """
 
 import json
 import sys
-import uuid
-from typing import List, Dict, Any
+import threading
+import time
+from typing import Annotated, List, Dict, Any, Literal, Optional
 import requests
 from openai import AzureOpenAI
 from common.bc_config import get_api_credentials, get_model_deployment_name
+from workshop1.circuit_breaker import CLOSED, RetriageQueue, guarded
+from workshop1.fast_triage import KeywordTriage
+from workshop1.governor import governed
+from workshop1.telemetry import Telemetry
+from workshop1.ticket_ids import new_ticket_id
+from workshop1.tool_memo import ToolLoop, ToolResultCache
+from workshop1.tool_registry import ToolRegistry
+from workshop1.tool_runner import run_tool_calls
+from workshop1.tool_stream import stream_tool_turn
 
 # -------------------------
 # Configuration
@@ -28,51 +40,61 @@ DEFAULT_MAX_TOKENS = 500
 
 USE_REAL_EMAIL = False
 
-# Initialize Azure OpenAI client
-client = AzureOpenAI(**get_api_credentials())
+# Toggle: if True, stream each model turn and start every tool as soon as its arguments are complete
+USE_STREAMING_TOOLS = False
+
+# Toggle: if True, time every stage and count tokens (JSON span logs on stderr)
+USE_TELEMETRY = False
+
+# Tool calls from one assistant turn run concurrently; each gets its own time limit
+DEFAULT_TOOL_TIMEOUT = 30.0
+TOOL_TIMEOUTS = {"escalate_crisis": 10.0}
+
+# Hard limits for one tool loop: model rounds with tool calls, and tokens across all rounds
+MAX_TOOL_ITERATIONS = 5
+MAX_LOOP_TOKENS = 4000
+
+# First model call must use this tool (tool_choice), so it always returns the structured
+# triage arguments; None lets the model decide ("auto")
+FORCED_TOOL = "escalate_crisis"
+
+# Initialize Azure OpenAI client (calls fail fast through the circuit breaker while the service is down)
+client = guarded(governed(AzureOpenAI(**get_api_credentials())))
+
+# Degraded-mode triage when the model cannot be reached
+keyword_triage = KeywordTriage()
+
+# Incidents triaged in degraded mode, re-triaged once the breaker closes again
+# (exercise8_async's degraded incidents land here too)
+retriage_queue = RetriageQueue()
+
+# Per-stage spans + token counters; telemetry.prometheus_text() for scraping
+telemetry = Telemetry(enabled=USE_TELEMETRY, service="exercise8_advanced")
+
+# Results of cache="ttl" tools, shared by every incident in this process
+tool_result_cache = ToolResultCache()
 
 
 # -------------------------
-# Tool definitions (function schema)
+# Tool definitions (schemas generated from the functions below)
 # -------------------------
 
-TOOLS = [
-    {
-        "type": "function",
-        "function": {
-            "name": "escalate_crisis",
-            "description": "Escalate a CRISIS-level incident to on-call team. Generates ticket ID automatically.",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "summary": {
-                        "type": "string",
-                        "description": "Incident summary"
-                    },
-                    "severity": {
-                        "type": "string",
-                        "enum": ["NORMAL", "ALERT", "CRISIS"],
-                        "description": "Severity level"
-                    },
-                    "actions": {
-                        "type": "array",
-                        "items": {"type": "string"},
-                        "description": "Required actions"
-                    }
-                },
-                "required": ["summary", "severity", "actions"]
-            }
-        }
-    }
-]
+registry = ToolRegistry()
+
 
 # -------------------------
 # Tool implementation functions
 # -------------------------
 
-def escalate_crisis(summary: str, severity: str, actions: List[str]) -> Dict[str, Any]:
+# cache="loop": if the model repeats the call in the same loop, reuse the first ticket (no second email)
+# terminal=True: the tool result is the answer, so no follow-up call for a closing message
+@registry.tool(description="Escalate a CRISIS-level incident to on-call team. Generates ticket ID automatically.",
+               cache="loop", terminal=True)
+def escalate_crisis(summary: Annotated[str, "Incident summary"],
+                    severity: Annotated[Literal["NORMAL", "ALERT", "CRISIS"], "Severity level"],
+                    actions: Annotated[List[str], "Required actions"]) -> Dict[str, Any]:
     """Handle incident - generates ticket ID internally."""
-    ticket_id = f"TICKET-{uuid.uuid4().hex[:6].upper()}"
+    ticket_id = new_ticket_id()  # time-ordered, collision-free
     print(f"\n[TOOL] escalate_crisis called")
     print(f"       Ticket ID: {ticket_id}")
     print(f"       Severity : {severity}")
@@ -100,27 +122,29 @@ def escalate_crisis(summary: str, severity: str, actions: List[str]) -> Dict[str
     }
 
 
+# JSON schema list for tools=[...], generated once from the registered functions
+TOOLS = registry.schemas()
+
+
 def process_tool_call(tool_name: str, tool_input: Dict[str, Any]) -> str:
-    """Route tool calls to appropriate handler."""
-    if tool_name == "escalate_crisis":
-        result = escalate_crisis(
-            summary=tool_input.get("summary", ""),
-            severity=tool_input.get("severity", ""),
-            actions=tool_input.get("actions", [])
-        )
-    else:
-        result = {"error": f"Unknown tool: {tool_name}"}
-    
-    return json.dumps(result)
+    """Route tool calls to appropriate handler (dict lookup + compiled argument checks)."""
+    return registry.dispatch(tool_name, tool_input)
+
+
+def run_tool(tool_name: str, tool_input: Dict[str, Any]) -> str:
+    """Worker-thread entry point for one tool call."""
+    print(f"\n[CALLING] {tool_name}")
+    with telemetry.span("tool", tool=tool_name):
+        return process_tool_call(tool_name, tool_input)
 
 
 # -------------------------
 # LLM interaction with function calling
 # -------------------------
 
-def call_triage_llm_with_tools(description: str, temperature: float, max_tokens: int) -> Dict[str, Any]:
-    """Call LLM with function calling enabled."""
-    messages = [
+def build_messages(description: str) -> List[Dict[str, str]]:
+    """System prompt + the incident, shared by the blocking and streaming variants."""
+    return [
         {
             "role": "system",
             "content": (
@@ -138,26 +162,118 @@ def call_triage_llm_with_tools(description: str, temperature: float, max_tokens:
             )
         }
     ]
+
+
+def store_escalation(result_data: Dict[str, Any], outcome: Any) -> None:
+    """Keep the triage fields (the tool arguments) and the ticket from a successful escalate_crisis."""
+    result_data["summary"] = outcome.arguments.get("summary", "")
+    result_data["severity"] = outcome.arguments.get("severity", "")
+    result_data["actions"] = outcome.arguments.get("actions", [])
+    result_data["escalated"] = json.loads(outcome.content)
+    result_data["ticket_id"] = result_data["escalated"].get("ticket_id")
+
+
+def degraded_triage(description: str, reason: str, loop: Optional[ToolLoop] = None) -> Dict[str, Any]:
+    """
+    Keyword triage while the model is unavailable. escalate_crisis still runs (as the
+    forced first tool call would), so every incident gets its ticket and page.
+    loop: the tool loop of a stream that failed part-way; if it already started
+    escalate_crisis, that call's ticket (and the model's triage fields) are reused.
+    """
+    print(f"\n[DEGRADED] LLM unavailable ({reason}) - keyword triage, flagged for re-triage.")
+    result_data = keyword_triage.degraded_result(description, reason)
+    earlier = loop.calls("escalate_crisis") if loop is not None else []
+    if earlier:
+        print("[DEGRADED] escalate_crisis already started from the stream - reusing its ticket.")
+        arguments = earlier[0]
+        result_data["summary"] = arguments.get("summary", result_data["summary"])
+        result_data["severity"] = arguments.get("severity", result_data["severity"])
+        result_data["actions"] = arguments.get("actions", result_data["actions"])
+    else:
+        arguments = {
+            "summary": result_data["summary"],
+            "severity": result_data["severity"],
+            "actions": result_data["actions"],
+        }
+    # Through the loop memo: waits for (or shares) the earlier call instead of a second ticket
+    escalated = json.loads(loop.run("escalate_crisis", arguments) if loop is not None
+                           else process_tool_call("escalate_crisis", arguments))
+    result_data["escalated"] = escalated
+    result_data["ticket_id"] = escalated.get("ticket_id")
+    retriage_queue.add(result_data.get("ticket_id") or "", description)
+    return result_data
+
+
+def retriage_pending() -> None:
+    """
+    Ask the model again about incidents triaged by keywords during the outage.
+    Degraded incidents already have their ticket, so the verdict is reported, not escalated
+    again; one whose degraded escalation failed is escalated now if the model says CRISIS.
+    """
+    items = retriage_queue.drain()
+    for i, (ticket_id, description) in enumerate(items):
+        try:
+            response = client.chat.completions.create(
+                model=DEPLOYMENT_NAME,
+                messages=build_messages(description),
+                tools=TOOLS,
+                # The verdict is the tool's arguments; the tool itself is not run here
+                tool_choice=registry.tool_choice("escalate_crisis"),
+                temperature=DEFAULT_TEMPERATURE,
+                max_tokens=DEFAULT_MAX_TOKENS,
+            )
+            arguments = json.loads(response.choices[0].message.tool_calls[0].function.arguments)
+        except Exception as e:
+            # Down again (or no usable verdict): keep this incident and the rest for the next recovery
+            print(f"[RETRIAGE] Stopped ({type(e).__name__}: {e}); {len(items) - i} incident(s) stay queued.")
+            for item in reversed(items[i:]):
+                retriage_queue.requeue(*item)
+            return
+        severity = str(arguments.get("severity", "NORMAL")).upper()
+        print(f"[RETRIAGE] {ticket_id or '(no ticket)'}: model says {severity} - {arguments.get('summary', '')}")
+        if not ticket_id and severity == "CRISIS":
+            run_tool("escalate_crisis", arguments)
+        retriage_queue.mark_done()
+
+
+# Breaker closed again: re-triage in the background, so the call that closed it is not held up
+client.breaker.on_close(lambda: threading.Thread(target=retriage_pending, name="retriage", daemon=True).start())
+
+
+def call_triage_llm_with_tools(description: str, temperature: float, max_tokens: int) -> Dict[str, Any]:
+    """Call LLM with function calling enabled."""
+    messages = build_messages(description)
     
     # First API call with tool definitions
-    try:
-        response = client.chat.completions.create(
-            model=DEPLOYMENT_NAME,
-            messages=messages,
-            tools=TOOLS,
-            tool_choice="auto",  # Let model decide when to use tools
-            temperature=temperature,
-            max_tokens=max_tokens,
-        )
-    except Exception as e:
-        print(f"\n[ERROR] Failed to call OpenAI API: {e}")
-        sys.exit(1)
+    with telemetry.span("llm_call", round=1) as span:
+        try:
+            response = client.chat.completions.create(
+                model=DEPLOYMENT_NAME,
+                messages=messages,
+                tools=TOOLS,
+                tool_choice=registry.tool_choice(FORCED_TOOL),  # "auto" lets the model decide
+                temperature=temperature,
+                max_tokens=max_tokens,
+            )
+        except Exception as e:
+            print(f"\n[ERROR] Failed to call OpenAI API: {e}")
+            span.fail(type(e).__name__)
+            return degraded_triage(description, f"{type(e).__name__}: {e}")
+        span.record_response(response)
     
-    # Process tool calls in a loop until no more tools are called
+    # Process tool calls in a loop until no more tools are called (or a guard trips)
+    loop = ToolLoop(registry, run_tool, shared=tool_result_cache,
+                    max_iterations=MAX_TOOL_ITERATIONS, max_total_tokens=MAX_LOOP_TOKENS)
+    loop.record_response(response)
     result_data = {}
+    round_no = 1
     
     while response.choices[0].message.tool_calls:
         tool_calls = response.choices[0].message.tool_calls
+        stop = loop.next_turn(tool_calls)
+        if stop:
+            print(f"\n[LOOP] Stopping tool loop: {stop}")
+            break
         
         # Add assistant response to messages
         # Build a list of dictionaries, one dictionary for each tc in tool_calls
@@ -177,40 +293,109 @@ def call_triage_llm_with_tools(description: str, temperature: float, max_tokens:
             ]
         })
         
-        # Process each tool call
-        for tool_call in tool_calls:
-            tool_name = tool_call.function.name
-            tool_input = json.loads(tool_call.function.arguments)
-            
-            print(f"\n[CALLING] {tool_name}")
-            tool_result = process_tool_call(tool_name, tool_input)
-            
-            # Add tool result as separate message
-            messages.append({
-                "role": "tool",
-                "tool_call_id": tool_call.id,
-                "content": tool_result
-            })
+        # Run all tool calls of this turn at once; outcomes keep the model's order
+        outcomes = run_tool_calls(tool_calls, loop.run, timeout=DEFAULT_TOOL_TIMEOUT, timeouts=TOOL_TIMEOUTS)
+        for outcome in outcomes:
+            # Add tool result as separate message (failed tools send an error payload)
+            messages.append(outcome.message())
             
             # Store result data
-            if tool_name == "escalate_crisis":
-                result_data["escalated"] = json.loads(tool_result)
-                result_data["ticket_id"] = tool_input.get("ticket_id")
+            if outcome.name == "escalate_crisis" and outcome.ok:
+                store_escalation(result_data, outcome)
+        
+        if loop.finished(outcomes):
+            print(f"\n[LOOP] {loop.stop_reason}: skipping the follow-up model call")
+            break
         
         # Call LLM again to continue the conversation
-        try:
-            response = client.chat.completions.create(
-                model=DEPLOYMENT_NAME,
-                messages=messages,
-                tools=TOOLS,
-                tool_choice="auto",
-                temperature=temperature,
-                max_tokens=max_tokens,
-            )
-        except Exception as e:
-            print(f"\n[ERROR] Failed in tool call loop: {e}")
+        round_no += 1
+        with telemetry.span("llm_call", round=round_no) as span:
+            try:
+                response = client.chat.completions.create(
+                    model=DEPLOYMENT_NAME,
+                    messages=messages,
+                    tools=TOOLS,
+                    tool_choice="auto",
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                )
+            except Exception as e:
+                print(f"\n[ERROR] Failed in tool call loop: {e}")
+                span.fail(type(e).__name__)
+                break
+            span.record_response(response)
+        loop.record_response(response)
+    
+    result_data["tool_loop"] = loop.summary()
+    return result_data
+
+
+def call_triage_llm_with_tools_streaming(description: str, temperature: float, max_tokens: int) -> Dict[str, Any]:
+    """
+    Streaming variant of call_triage_llm_with_tools (stream=True).
+    Each tool starts as soon as its argument JSON is complete, while the rest of the turn
+    is still streaming. Repeated-turn detection can only run once the turn has arrived,
+    so a repeated cache="loop" tool is answered from the memo rather than run twice.
+    """
+    messages = build_messages(description)
+    loop = ToolLoop(registry, run_tool, shared=tool_result_cache,
+                    max_iterations=MAX_TOOL_ITERATIONS, max_total_tokens=MAX_LOOP_TOKENS)
+    result_data = {}
+    round_no = 0
+    
+    while True:
+        round_no += 1
+        with telemetry.span("llm_call", round=round_no, stream=True) as span:
+            started = time.perf_counter()
+            try:
+                stream = client.chat.completions.create(
+                    model=DEPLOYMENT_NAME,
+                    messages=messages,
+                    tools=TOOLS,
+                    tool_choice=registry.tool_choice(FORCED_TOOL) if round_no == 1 else "auto",
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                    stream=True,
+                    # Usage arrives in one extra final chunk; the loop's token cap needs it
+                    stream_options={"include_usage": True},
+                )
+                # Tools only start early while the loop still has budget for another round
+                turn = stream_tool_turn(stream, loop.run, dispatch=loop.over_budget() is None,
+                                        timeout=DEFAULT_TOOL_TIMEOUT, timeouts=TOOL_TIMEOUTS, started=started)
+            except Exception as e:
+                span.fail(type(e).__name__)
+                if round_no == 1:
+                    print(f"\n[ERROR] Failed to call OpenAI API: {e}")
+                    return degraded_triage(description, f"{type(e).__name__}: {e}", loop)
+                print(f"\n[ERROR] Failed in tool call loop: {e}")
+                break
+            telemetry.record_usage(turn.usage, turn.finish_reason, model=DEPLOYMENT_NAME)
+        loop.record_response(turn)
+        
+        if not turn.tool_calls:
+            break
+        stop = loop.next_turn(turn.tool_calls)
+        if stop:
+            print(f"\n[LOOP] Stopping tool loop: {stop}")
+            # This turn's tools already ran while it streamed: keep the ticket they created
+            for outcome in turn.outcomes:
+                if outcome.name == "escalate_crisis" and outcome.ok:
+                    store_escalation(result_data, outcome)
+            break
+        for tc in turn.tool_calls:
+            print(f"[STREAM] {tc.function.name} started {turn.dispatch_seconds[tc.id] * 1000:.0f} ms after the request "
+                  f"(turn finished streaming at {turn.stream_seconds * 1000:.0f} ms)")
+        
+        messages.append(turn.assistant_message())
+        for outcome in turn.outcomes:
+            messages.append(outcome.message())
+            if outcome.name == "escalate_crisis" and outcome.ok:
+                store_escalation(result_data, outcome)
+        if loop.finished(turn.outcomes):
+            print(f"\n[LOOP] {loop.stop_reason}: skipping the follow-up model call")
             break
     
+    result_data["tool_loop"] = loop.summary()
     return result_data
 
 
@@ -218,10 +403,14 @@ def call_triage_llm_with_tools(description: str, temperature: float, max_tokens:
 # Workflow
 # -------------------------
 
+@telemetry.instrument("workflow")
 def run_workflow_with_function_calling(description: str, temperature: float, max_tokens: int) -> None:
     """End-to-end workflow using function calling."""
     print("\n=== Calling LLM with Function Calling ===")
-    data = call_triage_llm_with_tools(description, temperature, max_tokens)
+    if USE_STREAMING_TOOLS:
+        data = call_triage_llm_with_tools_streaming(description, temperature, max_tokens)
+    else:
+        data = call_triage_llm_with_tools(description, temperature, max_tokens)
     
     print("\n=== Workflow Results ===")
     print(f"Summary : {data.get('summary', '(none)')}")
@@ -234,6 +423,12 @@ def run_workflow_with_function_calling(description: str, temperature: float, max
         print(f"\n✓ Crisis escalated - Ticket: {data.get('ticket_id')}")
     else:
         print("\nIncident triaged and logged.")
+    if data.get("needs_retriage"):
+        print("[DEGRADED] Triaged by keywords only - re-triage this ticket once the LLM is back.")
+    
+    loop = data.get("tool_loop", {})
+    print(f"\nModel round trips: {loop.get('round_trips', 0)} "
+          f"(saved {loop.get('round_trips_saved', 0)}, ~{loop.get('tokens_saved_est', 0)} prompt tokens)")
     
     print("\n=== Workflow Complete ===")
 
@@ -272,6 +467,15 @@ def main() -> None:
 
     run_workflow_with_function_calling(description, temperature, max_tokens)
 
+    # Degraded by a bad reply rather than an outage: no breaker close will come, ask again now
+    if len(retriage_queue) and client.breaker.state == CLOSED:
+        print("\n=== Re-triage ===")
+        retriage_pending()
+
+    if telemetry.enabled:
+        print("\n=== Telemetry (Prometheus text format) ===")
+        print(telemetry.prometheus_text(), end="")
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,364 @@
+# Async Multi-Incident Tool-Calling Engine
+
+"""
+demo for:
+- The exercise8_advanced tool loop on AsyncAzureOpenAI, for many incidents at once
+- Each incident has its own message history and ToolLoop (memo, loop guards, terminal tools)
+- One global limit on model requests in flight, shared by every incident
+- Per-incident deadlines and cancellation (engine.cancel(incident_id))
+- Shared circuit breaker: during an outage incidents get the degraded keyword triage
+  (exercise8_advanced.degraded_triage) at full speed instead of failing one by one
+- Optional request hedging (hedge=True / --hedge): slow model calls get a duplicate, see workshop1.hedging
+- Optional deployment pool (--pool deployments.json): model calls spread over several deployments,
+  see workshop1.router
+- run_many(descriptions) for library use, JSONL in / JSONL out on the command line
+
+Usage:
+    python -m workshop1.exercise8_async incidents.jsonl --concurrency 32 --deadline 60 --hedge
+    cat incidents.csv | python -m workshop1.exercise8_async - --format csv
+
+Scaling benchmark (local mock server):
+    python -m workshop1.benchmarks --async-scaling --concurrency 32
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import sys
+import time
+from typing import List, Dict, Any, Callable, Iterable, Optional, TextIO
+from openai import AsyncAzureOpenAI
+from common.bc_config import get_api_credentials
+from workshop1.exercise7_batch import read_incidents, percentile
+from workshop1.exercise8_advanced import (
+    DEPLOYMENT_NAME,
+    DEFAULT_TEMPERATURE,
+    DEFAULT_MAX_TOKENS,
+    DEFAULT_TOOL_TIMEOUT,
+    TOOL_TIMEOUTS,
+    MAX_TOOL_ITERATIONS,
+    MAX_LOOP_TOKENS,
+    FORCED_TOOL,
+    TOOLS,
+    registry,
+    tool_result_cache,
+    build_messages,
+    degraded_triage,
+    process_tool_call,
+    retriage_pending,
+    retriage_queue,
+    store_escalation,
+)
+from workshop1.circuit_breaker import CLOSED, GuardedClient, breaker, guarded
+from workshop1.governor import governed
+from workshop1.hedging import hedged
+from workshop1.router import load_pool, routed
+from workshop1.tool_memo import ToolLoop
+from workshop1.tool_runner import arun_tool_calls
+
+# -------------------------
+# Configuration
+# -------------------------
+
+DEFAULT_CONCURRENCY = 32          # model requests in flight, across all incidents
+DEFAULT_DEADLINE = 120.0          # seconds per incident, including time spent waiting for a slot
+
+
+# -------------------------
+# Engine
+# -------------------------
+
+def _assistant_message(msg: Any) -> Dict[str, Any]:
+    return {
+        "role": "assistant",
+        "content": msg.content or "",
+        "tool_calls": [
+            {"id": tc.id, "type": "function",
+             "function": {"name": tc.function.name, "arguments": tc.function.arguments}}
+            for tc in msg.tool_calls
+        ],
+    }
+
+
+class IncidentEngine:
+    """
+    Runs tool conversations for many incidents concurrently on one event loop.
+    The semaphore bounds model requests, not incidents: while one incident runs its
+    tools, its slot goes to another incident's model call.
+    """
+
+    def __init__(self,
+                 client: Optional[AsyncAzureOpenAI] = None,
+                 concurrency: int = DEFAULT_CONCURRENCY,
+                 deadline: Optional[float] = DEFAULT_DEADLINE,
+                 temperature: float = DEFAULT_TEMPERATURE,
+                 max_tokens: int = DEFAULT_MAX_TOKENS,
+                 hedge: bool = False):
+        # One client (one connection pool) per engine: the pool belongs to the event loop
+        # that uses it, so a module-level client would break on a second asyncio.run()
+        self._owns_client = client is None
+        self.client = client or guarded(governed(AsyncAzureOpenAI(**get_api_credentials())))
+        if hedge:
+            # Duplicates skip the engine's slots (the hedge budget caps them) but not the governor.
+            # The breaker stays outermost, as in exercise7 (guarded(hedged(base_client))): it sees
+            # one outcome per call, and an open breaker rejects before any hedge is sent
+            if isinstance(self.client, GuardedClient):
+                self.client = GuardedClient(hedged(self.client._client), self.client.breaker)
+            else:
+                self.client = hedged(self.client)
+        self.concurrency = max(1, concurrency)
+        self.deadline = deadline
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._tasks: Dict[str, "asyncio.Task[Dict[str, Any]]"] = {}
+        self.stats = {"model_calls": 0, "in_flight": 0, "peak_in_flight": 0}
+
+    async def aclose(self) -> None:
+        if self._owns_client:
+            await self.client.close()
+
+    async def _create(self, **kwargs: Any) -> Any:
+        if self._slots is None:
+            # Created lazily: a Semaphore belongs to the event loop that first uses it
+            self._slots = asyncio.Semaphore(self.concurrency)
+        async with self._slots:
+            self.stats["model_calls"] += 1
+            self.stats["in_flight"] += 1
+            self.stats["peak_in_flight"] = max(self.stats["peak_in_flight"], self.stats["in_flight"])
+            try:
+                return await self.client.chat.completions.create(**kwargs)
+            finally:
+                self.stats["in_flight"] -= 1
+
+    async def _conversation(self, description: str) -> Dict[str, Any]:
+        """One incident's tool loop (async twin of call_triage_llm_with_tools)."""
+        messages = build_messages(description)
+        loop = ToolLoop(registry, process_tool_call, shared=tool_result_cache,
+                        max_iterations=MAX_TOOL_ITERATIONS, max_total_tokens=MAX_LOOP_TOKENS, verbose=False)
+        result_data: Dict[str, Any] = {}
+        tool_choice = registry.tool_choice(FORCED_TOOL)
+
+        while True:
+            try:
+                response = await self._create(
+                    model=DEPLOYMENT_NAME,
+                    messages=messages,
+                    tools=TOOLS,
+                    tool_choice=tool_choice,
+                    temperature=self.temperature,
+                    max_tokens=self.max_tokens,
+                )
+            except Exception as e:
+                if loop.round_trips:
+                    break      # later round: keep what the earlier turns produced
+                # Runs escalate_crisis, which blocks: off the event loop
+                result_data = await asyncio.to_thread(degraded_triage, description, f"{type(e).__name__}: {e}")
+                break
+            tool_choice = "auto"   # only the first call is forced
+            loop.record_response(response)
+            msg = response.choices[0].message
+            if not msg.tool_calls:
+                result_data["message"] = msg.content
+                break
+            if loop.next_turn(msg.tool_calls):
+                break
+
+            messages.append(_assistant_message(msg))
+            outcomes = await arun_tool_calls(msg.tool_calls, loop.run,
+                                             timeout=DEFAULT_TOOL_TIMEOUT, timeouts=TOOL_TIMEOUTS)
+            for outcome in outcomes:
+                messages.append(outcome.message())
+                if outcome.name == "escalate_crisis" and outcome.ok:
+                    store_escalation(result_data, outcome)
+            if loop.finished(outcomes):
+                break
+
+        result_data["tool_loop"] = loop.summary()
+        return result_data
+
+    async def run_incident(self, incident_id: str, description: str) -> Dict[str, Any]:
+        """Run one incident under its deadline and build its result line (never raises)."""
+        started = time.perf_counter()
+        result: Dict[str, Any] = {"id": incident_id}
+        try:
+            if not description.strip():
+                raise ValueError("Empty incident description")
+            data = await asyncio.wait_for(self._conversation(description), self.deadline)
+            loop = data["tool_loop"]
+            result.update({
+                "ok": True,
+                "severity": data.get("severity"),
+                "summary": data.get("summary"),
+                "actions": data.get("actions", []),
+                "ticket_id": data.get("ticket_id"),
+                "round_trips": loop["round_trips"],
+                "total_tokens": loop["total_tokens"],
+                "stop_reason": loop["stop_reason"],
+            })
+            if data.get("needs_retriage"):
+                result.update({"degraded": True, "needs_retriage": True, "degraded_reason": data["degraded_reason"]})
+        except asyncio.TimeoutError:
+            result.update({"ok": False, "error": f"Deadline of {self.deadline:g}s exceeded"})
+        except asyncio.CancelledError:
+            result.update({"ok": False, "error": "Cancelled"})
+        except Exception as e:
+            result.update({"ok": False, "error": f"{type(e).__name__}: {e}"})
+        result["latency_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        return result
+
+    def submit(self, incident_id: str, description: str) -> "asyncio.Task[Dict[str, Any]]":
+        """Start an incident now; the task's result is its result line."""
+        task = asyncio.create_task(self.run_incident(incident_id, description))
+        self._tasks[incident_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(incident_id, None))
+        return task
+
+    def cancel(self, incident_id: str) -> bool:
+        """
+        Stop an incident between awaits; its result line reports "Cancelled".
+        A tool already running in a worker thread finishes in the background.
+        """
+        task = self._tasks.get(incident_id)
+        return task.cancel() if task is not None else False
+
+    async def run_many(self,
+                       incidents: Iterable[Dict[str, Any]],
+                       on_result: Optional[Callable[[Dict[str, Any]], None]] = None) -> List[Dict[str, Any]]:
+        """Run {"id", "description"} incidents concurrently; results come back in input order."""
+        tasks = []
+        incidents = iter(incidents)
+        while True:
+            # Read in a worker thread: a slow input pipe must not stall the event loop
+            incident = await asyncio.to_thread(next, incidents, None)
+            if incident is None:
+                break
+            if incident.get("error"):
+                # Unreadable input line: report it without a model call
+                result = {"id": incident["id"], "ok": False, "error": incident["error"], "latency_ms": 0.0}
+                future = asyncio.get_running_loop().create_future()
+                future.set_result(result)
+                tasks.append(future)
+            else:
+                tasks.append(self.submit(incident["id"], incident["description"]))
+            if on_result is not None:
+                tasks[-1].add_done_callback(lambda t: on_result(t.result()))
+        return list(await asyncio.gather(*tasks))
+
+
+async def run_many(descriptions: Iterable[str],
+                   concurrency: int = DEFAULT_CONCURRENCY,
+                   deadline: Optional[float] = DEFAULT_DEADLINE,
+                   **engine_options: Any) -> List[Dict[str, Any]]:
+    """
+    Triage and escalate many incident descriptions at once:
+        results = asyncio.run(run_many(["DB down", "VPN flaky", ...], concurrency=32))
+    """
+    engine = IncidentEngine(concurrency=concurrency, deadline=deadline, **engine_options)
+    try:
+        return await engine.run_many({"id": str(i), "description": d} for i, d in enumerate(descriptions, start=1))
+    finally:
+        await engine.aclose()
+
+
+def summarize(results: List[Dict[str, Any]], elapsed: float) -> Dict[str, Any]:
+    latencies = sorted(r["latency_ms"] for r in results)
+    failures = sum(1 for r in results if not r["ok"])
+    return {
+        "incidents": len(results),
+        "succeeded": len(results) - failures,
+        "failed": failures,
+        "degraded": sum(1 for r in results if r.get("degraded")),
+        "elapsed_s": round(elapsed, 3),
+        "throughput_per_s": round(len(results) / elapsed, 2) if elapsed > 0 else 0.0,
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "p99_ms": percentile(latencies, 99),
+        "round_trips": sum(r.get("round_trips", 0) for r in results),
+        "total_tokens": sum(r.get("total_tokens", 0) for r in results),
+    }
+
+
+def print_summary(stats: Dict[str, Any], engine: IncidentEngine, stream: TextIO = sys.stderr) -> None:
+    """Print the end-of-run report (to stderr so stdout stays pure JSONL)."""
+    print("\n=== Async Tool-Calling Summary ===", file=stream)
+    print(f"Incidents  : {stats['incidents']} ({stats['succeeded']} ok, {stats['failed']} failed, "
+          f"{stats['degraded']} degraded)", file=stream)
+    print(f"Elapsed    : {stats['elapsed_s']} s", file=stream)
+    print(f"Throughput : {stats['throughput_per_s']} incidents/s", file=stream)
+    print(f"Latency    : p50 {stats['p50_ms']} ms | p95 {stats['p95_ms']} ms | p99 {stats['p99_ms']} ms",
+          file=stream)
+    print(f"Model calls: {stats['round_trips']} ({stats['total_tokens']} tokens), "
+          f"peak {engine.stats['peak_in_flight']}/{engine.concurrency} in flight", file=stream)
+    print(f"Re-triage  : {retriage_queue.stats['retriaged']} degraded incidents re-triaged, "
+          f"{len(retriage_queue)} pending", file=stream)
+    router = getattr(engine.client, "router", None) or getattr(getattr(engine.client, "_client", None), "router", None)
+    if router is not None:
+        for name, t in router.snapshot()["targets"].items():
+            print(f"Deployment : {name} {t['requests']} requests, {t['failures']} failed, "
+                  f"{t['ejections']} ejections, EWMA {t['ewma_ms']} ms", file=stream)
+    hedger = getattr(engine.client, "hedger", None)
+    if hedger is not None:
+        h = hedger.snapshot()
+        print(f"Hedging    : {h['hedged']} hedges ({h['hedge_rate']:.1%} of calls), won {h['hedge_wins']} "
+              f"({h['win_rate']:.0%}), {h['budget_denied']} denied by budget, delay {h['hedge_delay_ms']} ms",
+              file=stream)
+
+
+# -------------------------
+# Main entry point
+# -------------------------
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Run many incident tool conversations concurrently.")
+    parser.add_argument("input", nargs="?", default="-", help="JSONL/CSV file, or '-' for stdin (default)")
+    parser.add_argument("--format", choices=("auto", "jsonl", "csv"), default="auto")
+    parser.add_argument("--output", "-o", default="-", help="Result JSONL file, or '-' for stdout (default)")
+    parser.add_argument("--concurrency", "-c", type=int, default=DEFAULT_CONCURRENCY,
+                        help="Model requests in flight across all incidents")
+    parser.add_argument("--deadline", type=float, default=DEFAULT_DEADLINE, help="Seconds per incident")
+    parser.add_argument("--temperature", type=float, default=DEFAULT_TEMPERATURE)
+    parser.add_argument("--max-tokens", type=int, default=DEFAULT_MAX_TOKENS)
+    parser.add_argument("--hedge", action="store_true", help="Hedge slow model calls (see workshop1.hedging)")
+    parser.add_argument("--pool", default=None,
+                        help="Deployment pool JSON file or inline JSON list (see workshop1.router)")
+    args = parser.parse_args(argv)
+
+    out = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    # Same breaker as the default client: failover first, then one outcome per call for the breaker
+    client = guarded(routed(load_pool(args.pool), is_async=True)) if args.pool else None
+    engine = IncidentEngine(client=client, concurrency=args.concurrency, deadline=args.deadline,
+                            temperature=args.temperature, max_tokens=args.max_tokens, hedge=args.hedge)
+
+    def write(result: Dict[str, Any]) -> None:
+        # Each result as soon as it finishes (completion order, not input order)
+        out.write(json.dumps(result) + "\n")
+        out.flush()
+
+    async def run() -> List[Dict[str, Any]]:
+        try:
+            return await engine.run_many(read_incidents(args.input, args.format), on_result=write)
+        finally:
+            await engine.aclose()
+            if client is not None:
+                await client.close()
+
+    started = time.perf_counter()
+    try:
+        # Tool output ([TOOL], [EMAIL]) goes to stderr so stdout stays pure JSONL
+        with contextlib.redirect_stdout(sys.stderr):
+            results = asyncio.run(run())
+            # Breaker closes re-triage in the background (exercise8_advanced); whatever is still
+            # queued while it is closed (e.g. degraded by a bad reply) is re-triaged before exiting
+            if len(retriage_queue) and breaker.state == CLOSED:
+                retriage_pending()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    print_summary(summarize(results, time.perf_counter() - started), engine)
+
+
+if __name__ == "__main__":
+    main()
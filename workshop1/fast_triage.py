@@ -0,0 +1,371 @@
+# Keyword Fast Path for Obvious Incidents (Aho-Corasick)
+
+"""
+demo for:
+- Skipping the LLM for clear-cut incidents ("production database is down")
+- One compiled multi-pattern matcher (Aho-Corasick): every phrase list is
+  matched in a single pass over the text, however many phrases there are
+- Phrase lists seeded from the few-shot examples in exercise7.build_messages
+- Negation check: "nothing is down" / "no outage" never counts as a hit and sends the
+  incident to the LLM instead
+- Corroboration: one phrase on its own ("the printer is down", "scheduled outage") is
+  never enough to skip the LLM; a confident result needs two independent phrases
+- Hit-rate and agreement-with-LLM metrics for tuning the confidence threshold
+- Degraded mode: a keyword triage for every incident while the LLM is unavailable
+
+Try it:
+    python -m workshop1.fast_triage "Production database is down for all apps"
+"""
+
+import json
+import random
+import re
+import sys
+import threading
+from collections import deque
+from typing import List, Dict, Any, Deque, Iterable, Optional, Tuple
+
+# -------------------------
+# Configuration
+# -------------------------
+
+SEVERITIES = ("NORMAL", "ALERT", "CRISIS")
+
+# phrase -> weight; matched case-insensitively on word boundaries
+DEFAULT_PHRASES: Dict[str, Dict[str, float]] = {
+    "CRISIS": {
+        "is down": 1.0, "outage": 1.0, "data loss": 1.5, "ransomware": 2.0, "breach": 1.5,
+        "all users": 0.75, "no connections possible": 1.5, "production database": 1.0,
+        "cannot log in": 0.75, "site down": 1.5, "service unavailable": 1.0,
+    },
+    "ALERT": {
+        "intermittent": 1.0, "degraded": 1.0, "high error rate": 1.0, "some users cannot": 1.0,
+        "disk almost full": 1.0, "failing over": 1.0, "elevated latency": 1.0, "timeouts": 0.75,
+    },
+    "NORMAL": {
+        "slightly slow": 1.0, "minor": 0.75, "cosmetic": 1.0, "typo": 1.0, "single user": 0.75,
+        "password reset": 1.0, "how do i": 1.0, "feature request": 1.0,
+    },
+}
+
+# Degraded mode: severity when no phrase matched at all (someone should look at it),
+# and the step added to every degraded result
+DEGRADED_DEFAULT_SEVERITY = "ALERT"
+DEGRADED_ACTION = "Re-triage with the LLM once the service is back (keyword triage only)."
+
+DEFAULT_ACTIONS: Dict[str, List[str]] = {
+    "CRISIS": [
+        "Page the on-call engineer immediately.",
+        "Open a major-incident bridge.",
+        "Post an incident update on the status page.",
+    ],
+    "ALERT": [
+        "Notify the owning team's on-call channel.",
+        "Check recent deploys and monitoring dashboards.",
+        "Re-assess severity within 30 minutes.",
+    ],
+    "NORMAL": [
+        "Log the incident in the monitoring system.",
+        "Check recent performance dashboards.",
+        "Monitor for any worsening or new complaints.",
+    ],
+}
+
+DEFAULT_MIN_SCORE = 1.0     # winning severity needs at least this much phrase weight
+DEFAULT_MIN_MARGIN = 1.0    # ...and must beat the runner-up by this much
+DEFAULT_MIN_PHRASES = 2     # ...backed by this many independent phrases (not one inside another)
+
+# A phrase preceded (within the same clause) by one of these words is negated:
+# it scores nothing, and the incident is never answered by keywords alone
+NEGATIONS = {"not", "no", "nothing", "never", "none", "without", "nobody", "neither", "nor"}
+NEGATION_WINDOW = 3         # words before the phrase that are checked
+MAX_LABELLED = 10_000       # LLM labels kept for the agreement metrics (most recent)
+
+
+# -------------------------
+# Aho-Corasick matcher
+# -------------------------
+
+class AhoCorasick:
+    """Compiled automaton: find all phrase occurrences in one left-to-right pass."""
+
+    def __init__(self, phrases: Iterable[str]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[str]] = [[]]
+
+        for phrase in phrases:
+            node = 0
+            for ch in phrase:
+                nxt = self._goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[node][ch] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                node = nxt
+            if phrase not in self._out[node]:
+                self._out[node].append(phrase)
+
+        # Breadth-first pass to wire failure links and merge outputs
+        pending = deque(self._goto[0].values())
+        while pending:
+            node = pending.popleft()
+            for ch, child in self._goto[node].items():
+                pending.append(child)
+                f = self._fail[node]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                self._fail[child] = self._goto[f].get(ch, 0)
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+
+    def find(self, text: str) -> List[Tuple[int, str]]:
+        """Return (start_index, phrase) for every occurrence in text."""
+        goto, fail, out = self._goto, self._fail, self._out
+        node = 0
+        found: List[Tuple[int, str]] = []
+        for i, ch in enumerate(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            for phrase in out[node]:
+                found.append((i - len(phrase) + 1, phrase))
+        return found
+
+
+# -------------------------
+# Keyword triage
+# -------------------------
+
+def _normalize(text: str) -> str:
+    return re.sub(r"\s+", " ", text.lower()).strip()
+
+
+def _is_negated(text: str, start: int) -> bool:
+    """True if a negation word appears in the few words before text[start:] (same clause)."""
+    clause = re.split(r"[,.;:!?]", text[:start])[-1]
+    for word in clause.split()[-NEGATION_WINDOW:]:
+        if word in NEGATIONS or word.endswith("n't"):
+            return True
+    return False
+
+
+class KeywordTriage:
+    """
+    Score each severity by the weights of the phrases found in the description.
+    A result is "confident" when the best score is high enough and clearly
+    ahead of the runner-up; anything else falls through to the LLM.
+    """
+
+    def __init__(self,
+                 phrases: Optional[Dict[str, Dict[str, float]]] = None,
+                 actions: Optional[Dict[str, List[str]]] = None,
+                 min_score: float = DEFAULT_MIN_SCORE,
+                 min_margin: float = DEFAULT_MIN_MARGIN,
+                 min_phrases: int = DEFAULT_MIN_PHRASES,
+                 shadow_rate: float = 0.0):
+        self.phrases: Dict[str, Dict[str, float]] = {s: {} for s in SEVERITIES}
+        for sev, table in (phrases if phrases is not None else DEFAULT_PHRASES).items():
+            for phrase, weight in table.items():
+                self.phrases.setdefault(sev, {})[_normalize(phrase)] = weight
+        self.actions = {sev: list(a) for sev, a in (actions or DEFAULT_ACTIONS).items()}
+        self.min_score = min_score
+        self.min_margin = min_margin
+        self.min_phrases = min_phrases
+        self.shadow_rate = shadow_rate   # fraction of confident hits still sent to the LLM for comparison
+
+        self._lock = threading.Lock()
+        # (candidate, score, margin, phrases, negated, llm_severity); bounded, newest labels win
+        self._labelled: Deque[Tuple[str, float, float, int, bool, str]] = deque(maxlen=MAX_LABELLED)
+        self.counters = {"lookups": 0, "hits": 0, "fallthroughs": 0, "shadow_checks": 0, "degraded": 0}
+        self._compile()
+
+    def _compile(self) -> None:
+        self._lookup: Dict[str, List[Tuple[str, float]]] = {}
+        for sev, table in self.phrases.items():
+            for phrase, weight in table.items():
+                self._lookup.setdefault(phrase, []).append((sev, weight))
+        self._matcher = AhoCorasick(self._lookup)
+
+    def seed_from_messages(self, messages: List[Dict[str, Any]], weight: float = 1.0) -> None:
+        """
+        Add phrases from few-shot pairs: each example user description (split into
+        clauses) is credited to the severity in the following assistant JSON, and
+        that example's actions become the templated actions for the severity.
+        """
+        for user_msg, assistant_msg in zip(messages, messages[1:]):
+            if user_msg.get("role") != "user" or assistant_msg.get("role") != "assistant":
+                continue
+            try:
+                example = json.loads(assistant_msg["content"])
+            except (TypeError, ValueError):
+                continue
+            sev = str(example.get("severity", "")).upper()
+            if sev not in SEVERITIES:
+                continue
+            description = user_msg["content"].split("Incident description:", 1)[-1]
+            for clause in re.split(r"[,.;:\n]+", description):
+                clause = _normalize(clause)
+                if len(clause.split()) >= 2:
+                    self.phrases[sev][clause] = max(weight, self.phrases[sev].get(clause, 0.0))
+            if example.get("actions"):
+                self.actions[sev] = [str(a) for a in example["actions"]]
+        self._compile()
+
+    # ---- matching ----
+
+    def match(self, description: str) -> Dict[str, Any]:
+        """Score a description. Always returns the candidate; check ['confident']."""
+        candidate = self._score(description)
+        with self._lock:
+            self.counters["lookups"] += 1
+            self.counters["hits" if candidate["confident"] else "fallthroughs"] += 1
+        return candidate
+
+    def _score(self, description: str) -> Dict[str, Any]:
+        text = _normalize(description)
+        scores = {sev: 0.0 for sev in SEVERITIES}
+        matched: List[str] = []
+        negated: List[str] = []
+        spans: Dict[str, Tuple[int, int]] = {}
+        for start, phrase in self._matcher.find(text):
+            end = start + len(phrase)
+            # Whole words only: "down" must not match inside "download"
+            if (start > 0 and text[start - 1].isalnum()) or (end < len(text) and text[end].isalnum()):
+                continue
+            # Every occurrence is checked: "ransomware scan found no ransomware" is negated
+            if _is_negated(text, start):
+                if phrase not in negated:
+                    negated.append(phrase)
+                continue
+            if phrase in matched:
+                continue
+            matched.append(phrase)
+            spans[phrase] = (start, end)
+            for sev, weight in self._lookup[phrase]:
+                scores[sev] += weight
+
+        ranked = sorted(scores.items(), key=lambda kv: kv[1], reverse=True)
+        (best, best_score), (_, second_score) = ranked[0], ranked[1]
+        margin = best_score - second_score
+        # Phrases behind the winning severity; one found inside another ("is down" inside a
+        # seeded "production database is down") is the same evidence and is not counted
+        phrases = sum(
+            1 for phrase, (start, end) in spans.items()
+            if any(sev == best for sev, _ in self._lookup[phrase])
+            and not any(other != phrase and s <= start and end <= e for other, (s, e) in spans.items())
+        )
+        return {"severity": best, "scores": scores, "score": best_score, "margin": margin,
+                "phrases": phrases, "matched": matched, "negated": negated,
+                "confident": self._is_confident(best_score, margin, phrases, bool(negated))}
+
+    def _is_confident(self, score: float, margin: float, phrases: int, negated: bool,
+                      min_margin: Optional[float] = None) -> bool:
+        """The fast-path rule; also used to pick the labels behind agreement_confident."""
+        min_margin = self.min_margin if min_margin is None else min_margin
+        return (not negated and score >= self.min_score and margin >= min_margin
+                and phrases >= self.min_phrases)
+
+    def classify(self, description: str) -> Optional[Dict[str, Any]]:
+        """Triage result (same shape as the LLM's) when confident, else None."""
+        candidate = self.match(description)
+        return self.to_result(description, candidate) if candidate["confident"] else None
+
+    def to_result(self, description: str, candidate: Dict[str, Any]) -> Dict[str, Any]:
+        sev = candidate["severity"]
+        summary = re.split(r"(?<=[.!?])\s", description.strip(), maxsplit=1)[0]
+        return {
+            "summary": summary[:160],
+            "severity": sev,
+            "actions": list(self.actions.get(sev, [])),
+            "source": "keyword",
+            "matched": candidate["matched"],
+        }
+
+    def degraded_result(self, description: str, reason: str) -> Dict[str, Any]:
+        """
+        Best-effort triage while the LLM is unavailable: the keyword severity even when
+        not confident, its template actions, and needs_retriage so it is looked at again.
+        """
+        candidate = self._score(description)
+        if not candidate["matched"]:
+            candidate["severity"] = DEGRADED_DEFAULT_SEVERITY
+        with self._lock:
+            self.counters["degraded"] += 1
+        result = self.to_result(description, candidate)
+        result.update({
+            "actions": result["actions"] + [DEGRADED_ACTION],
+            "source": "degraded",
+            "degraded_reason": reason,
+            "needs_retriage": True,
+        })
+        return result
+
+    def shadow_sample(self) -> bool:
+        """True if this confident hit should still go to the LLM for an agreement check."""
+        if self.shadow_rate > 0 and random.random() < self.shadow_rate:
+            with self._lock:
+                self.counters["shadow_checks"] += 1
+            return True
+        return False
+
+    # ---- metrics ----
+
+    def record_llm_severity(self, candidate: Dict[str, Any], llm_severity: str) -> None:
+        """Remember what the LLM said for a description we also scored."""
+        with self._lock:
+            self._labelled.append((candidate["severity"], candidate["score"], candidate["margin"],
+                                   candidate["phrases"], bool(candidate["negated"]),
+                                   str(llm_severity).upper()))
+
+    def metrics(self) -> Dict[str, Any]:
+        """Hit rate plus agreement with the LLM (confident candidates only, and all)."""
+        with self._lock:
+            counters = dict(self.counters)
+            labelled = list(self._labelled)
+        lookups = counters["lookups"]
+        confident = [(c, l) for c, s, m, p, n, l in labelled if self._is_confident(s, m, p, n)]
+        counters["hit_rate"] = round(counters["hits"] / lookups, 3) if lookups else 0.0
+        counters["labelled"] = len(labelled)
+        counters["agreement_confident"] = (
+            round(sum(c == l for c, l in confident) / len(confident), 3) if confident else None
+        )
+        counters["agreement_all"] = (
+            round(sum(c == l for c, _, _, _, _, l in labelled) / len(labelled), 3) if labelled else None
+        )
+        return counters
+
+    def threshold_report(self, margins: Iterable[float] = (0.25, 0.5, 0.75, 1.0, 1.5, 2.0)) -> List[Dict[str, Any]]:
+        """For each candidate margin threshold: share of labelled incidents it would
+        answer locally, and how often those answers agree with the LLM."""
+        with self._lock:
+            labelled = list(self._labelled)
+        report = []
+        for threshold in margins:
+            taken = [(c, l) for c, s, m, p, n, l in labelled if self._is_confident(s, m, p, n, threshold)]
+            report.append({
+                "min_margin": threshold,
+                "coverage": round(len(taken) / len(labelled), 3) if labelled else None,
+                "agreement": round(sum(c == l for c, l in taken) / len(taken), 3) if taken else None,
+            })
+        return report
+
+
+# -------------------------
+# Main entry point
+# -------------------------
+
+def main() -> None:
+    triage = KeywordTriage()
+    descriptions = sys.argv[1:] or [line.strip() for line in sys.stdin if line.strip()]
+    for description in descriptions:
+        candidate = triage.match(description)
+        verdict = candidate["severity"] if candidate["confident"] else "→ LLM"
+        negated = f" negated={candidate['negated']}" if candidate["negated"] else ""
+        print(f"{verdict:<7} margin={candidate['margin']:.2f} phrases={candidate['phrases']} matched={candidate['matched']}{negated}  {description}")
+    print(triage.metrics())
+
+
+if __name__ == "__main__":
+    main()
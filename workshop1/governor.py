@@ -0,0 +1,502 @@
+# Rate-Limit-Aware Request Governor
+
+"""
+demo for:
+- One process-wide governor in front of every chat.completions call (sync and async clients)
+- Token buckets for requests and estimated tokens (prompt chars/4 + max_tokens, the same
+  estimate the service charges against TPM), refilled at the deployment's RPM/TPM
+- x-ratelimit-remaining-requests / -tokens pull the buckets down to what the service reports
+- 429: every caller waits out Retry-After (retry-after-ms), then the request is retried
+- AIMD concurrency: slow start (+1 per success) until the first 429, then +1/limit per
+  success and x0.5 on a 429 (at most once per cooldown)
+- Result: requests queue briefly in the process instead of failing on a 429
+
+    client = governed(AzureOpenAI(**get_api_credentials()))   # same .chat.completions.create API
+    governor.configure(rpm=300, tpm=50_000)                     # the deployment's quota, if known
+
+Benchmark (local mock server with a quota; ungoverned vs governed):
+    python -m workshop1.governor --bench --rpm 100 --window 10 --threads 16
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import threading
+import time
+from typing import Dict, Any, Callable, Optional, Tuple
+from types import SimpleNamespace
+from openai import APIConnectionError, AsyncOpenAI, InternalServerError, RateLimitError
+
+# -------------------------
+# Configuration
+# -------------------------
+
+RPM_LIMIT = 0                 # deployment quota, requests per minute (0 = unknown: headers + AIMD only)
+TPM_LIMIT = 0                 # deployment quota, tokens per minute
+QUOTA_WINDOW = 60.0           # seconds the RPM/TPM quota applies to
+
+# Buckets hold 1/6 of the window's quota: the service enforces per-minute quotas over
+# 10-second slices, so a full minute's burst at once is throttled anyway
+BURST_FRACTION = 1 / 6
+
+INITIAL_CONCURRENCY = 8
+MIN_CONCURRENCY = 1
+MAX_CONCURRENCY = 64
+DECREASE_FACTOR = 0.5
+DECREASE_COOLDOWN = 1.0       # seconds; one 429 storm halves the limit once, not once per request
+
+MAX_RETRIES = 6               # 429s and transient errors; the SDK's own retries are turned off
+# 5xx / connection errors: a couple of quick retries ride out a blip; more only hide an
+# outage from the circuit breaker (workshop1.circuit_breaker) while the caller waits
+MAX_TRANSIENT_RETRIES = 2
+DEFAULT_RETRY_AFTER = 1.0     # seconds, when a 429 carries no Retry-After header
+DEFAULT_COMPLETION_ESTIMATE = 256   # tokens charged when a request sets no max_tokens
+SLOT_POLL = 0.005             # seconds between checks while every concurrency slot is taken
+
+
+# -------------------------
+# Token buckets
+# -------------------------
+
+class TokenBucket:
+    """Refills at limit/window per second, holds at most limit * BURST_FRACTION."""
+
+    def __init__(self, limit: float, window: float = QUOTA_WINDOW):
+        self.rate = limit / window
+        self.capacity = max(1.0, limit * BURST_FRACTION)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until `amount` can be taken (0 = now). Oversized requests wait for a full bucket."""
+        self._refill(now)
+        need = min(amount, self.capacity)
+        return 0.0 if self.level >= need else (need - self.level) / self.rate
+
+    def take(self, amount: float) -> None:
+        self.level -= amount      # may go negative (oversized request): later callers pay it back
+
+    def clamp(self, remaining: float) -> None:
+        """The service says only `remaining` is left: never believe we have more."""
+        self.level = min(self.level, remaining)
+
+
+def estimate_request_tokens(request: Dict[str, Any]) -> int:
+    """Prompt (chars / 4, tools included) + the completion budget."""
+    chars = 0
+    for message in request.get("messages", []):
+        content = message.get("content") if isinstance(message, dict) else None
+        if isinstance(content, str):
+            chars += len(content)
+        elif isinstance(content, list):
+            chars += sum(len(str(part.get("text", ""))) for part in content if isinstance(part, dict))
+        for tc in (message.get("tool_calls") or []) if isinstance(message, dict) else []:
+            chars += len(str(tc.get("function", {}).get("arguments", "")))
+    if request.get("tools"):
+        chars += len(json.dumps(request["tools"]))
+    completion = request.get("max_tokens") or request.get("max_completion_tokens") or DEFAULT_COMPLETION_ESTIMATE
+    return chars // 4 + int(completion)
+
+
+def _header_number(headers: Any, name: str) -> Optional[float]:
+    try:
+        value = headers.get(name) if headers is not None else None
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def retry_after_seconds(headers: Any) -> float:
+    """retry-after-ms (Azure) or Retry-After in seconds; DEFAULT_RETRY_AFTER if neither is usable."""
+    ms = _header_number(headers, "retry-after-ms")
+    if ms is not None:
+        return ms / 1000
+    seconds = _header_number(headers, "retry-after")
+    return seconds if seconds is not None else DEFAULT_RETRY_AFTER
+
+
+# -------------------------
+# Governor
+# -------------------------
+
+class Governor:
+    """
+    Admission control shared by every client in the process. A request needs a concurrency
+    slot plus room in both buckets; try_acquire never blocks, so threads (time.sleep) and
+    event loops (asyncio.sleep) can wait on the same state.
+    """
+
+    def __init__(self,
+                 rpm: int = RPM_LIMIT,
+                 tpm: int = TPM_LIMIT,
+                 window: float = QUOTA_WINDOW,
+                 initial_concurrency: int = INITIAL_CONCURRENCY,
+                 max_concurrency: int = MAX_CONCURRENCY,
+                 max_retries: int = MAX_RETRIES):
+        self._lock = threading.Lock()
+        self.window = window
+        self.requests: Optional[TokenBucket] = None
+        self.tokens: Optional[TokenBucket] = None
+        self.configure(rpm=rpm, tpm=tpm)
+        self.limit = float(initial_concurrency)
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.in_flight = 0
+        self._paused_until = 0.0
+        self._last_decrease = 0.0
+        self._slow_start = True
+        self.stats = {"requests": 0, "throttled": 0, "retries": 0, "errors": 0, "cancelled": 0,
+                      "waited_s": 0.0, "peak_in_flight": 0}
+
+    def configure(self, rpm: Optional[int] = None, tpm: Optional[int] = None,
+                  window: Optional[float] = None) -> None:
+        """Set the deployment quota (0 disables that bucket)."""
+        with self._lock:
+            if window is not None:
+                self.window = window
+            if rpm is not None:
+                self.requests = TokenBucket(rpm, self.window) if rpm else None
+            if tpm is not None:
+                self.tokens = TokenBucket(tpm, self.window) if tpm else None
+
+    # ---- admission ----
+
+    def try_acquire(self, tokens: int) -> float:
+        """Take a slot and bucket capacity and return 0, or return how long to wait first."""
+        with self._lock:
+            now = time.monotonic()
+            if now < self._paused_until:
+                return self._paused_until - now
+            if self.in_flight >= int(self.limit):
+                return SLOT_POLL
+            wait = max(self.requests.wait_time(1, now) if self.requests else 0.0,
+                       self.tokens.wait_time(tokens, now) if self.tokens else 0.0)
+            if wait > 0:
+                return wait
+            if self.requests:
+                self.requests.take(1)
+            if self.tokens:
+                self.tokens.take(tokens)
+            self.in_flight += 1
+            self.stats["requests"] += 1
+            self.stats["peak_in_flight"] = max(self.stats["peak_in_flight"], self.in_flight)
+            return 0.0
+
+    def acquire(self, tokens: int) -> None:
+        started = time.monotonic()
+        while True:
+            wait = self.try_acquire(tokens)
+            if wait <= 0:
+                break
+            time.sleep(wait)
+        self._add_wait(time.monotonic() - started)
+
+    async def aacquire(self, tokens: int) -> None:
+        started = time.monotonic()
+        while True:
+            wait = self.try_acquire(tokens)
+            if wait <= 0:
+                break
+            await asyncio.sleep(wait)
+        self._add_wait(time.monotonic() - started)
+
+    def _add_wait(self, seconds: float) -> None:
+        with self._lock:
+            self.stats["waited_s"] += seconds
+
+    # ---- feedback ----
+
+    def observe(self, headers: Any) -> None:
+        """Pull the buckets down to the service's x-ratelimit-remaining-* view."""
+        remaining_requests = _header_number(headers, "x-ratelimit-remaining-requests")
+        remaining_tokens = _header_number(headers, "x-ratelimit-remaining-tokens")
+        with self._lock:
+            if self.requests and remaining_requests is not None:
+                self.requests.clamp(remaining_requests)
+            if self.tokens and remaining_tokens is not None:
+                self.tokens.clamp(remaining_tokens)
+
+    def release(self, outcome: str = "ok", retry_after: float = 0.0) -> None:
+        """outcome: "ok" (additive increase), "throttled" (429: pause + decrease), "error" or "cancelled"."""
+        with self._lock:
+            self.in_flight -= 1
+            now = time.monotonic()
+            if outcome == "ok":
+                step = 1.0 if self._slow_start else 1.0 / self.limit
+                self.limit = min(float(self.max_concurrency), self.limit + step)
+            elif outcome == "throttled":
+                self.stats["throttled"] += 1
+                self._paused_until = max(self._paused_until, now + retry_after)
+                self._slow_start = False
+                if now - self._last_decrease >= DECREASE_COOLDOWN:
+                    self.limit = max(float(MIN_CONCURRENCY), self.limit * DECREASE_FACTOR)
+                    self._last_decrease = now
+            elif outcome == "cancelled":
+                self.stats["cancelled"] += 1      # e.g. the losing half of a hedged request
+            else:
+                self.stats["errors"] += 1
+
+    def _retry(self, attempt: int, error: Exception) -> float:
+        """Count a retry and return the backoff before it; re-raise once retries run out."""
+        limit = self.max_retries if isinstance(error, RateLimitError) else min(self.max_retries, MAX_TRANSIENT_RETRIES)
+        if attempt >= limit:
+            raise error
+        with self._lock:
+            self.stats["retries"] += 1
+        if isinstance(error, RateLimitError):
+            return 0.0    # the Retry-After pause is already in place for everyone
+        return min(8.0, 0.5 * 2 ** attempt) * random.uniform(0.5, 1.0)
+
+    # ---- calls ----
+
+    def call(self, create: Callable[..., Any], request: Dict[str, Any]) -> Any:
+        """Run a with_raw_response.create under the governor; returns the parsed response."""
+        tokens = estimate_request_tokens(request)
+        attempt = 0
+        while True:
+            self.acquire(tokens)
+            try:
+                raw = create(**request)
+            except RateLimitError as e:
+                self.observe(e.response.headers)
+                self.release("throttled", retry_after_seconds(e.response.headers))
+                time.sleep(self._retry(attempt, e))
+            except (APIConnectionError, InternalServerError) as e:
+                self.release("error")
+                time.sleep(self._retry(attempt, e))
+            except BaseException:
+                self.release("error")
+                raise
+            else:
+                self.observe(raw.headers)
+                response = raw.parse()
+                if request.get("stream"):
+                    # The slot is held until the stream is consumed or closed
+                    return _GovernedStream(response, self.release)
+                self.release("ok")
+                return response
+            attempt += 1
+
+    async def acall(self, create: Callable[..., Any], request: Dict[str, Any]) -> Any:
+        """Async twin of call()."""
+        tokens = estimate_request_tokens(request)
+        attempt = 0
+        while True:
+            await self.aacquire(tokens)
+            try:
+                raw = await create(**request)
+            except RateLimitError as e:
+                self.observe(e.response.headers)
+                self.release("throttled", retry_after_seconds(e.response.headers))
+                await asyncio.sleep(self._retry(attempt, e))
+            except (APIConnectionError, InternalServerError) as e:
+                self.release("error")
+                await asyncio.sleep(self._retry(attempt, e))
+            except asyncio.CancelledError:
+                self.release("cancelled")
+                raise
+            except BaseException:
+                self.release("error")
+                raise
+            else:
+                self.observe(raw.headers)
+                response = raw.parse()
+                if request.get("stream"):
+                    return _AsyncGovernedStream(response, self.release)
+                self.release("ok")
+                return response
+            attempt += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self.stats, "waited_s": round(self.stats["waited_s"], 3),
+                    "concurrency_limit": round(self.limit, 2), "in_flight": self.in_flight}
+
+
+class _GovernedStream:
+    """Iterates the SDK stream; gives the concurrency slot back when it ends or is closed."""
+
+    def __init__(self, stream: Any, release: Callable[[str], None]):
+        self._stream = stream
+        self._release = release
+        self._released = False
+
+    def _done(self, outcome: str) -> None:
+        if not self._released:
+            self._released = True
+            self._release(outcome)
+
+    def __iter__(self) -> Any:
+        try:
+            for chunk in self._stream:
+                yield chunk
+        except (KeyboardInterrupt, GeneratorExit):
+            # The reader stopped early (Ctrl-C or abandoned loop); not a service failure
+            self._done("cancelled")
+            raise
+        except BaseException:
+            self._done("error")
+            raise
+        self._done("ok")
+
+    def close(self) -> None:
+        self._stream.close()
+        self._done("ok")
+
+    def __enter__(self) -> "_GovernedStream":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    def __del__(self) -> None:
+        self._done("ok")
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._stream, name)
+
+
+class _AsyncGovernedStream(_GovernedStream):
+
+    async def __aiter__(self) -> Any:
+        try:
+            async for chunk in self._stream:
+                yield chunk
+        except (asyncio.CancelledError, GeneratorExit):
+            self._done("cancelled")
+            raise
+        except BaseException:
+            self._done("error")
+            raise
+        self._done("ok")
+
+    async def close(self) -> None:   # type: ignore[override]
+        await self._stream.close()
+        self._done("ok")
+
+    async def __aenter__(self) -> "_AsyncGovernedStream":
+        return self
+
+    async def __aexit__(self, *exc: Any) -> None:
+        await self.close()
+
+
+# -------------------------
+# Governed clients
+# -------------------------
+
+# Shared by every governed client in this process
+governor = Governor()
+
+
+class _Completions:
+    def __init__(self, completions: Any, raw_completions: Any, gov: Governor, is_async: bool):
+        self._completions = completions
+        self._raw = raw_completions.with_raw_response
+        self._governor = gov
+        self._is_async = is_async
+
+    def create(self, **request: Any) -> Any:
+        if self._is_async:
+            return self._governor.acall(self._raw.create, request)   # awaitable, like the SDK's
+        return self._governor.call(self._raw.create, request)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._completions, name)
+
+
+class GovernedClient:
+    """
+    Drop-in wrapper for AzureOpenAI / AsyncAzureOpenAI: chat.completions.create goes through
+    the governor, everything else is the wrapped client. The SDK's own retries are turned
+    off so 429s reach the governor (it retries them itself).
+    """
+
+    def __init__(self, client: Any, gov: Optional[Governor] = None):
+        self._client = client
+        self.governor = gov or governor
+        raw_client = client.with_options(max_retries=0)
+        self.chat = SimpleNamespace(completions=_Completions(
+            client.chat.completions, raw_client.chat.completions, self.governor,
+            is_async=isinstance(client, AsyncOpenAI)))
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._client, name)
+
+
+def governed(client: Any, gov: Optional[Governor] = None) -> GovernedClient:
+    return client if isinstance(client, GovernedClient) else GovernedClient(client, gov)
+
+
+# -------------------------
+# Benchmark
+# -------------------------
+
+def _hammer(client: Any, seconds: float, threads: int) -> Tuple[int, int]:
+    """Send requests from `threads` threads for `seconds`; return (succeeded, failed)."""
+    counts = {"ok": 0, "failed": 0}
+    lock = threading.Lock()
+    stop_at = time.monotonic() + seconds
+
+    def worker() -> None:
+        while time.monotonic() < stop_at:
+            try:
+                client.chat.completions.create(model="mock", max_tokens=50,
+                                               messages=[{"role": "user", "content": "Printer offline on floor 3"}])
+                key = "ok"
+            except Exception:
+                key = "failed"
+            with lock:
+                counts[key] += 1
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    return counts["ok"], counts["failed"]
+
+
+def main() -> None:
+    from openai import OpenAI
+    from workshop1.mock_openai_server import start_mock_server
+
+    parser = argparse.ArgumentParser(description="Request governor benchmark (local mock server with a quota).")
+    parser.add_argument("--bench", action="store_true")
+    parser.add_argument("--rpm", type=int, default=100, help="Requests allowed per quota window")
+    parser.add_argument("--window", type=float, default=10.0, help="Quota window in seconds (60 = real RPM)")
+    parser.add_argument("--seconds", type=float, default=20.0)
+    parser.add_argument("--threads", type=int, default=16)
+    args = parser.parse_args()
+    if not args.bench:
+        parser.print_help()
+        return
+
+    # Ungoverned clients retry instantly, so their accepted count is the most the quota allows
+    accepted: Dict[str, int] = {}
+    for label in ("ungoverned", "governed"):
+        server = start_mock_server(latency="fixed:0.05", token_delay=0, rpm_limit=args.rpm,
+                                   quota_window=args.window, retry_after=1.0)
+        client: Any = OpenAI(base_url=server.url + "/v1", api_key="mock", max_retries=0)
+        gov = None
+        if label == "governed":
+            gov = Governor(rpm=args.rpm, window=args.window)
+            client = governed(client, gov)
+        ok, failed = _hammer(client, args.seconds, args.threads)
+        stats = server.snapshot_stats()
+        server.shutdown()
+        accepted[label] = ok
+        print(f"[BENCH] {label:<10}: {ok} ok in {args.seconds:g}s ({ok / args.seconds:.2f}/s, "
+              f"quota {args.rpm / args.window:.2f}/s), {failed} failed calls, {stats.get('429', 0)} 429s from the server")
+        if gov is not None:
+            print(f"[BENCH] governor  : {gov.snapshot()}")
+    print(f"[BENCH] governed throughput = {accepted['governed'] / max(1, accepted['ungoverned']):.0%} of the ungoverned maximum")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,387 @@
+# Hedged Requests for Tail Latency
+
+"""
+demo for:
+- Hedging: if a call has not returned by the hedge delay, send a duplicate and take
+  whichever finishes first (the other one is cancelled)
+- The hedge delay tracks a latency percentile (default p95) over a sliding window of
+  recent calls, so only the slowest ~5% of calls are ever hedged
+- Hedge budget: each call earns HEDGE_BUDGET of a hedge (capped at HEDGE_BURST saved up),
+  so duplicates can never add more than that fraction to total traffic
+- A call that fails while its twin is still running returns the twin's result instead
+- Metrics: hedge rate (extra requests sent), win rate (how often the hedge was faster),
+  budget denials; snapshot() and prometheus_text()
+
+    client = hedged(governed(AzureOpenAI(**get_api_credentials())))   # same .chat.completions.create API
+    client.hedger.snapshot()
+
+Sync clients cannot interrupt a blocking HTTP call: the losing thread is abandoned and its
+reply discarded. Async clients cancel the losing task (the connection is closed).
+Streaming requests (stream=True) are never hedged.
+
+Benchmark (local mock server, heavy-tailed latency; plain vs hedged):
+    python -m workshop1.hedging --bench
+"""
+
+import argparse
+import asyncio
+import contextvars
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import List, Dict, Any, Callable, Optional, Tuple
+from types import SimpleNamespace
+from openai import AsyncOpenAI
+
+# -------------------------
+# Configuration
+# -------------------------
+
+HEDGE_PERCENTILE = 95.0       # hedge calls slower than this percentile of recent calls
+HEDGE_BUDGET = 0.05           # hedges may add at most 5% to total traffic
+HEDGE_BURST = 3.0             # unused budget that can be saved up for a burst of slow calls
+DEFAULT_HEDGE_DELAY = 2.0     # seconds, until MIN_SAMPLES latencies have been seen
+MIN_HEDGE_DELAY = 0.05        # never hedge sooner than this
+MIN_SAMPLES = 20
+LATENCY_WINDOW = 500          # recent latencies the percentile is taken over
+HEDGE_WORKERS = 32            # threads for sync attempts (primary + hedge)
+
+
+# -------------------------
+# Latency window
+# -------------------------
+
+class LatencyWindow:
+    """The last `size` call latencies (seconds) with a nearest-rank percentile."""
+
+    def __init__(self, size: int = LATENCY_WINDOW):
+        self._samples: "deque[float]" = deque(maxlen=size)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def add(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def percentile(self, p: float) -> Optional[float]:
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        rank = max(1, math.ceil(p / 100 * len(ordered)))
+        return ordered[rank - 1]
+
+
+# -------------------------
+# Hedger
+# -------------------------
+
+class Hedger:
+    """
+    Hedging policy + metrics for one kind of call (one deployment / prompt shape:
+    the latency percentile only makes sense over similar requests).
+    """
+
+    def __init__(self,
+                 percentile: float = HEDGE_PERCENTILE,
+                 budget: float = HEDGE_BUDGET,
+                 burst: float = HEDGE_BURST,
+                 default_delay: float = DEFAULT_HEDGE_DELAY,
+                 min_delay: float = MIN_HEDGE_DELAY,
+                 min_samples: int = MIN_SAMPLES,
+                 window: int = LATENCY_WINDOW,
+                 executor: Optional[ThreadPoolExecutor] = None):
+        self.percentile = percentile
+        self.budget = budget
+        self.burst = burst
+        self.default_delay = default_delay
+        self.min_delay = min_delay
+        self.min_samples = min_samples
+        self._latencies = LatencyWindow(window)
+        self._executor = executor
+        self._tokens = 0.0
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "hedged": 0, "hedge_wins": 0, "budget_denied": 0,
+                      "rescued": 0, "failed": 0}
+
+    # ---- policy ----
+
+    def hedge_delay(self) -> float:
+        """Seconds to wait for the first attempt before sending a duplicate."""
+        with self._lock:
+            if len(self._latencies) < self.min_samples:
+                return self.default_delay
+            return max(self.min_delay, self._latencies.percentile(self.percentile) or 0.0)
+
+    def _admit(self) -> None:
+        with self._lock:
+            self.stats["requests"] += 1
+            self._tokens = min(self.burst, self._tokens + self.budget)
+
+    def _take_budget(self) -> bool:
+        with self._lock:
+            if self._tokens < 1.0:
+                self.stats["budget_denied"] += 1
+                return False
+            self._tokens -= 1.0
+            self.stats["hedged"] += 1
+            return True
+
+    def _record(self, seconds: float) -> None:
+        with self._lock:
+            self._latencies.add(seconds)
+
+    def _settle(self, attempts: List[Any], winner: Optional[Any]) -> None:
+        with self._lock:
+            if winner is None:
+                self.stats["failed"] += 1
+            elif len(attempts) > 1 and winner is attempts[1]:
+                self.stats["hedge_wins"] += 1
+                # The first attempt had already failed: the hedge saved the call, not just time
+                if attempts[0].done() and not attempts[0].cancelled() and attempts[0].exception() is not None:
+                    self.stats["rescued"] += 1
+
+    # ---- sync ----
+
+    def _pool(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=HEDGE_WORKERS, thread_name_prefix="hedge")
+        return self._executor
+
+    def _timed(self, create: Callable[..., Any], request: Dict[str, Any]) -> Any:
+        started = time.monotonic()
+        response = create(**request)
+        self._record(time.monotonic() - started)
+        return response
+
+    def _submit(self, create: Callable[..., Any], request: Dict[str, Any]) -> "Future[Any]":
+        return self._pool().submit(contextvars.copy_context().run, self._timed, create, request)
+
+    def call(self, create: Callable[..., Any], request: Dict[str, Any]) -> Any:
+        """Run chat.completions.create(**request), hedged after hedge_delay()."""
+        if request.get("stream"):
+            return create(**request)
+        self._admit()
+        attempts = [self._submit(create, request)]
+        done, _ = wait(attempts, timeout=self.hedge_delay())
+        if not done and self._take_budget():
+            attempts.append(self._submit(create, request))
+
+        winner, error, pending = None, None, set(attempts)
+        while pending and winner is None:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    winner = future
+                    break
+                error = error or future.exception()
+        for future in pending:
+            future.cancel()      # only stops it if it has not started; a running loser is abandoned
+        self._settle(attempts, winner)
+        if winner is None:
+            raise error
+        return winner.result()
+
+    # ---- async ----
+
+    async def _atimed(self, create: Callable[..., Any], request: Dict[str, Any]) -> Any:
+        started = time.monotonic()
+        try:
+            response = await create(**request)
+        except asyncio.CancelledError:
+            # The loser's time so far is a lower bound on its latency: keep the tail visible
+            self._record(time.monotonic() - started)
+            raise
+        self._record(time.monotonic() - started)
+        return response
+
+    async def acall(self, create: Callable[..., Any], request: Dict[str, Any]) -> Any:
+        """Async twin of call(); the losing attempt is cancelled."""
+        if request.get("stream"):
+            return await create(**request)
+        self._admit()
+        attempts = [asyncio.ensure_future(self._atimed(create, request))]
+        winner, error = None, None
+        try:
+            done, _ = await asyncio.wait(attempts, timeout=self.hedge_delay())
+            if not done and self._take_budget():
+                attempts.append(asyncio.ensure_future(self._atimed(create, request)))
+
+            pending = set(attempts)
+            while pending and winner is None:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        winner = task
+                        break
+                    error = error or task.exception()
+        finally:
+            # Also runs when the caller is cancelled (deadline, engine.cancel)
+            for task in attempts:
+                if not task.done():
+                    task.cancel()
+        self._settle(attempts, winner)
+        if winner is None:
+            raise error
+        return winner.result()
+
+    # ---- metrics ----
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.stats)
+            samples = len(self._latencies)
+            p50 = self._latencies.percentile(50)
+            tail = self._latencies.percentile(self.percentile)
+        requests, hedged = stats["requests"], stats["hedged"]
+        return {**stats,
+                "hedge_rate": round(hedged / requests, 4) if requests else 0.0,
+                "win_rate": round(stats["hedge_wins"] / hedged, 4) if hedged else 0.0,
+                "hedge_delay_ms": round(self.hedge_delay() * 1000, 1),
+                "latency_p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+                f"latency_p{self.percentile:g}_ms": round(tail * 1000, 1) if tail is not None else None,
+                "samples": samples}
+
+    def prometheus_text(self, service: str = "workshop") -> str:
+        """Counters + hedge delay in the Prometheus text exposition format."""
+        s = self.snapshot()
+        labels = f'service="{service}"'
+        lines = []
+        for name, key, help_text in (
+            ("workshop_hedge_requests_total", "requests", "Calls made through the hedger."),
+            ("workshop_hedge_sent_total", "hedged", "Duplicate requests sent (hedge rate = sent / requests)."),
+            ("workshop_hedge_wins_total", "hedge_wins", "Calls where the duplicate finished first (win rate = wins / sent)."),
+            ("workshop_hedge_budget_denied_total", "budget_denied", "Slow calls not hedged because the budget was spent."),
+            ("workshop_hedge_failed_total", "failed", "Calls where every attempt failed."),
+        ):
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter", f"{name}{{{labels}}} {s[key]}"]
+        lines += ["# HELP workshop_hedge_delay_seconds Current hedge delay.",
+                  "# TYPE workshop_hedge_delay_seconds gauge",
+                  f"workshop_hedge_delay_seconds{{{labels}}} {s['hedge_delay_ms'] / 1000:g}"]
+        return "\n".join(lines) + "\n"
+
+
+# -------------------------
+# Hedged clients
+# -------------------------
+
+class _HedgedCompletions:
+    def __init__(self, completions: Any, hedger: Hedger, is_async: bool):
+        self._completions = completions
+        self._hedger = hedger
+        self._is_async = is_async
+
+    def create(self, **request: Any) -> Any:
+        if self._is_async:
+            return self._hedger.acall(self._completions.create, request)   # awaitable, like the SDK's
+        return self._hedger.call(self._completions.create, request)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._completions, name)
+
+
+class HedgedClient:
+    """
+    Drop-in wrapper for a (governed) AzureOpenAI / AsyncAzureOpenAI client: non-streaming
+    chat.completions.create calls are hedged, everything else is the wrapped client.
+    Wrap the governed client, so duplicates still count against the rate limits.
+    """
+
+    def __init__(self, client: Any, hedger: Optional[Hedger] = None):
+        self._client = client
+        self.hedger = hedger or Hedger()
+        # Governed and routed clients say whether they are async; a bare SDK client is checked by type
+        is_async = getattr(client.chat.completions, "_is_async", None)
+        if is_async is None:
+            is_async = isinstance(client, AsyncOpenAI)
+        self.chat = SimpleNamespace(completions=_HedgedCompletions(client.chat.completions, self.hedger, is_async))
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._client, name)
+
+
+def hedged(client: Any, hedger: Optional[Hedger] = None) -> HedgedClient:
+    return client if isinstance(client, HedgedClient) else HedgedClient(client, hedger)
+
+
+# -------------------------
+# Benchmark
+# -------------------------
+
+def _percentiles(latencies: List[float]) -> Tuple[float, float, float]:
+    window = LatencyWindow(len(latencies))
+    for seconds in latencies:
+        window.add(seconds)
+    return window.percentile(50) or 0.0, window.percentile(95) or 0.0, window.percentile(99) or 0.0
+
+
+def _run(client: Any, calls: int, threads: int) -> List[float]:
+    """`calls` requests from `threads` threads; returns each call's latency."""
+    latencies: List[float] = []
+    lock = threading.Lock()
+    remaining = [calls]
+
+    def worker() -> None:
+        while True:
+            with lock:
+                if remaining[0] == 0:
+                    return
+                remaining[0] -= 1
+            started = time.perf_counter()
+            client.chat.completions.create(model="mock", max_tokens=50,
+                                           messages=[{"role": "user", "content": "VPN drops every few minutes"}])
+            with lock:
+                latencies.append(time.perf_counter() - started)
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    return latencies
+
+
+def main() -> None:
+    from openai import OpenAI
+    from workshop1.mock_openai_server import start_mock_server
+
+    parser = argparse.ArgumentParser(description="Request hedging benchmark (local mock server).")
+    parser.add_argument("--bench", action="store_true")
+    parser.add_argument("--latency", default="straggler:0.1,0.02,10", help="mock latency distribution")
+    parser.add_argument("--calls", type=int, default=1000)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--budget", type=float, default=HEDGE_BUDGET)
+    args = parser.parse_args()
+    if not args.bench:
+        parser.print_help()
+        return
+
+    server = start_mock_server(latency=args.latency, token_delay=0)
+    client = OpenAI(base_url=server.url + "/v1", api_key="mock")
+    plain = _run(client, args.calls, args.threads)
+    p50, p95, p99 = _percentiles(plain)
+    print(f"[BENCH] plain : p50 {p50 * 1000:6.0f} ms  p95 {p95 * 1000:6.0f} ms  p99 {p99 * 1000:6.0f} ms  "
+          f"max {max(plain) * 1000:6.0f} ms")
+
+    # Same number of warm-up calls the hedger needs before its delay follows the percentile
+    hedged_client = hedged(client, Hedger(budget=args.budget))
+    _run(hedged_client, MIN_SAMPLES, 1)
+    before = hedged_client.hedger.snapshot()
+    latencies = _run(hedged_client, args.calls, args.threads)
+    p50, p95, p99 = _percentiles(latencies)
+    after = hedged_client.hedger.snapshot()
+    print(f"[BENCH] hedged: p50 {p50 * 1000:6.0f} ms  p95 {p95 * 1000:6.0f} ms  p99 {p99 * 1000:6.0f} ms  "
+          f"max {max(latencies) * 1000:6.0f} ms")
+    sent = after["hedged"] - before["hedged"]
+    wins = after["hedge_wins"] - before["hedge_wins"]
+    print(f"[BENCH] hedges: {sent} extra requests for {args.calls} calls ({sent / args.calls:.1%} of traffic), "
+          f"won {wins} ({wins / max(1, sent):.0%}), hedge delay {after['hedge_delay_ms']:.0f} ms")
+    print(f"[BENCH] hedger: {after}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,352 @@
+# Durable Local Incident Store (SQLite, WAL mode)
+
+"""
+demo for:
+- A real "save to DB" step for the triage workflow
+- SQLite in WAL mode: readers never block the writer
+- Group commit: one writer thread drains a queue and commits many inserts per transaction;
+  the queue is bounded, so a writer that falls behind slows add() down instead of using memory
+- Indexes on ticket_id, severity and created_at
+- Query API: recent incidents, incidents by severity, time-range counts
+- Time-ordered ticket IDs (workshop1.ticket_ids) as the primary key: new rows append
+  to the end of the B-tree, and "tickets after X" is a primary-key range scan
+
+Benchmark (many writer threads):
+    python -m workshop1.incident_store --bench --threads 32 --seconds 5
+"""
+
+import argparse
+import atexit
+import json
+import os
+import queue
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import List, Dict, Any, Optional, Tuple
+from workshop1.ticket_ids import new_ticket_id
+
+# -------------------------
+# Configuration
+# -------------------------
+
+DEFAULT_DB_PATH = "incidents.sqlite3"
+DEFAULT_BATCH_SIZE = 500          # max rows per transaction
+DEFAULT_MAX_DELAY = 0.005         # seconds the writer waits to fill a batch
+DEFAULT_MAX_QUEUE = 10_000        # rows waiting for the writer; add() blocks beyond this (backpressure)
+
+SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS incidents ("
+    " ticket_id TEXT PRIMARY KEY,"
+    " created_at REAL NOT NULL,"
+    " severity TEXT NOT NULL,"
+    " summary TEXT,"
+    " description TEXT,"
+    " data TEXT)",
+    "CREATE INDEX IF NOT EXISTS idx_incidents_created_at ON incidents(created_at)",
+    "CREATE INDEX IF NOT EXISTS idx_incidents_severity_created_at ON incidents(severity, created_at)",
+]
+
+_COLUMNS = "ticket_id, created_at, severity, summary, description, data"
+
+# Saving a ticket again (e.g. after re-triage) updates it but keeps its original created_at
+_UPSERT = (
+    f"INSERT INTO incidents ({_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?)"
+    " ON CONFLICT(ticket_id) DO UPDATE SET severity = excluded.severity, summary = excluded.summary,"
+    " description = excluded.description, data = excluded.data"
+)
+
+
+def _row_to_dict(row: Tuple) -> Dict[str, Any]:
+    ticket_id, created_at, severity, summary, description, data = row
+    return {
+        "ticket_id": ticket_id,
+        "created_at": created_at,
+        "severity": severity,
+        "summary": summary,
+        "description": description,
+        "data": json.loads(data) if data else {},
+    }
+
+
+# -------------------------
+# Store
+# -------------------------
+
+class _Ack:
+    """Completion handle for one queued row or flush; carries the commit error, if any."""
+
+    __slots__ = ("done", "error")
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.error: Optional[Exception] = None
+
+    def wait(self) -> None:
+        self.done.wait()
+        if self.error is not None:
+            raise self.error
+
+
+class IncidentStore:
+    """
+    Thread-safe incident store.
+    add() only enqueues; a single writer thread commits rows in batches.
+    Pass wait=True to block until the row is committed (and to see a failed commit as an exception).
+    """
+
+    def __init__(self,
+                 path: str = DEFAULT_DB_PATH,
+                 batch_size: int = DEFAULT_BATCH_SIZE,
+                 max_delay: float = DEFAULT_MAX_DELAY,
+                 synchronous: str = "NORMAL",
+                 max_queue: int = DEFAULT_MAX_QUEUE):
+        self.path = path
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self.synchronous = synchronous
+
+        self._queue: "queue.Queue[Optional[Tuple[Optional[Tuple], Optional[_Ack]]]]" = queue.Queue(max_queue)
+        self._local = threading.local()
+        self._closed = False
+        # Held for the closed check + put, and by close(): nothing is queued behind the stop sentinel
+        self._put_lock = threading.Lock()
+        # First commit error since the last flush(); only the writer thread touches it
+        self._unflushed_error: Optional[Exception] = None
+        self.committed = 0
+        self.transactions = 0
+
+        writer_db = self._connect()
+        for statement in SCHEMA:
+            writer_db.execute(statement)
+        self._writer = threading.Thread(target=self._write_loop, args=(writer_db,),
+                                        name="incident-store-writer", daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
+
+    def _connect(self) -> sqlite3.Connection:
+        db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=30)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute(f"PRAGMA synchronous={self.synchronous}")
+        return db
+
+    def _reader(self) -> sqlite3.Connection:
+        """One read connection per thread (WAL readers run alongside the writer)."""
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = self._connect()
+            self._local.db = db
+        return db
+
+    # ---- writes ----
+
+    def add(self,
+            ticket_id: str,
+            description: str,
+            data: Dict[str, Any],
+            created_at: Optional[float] = None,
+            wait: bool = False) -> None:
+        """
+        Queue one incident for the next group commit (wait=True re-raises a failed commit).
+        An existing ticket_id is updated in place; created_at only applies to new rows.
+        """
+        row = (
+            ticket_id,
+            created_at if created_at is not None else time.time(),
+            str(data.get("severity", "NORMAL")).upper(),
+            data.get("summary", ""),
+            description,
+            json.dumps(data),
+        )
+        ack = _Ack() if wait else None
+        self._put((row, ack))
+        if ack is not None:
+            ack.wait()
+
+    def flush(self) -> None:
+        """
+        Block until everything queued so far is committed.
+        Raises the first commit error since the previous flush (those rows were not saved).
+        """
+        ack = _Ack()
+        self._put((None, ack))
+        ack.wait()
+
+    def _put(self, item: Tuple[Optional[Tuple], Optional[_Ack]]) -> None:
+        # A full queue blocks here until the writer catches up; the writer never takes this lock
+        with self._put_lock:
+            if self._closed:
+                raise RuntimeError("IncidentStore is closed")
+            self._queue.put(item)
+
+    def close(self) -> None:
+        """Commit pending rows and stop the writer thread (safe to call twice)."""
+        with self._put_lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(None)
+        self._writer.join()
+
+    def _write_loop(self, db: sqlite3.Connection) -> None:
+        running = True
+        while running:
+            item = self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+            deadline = time.monotonic() + self.max_delay
+            # Group commit: keep collecting until the batch is full or the delay expires
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                try:
+                    item = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    running = False
+                    break
+                batch.append(item)
+
+            rows = [row for row, _ in batch if row is not None]
+            error: Optional[Exception] = None
+            if rows:
+                try:
+                    db.execute("BEGIN IMMEDIATE")
+                    db.executemany(_UPSERT, rows)
+                    db.execute("COMMIT")
+                    self.committed += len(rows)
+                    self.transactions += 1
+                except sqlite3.Error as e:
+                    if db.in_transaction:
+                        db.execute("ROLLBACK")
+                    print(f"[DB] Failed to commit {len(rows)} incidents: {e}")
+                    error = e
+                    if self._unflushed_error is None:
+                        self._unflushed_error = e
+            for row, ack in batch:
+                if ack is None:
+                    continue
+                if row is not None:
+                    ack.error = error
+                else:
+                    ack.error, self._unflushed_error = self._unflushed_error, None
+                ack.done.set()
+        db.close()
+
+    # ---- queries ----
+
+    def get(self, ticket_id: str) -> Optional[Dict[str, Any]]:
+        row = self._reader().execute(
+            f"SELECT {_COLUMNS} FROM incidents WHERE ticket_id = ?", (ticket_id,)
+        ).fetchone()
+        return _row_to_dict(row) if row else None
+
+    def recent(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """Newest incidents first."""
+        rows = self._reader().execute(
+            f"SELECT {_COLUMNS} FROM incidents ORDER BY created_at DESC LIMIT ?", (limit,)
+        ).fetchall()
+        return [_row_to_dict(r) for r in rows]
+
+    def by_severity(self, severity: str, limit: int = 20, since: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Newest incidents of one severity (optionally only after `since`)."""
+        rows = self._reader().execute(
+            f"SELECT {_COLUMNS} FROM incidents WHERE severity = ? AND created_at >= ?"
+            " ORDER BY created_at DESC LIMIT ?",
+            (severity.upper(), since if since is not None else 0.0, limit),
+        ).fetchall()
+        return [_row_to_dict(r) for r in rows]
+
+    def after(self, ticket_id: str, limit: int = 100) -> List[Dict[str, Any]]:
+        """Incidents whose ticket was issued after ticket_id, oldest first (for tailing / paging)."""
+        rows = self._reader().execute(
+            f"SELECT {_COLUMNS} FROM incidents WHERE ticket_id > ? ORDER BY ticket_id LIMIT ?",
+            (ticket_id, limit),
+        ).fetchall()
+        return [_row_to_dict(r) for r in rows]
+
+    def count_between(self, start: float, end: float) -> Dict[str, int]:
+        """Incident counts per severity with start <= created_at < end (plus a TOTAL)."""
+        rows = self._reader().execute(
+            "SELECT severity, COUNT(*) FROM incidents WHERE created_at >= ? AND created_at < ?"
+            " GROUP BY severity",
+            (start, end),
+        ).fetchall()
+        counts = {severity: n for severity, n in rows}
+        counts["TOTAL"] = sum(counts.values())
+        return counts
+
+
+# -------------------------
+# Benchmark
+# -------------------------
+
+def run_benchmark(threads: int, seconds: float, wait: bool, path: Optional[str] = None) -> Dict[str, Any]:
+    """Hammer the store from many writer threads and report sustained inserts/s."""
+    tmpdir = None
+    if path is None:
+        tmpdir = tempfile.mkdtemp(prefix="incident_bench_")
+        path = os.path.join(tmpdir, "bench.sqlite3")
+    store = IncidentStore(path)
+    stop_at = time.monotonic() + seconds
+    sample = {"summary": "Production database outage blocking all applications.",
+              "severity": "CRISIS",
+              "actions": ["Page on-call DB engineer immediately.", "Fail over to backup database."]}
+
+    def writer(n: int) -> None:
+        while time.monotonic() < stop_at:
+            store.add(new_ticket_id(), "Production database is down.", sample, wait=wait)
+
+    started = time.perf_counter()
+    workers = [threading.Thread(target=writer, args=(n,)) for n in range(threads)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    store.flush()
+    elapsed = time.perf_counter() - started
+    store.close()
+
+    result = {
+        "threads": threads,
+        "wait_for_commit": wait,
+        "inserts": store.committed,
+        "transactions": store.transactions,
+        "rows_per_commit": round(store.committed / max(store.transactions, 1), 1),
+        "elapsed_s": round(elapsed, 2),
+        "inserts_per_s": round(store.committed / elapsed),
+    }
+    if tmpdir:
+        for name in os.listdir(tmpdir):
+            os.remove(os.path.join(tmpdir, name))
+        os.rmdir(tmpdir)
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Incident store utilities.")
+    parser.add_argument("--bench", action="store_true", help="Run the multi-writer insert benchmark")
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--db", default=None, help="Database path (benchmark defaults to a temp file)")
+    parser.add_argument("--recent", type=int, default=0, help="Show the N most recent incidents")
+    args = parser.parse_args()
+
+    if args.bench:
+        for wait in (False, True):
+            r = run_benchmark(args.threads, args.seconds, wait, args.db)
+            mode = "durable ack (wait=True)" if wait else "fire-and-forget"
+            print(f"[BENCH] {mode:<24} {r['threads']} threads: {r['inserts_per_s']:>8} inserts/s "
+                  f"({r['inserts']} rows, {r['rows_per_commit']} rows/commit)")
+        return
+
+    store = IncidentStore(args.db or DEFAULT_DB_PATH)
+    for incident in store.recent(args.recent or 10):
+        created = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(incident["created_at"]))
+        print(f"{created}  {incident['ticket_id']}  {incident['severity']:<7} {incident['summary']}")
+
+
+if __name__ == "__main__":
+    main()
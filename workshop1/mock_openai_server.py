@@ -0,0 +1,419 @@
+# Local Mock Azure OpenAI Server (chat completions)
+
+"""
+demo for:
+- Exercising the workshop code paths without burning quota
+- Speaks the chat-completions protocol used by AzureOpenAI / AsyncAzureOpenAI:
+  POST /openai/deployments/{deployment}/chat/completions?api-version=...
+  (plus /v1/chat/completions for plain OpenAI clients)
+- JSON mode (response_format=json_object), tool calls, streaming (SSE, incl. tool-call deltas)
+- Configurable latency distributions, 429s with Retry-After, 5xx error injection
+- x-ratelimit-remaining-requests / -tokens headers from a simple per-minute quota
+
+Run it:
+    python -m workshop1.mock_openai_server --port 8765 --latency lognormal:0.4,0.5 --rate-429 0.02
+
+Point a client at it:
+    AzureOpenAI(api_key="mock", azure_endpoint="http://127.0.0.1:8765", api_version="2024-06-01")
+"""
+
+import argparse
+import json
+import math
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Dict, Any, Optional, Tuple
+from workshop1.fast_triage import KeywordTriage
+
+# -------------------------
+# Configuration
+# -------------------------
+
+DEFAULT_PORT = 8765
+
+CANNED_REPLY = (
+    "Let's work through this step by step. First, confirm the device has power and that "
+    "all cables are firmly connected. Next, restart the device and note any error messages "
+    "or beep codes. If the problem continues, check for recent updates or configuration "
+    "changes, roll them back if possible, and contact the service desk with the details "
+    "you collected so a technician can follow up."
+)
+
+
+class MockConfig:
+    """Behaviour knobs for the mock server (all can be changed while it runs)."""
+
+    def __init__(self,
+                 latency: str = "fixed:0.05",
+                 token_delay: float = 0.005,
+                 rate_429: float = 0.0,
+                 error_rate: float = 0.0,
+                 retry_after: float = 1.0,
+                 rpm_limit: int = 0,
+                 tpm_limit: int = 0,
+                 quota_window: float = 60.0,
+                 tool_calls_per_turn: int = 1,
+                 seed: Optional[int] = None):
+        self.latency = latency                  # fixed:S | uniform:LO,HI | lognormal:MEDIAN,SIGMA | exp:MEAN | straggler:S,P,FACTOR
+        self.token_delay = token_delay          # seconds between streamed chunks
+        self.rate_429 = rate_429                # probability of a random 429
+        self.error_rate = error_rate            # probability of a random 500
+        self.retry_after = retry_after          # Retry-After seconds on 429
+        self.rpm_limit = rpm_limit              # 0 = unlimited
+        self.tpm_limit = tpm_limit              # 0 = unlimited
+        self.quota_window = quota_window        # seconds the rpm/tpm quota applies to (shorter = faster tests)
+        self.tool_calls_per_turn = tool_calls_per_turn
+        self.rng = random.Random(seed)
+
+    def sample_latency(self) -> float:
+        kind, _, params = self.latency.partition(":")
+        values = [float(v) for v in params.split(",") if v]
+        if kind == "fixed":
+            return values[0] if values else 0.0
+        if kind == "uniform":
+            return self.rng.uniform(values[0], values[1])
+        if kind == "lognormal":
+            median, sigma = values[0], (values[1] if len(values) > 1 else 0.5)
+            return self.rng.lognormvariate(math.log(median), sigma)
+        if kind == "exp":
+            return self.rng.expovariate(1.0 / values[0])
+        if kind == "straggler":
+            # Mostly around S, but a fraction P of calls is FACTOR times slower
+            base = self.rng.lognormvariate(math.log(values[0]), 0.2)
+            return base * values[2] if self.rng.random() < values[1] else base
+        raise ValueError(f"Unknown latency distribution: {self.latency}")
+
+
+# -------------------------
+# Reply synthesis
+# -------------------------
+
+_triage = KeywordTriage(min_score=0.5, min_margin=0.0)
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def _last_user_text(messages: List[Dict[str, Any]]) -> str:
+    for m in reversed(messages):
+        if m.get("role") == "user" and isinstance(m.get("content"), str):
+            return m["content"]
+    return ""
+
+
+def _triage_object(text: str) -> Dict[str, Any]:
+    description = text.split("Incident description:", 1)[-1].split("\n\n")[0].strip() or text
+    candidate = _triage.match(description)
+    severity = candidate["severity"] if candidate["scores"][candidate["severity"]] > 0 else "NORMAL"
+    result = _triage.to_result(description, {**candidate, "severity": severity})
+    return {"summary": result["summary"], "severity": severity, "actions": result["actions"]}
+
+
+def _arguments_for_schema(schema: Dict[str, Any], text: str) -> Dict[str, Any]:
+    """Fill a tool's JSON schema with plausible values (triage fields get real-looking ones)."""
+    triage = _triage_object(text)
+    args: Dict[str, Any] = {}
+    for name, prop in schema.get("properties", {}).items():
+        if name in triage and ("enum" not in prop or triage[name] in prop["enum"]):
+            args[name] = triage[name]
+        elif "enum" in prop:
+            args[name] = prop["enum"][0]
+        elif prop.get("type") == "array":
+            args[name] = []
+        elif prop.get("type") in ("integer", "number"):
+            args[name] = 1
+        elif prop.get("type") == "boolean":
+            args[name] = False
+        else:
+            args[name] = triage["summary"]
+    return args
+
+
+def build_reply(body: Dict[str, Any], tool_calls_per_turn: int) -> Tuple[Optional[str], List[Dict[str, Any]], str]:
+    """Return (content, tool_calls, finish_reason) for a chat-completions request body."""
+    messages = body.get("messages", [])
+    text = _last_user_text(messages)
+    tools = body.get("tools") or []
+    tool_choice = body.get("tool_choice", "auto")
+    last_role = messages[-1].get("role") if messages else "user"
+
+    wants_tools = tools and tool_choice != "none" and (last_role != "tool" or isinstance(tool_choice, dict))
+    if wants_tools:
+        if isinstance(tool_choice, dict):
+            forced = tool_choice.get("function", {}).get("name")
+            chosen = [t for t in tools if t.get("function", {}).get("name") == forced][:1]
+        else:
+            chosen = tools[:max(1, tool_calls_per_turn)]
+        calls = []
+        for tool in chosen:
+            fn = tool.get("function", {})
+            calls.append({
+                "id": f"call_{uuid.uuid4().hex[:24]}",
+                "type": "function",
+                "function": {
+                    "name": fn.get("name", ""),
+                    "arguments": json.dumps(_arguments_for_schema(fn.get("parameters", {}), text)),
+                },
+            })
+        return None, calls, "tool_calls"
+
+    if last_role == "tool":
+        return "The incident has been handled and the on-call team has been notified.", [], "stop"
+
+    if (body.get("response_format") or {}).get("type") == "json_object":
+        return json.dumps(_triage_object(text)), [], "stop"
+
+    max_chars = 4 * int(body.get("max_tokens") or body.get("max_completion_tokens") or 200)
+    content = CANNED_REPLY[:max_chars]
+    return content, [], ("length" if len(CANNED_REPLY) > max_chars else "stop")
+
+
+# -------------------------
+# HTTP handler
+# -------------------------
+
+class _Quota:
+    """Fixed window (one minute by default) for x-ratelimit headers and quota 429s."""
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.window_start = time.monotonic()
+        self.requests = 0
+        self.tokens = 0
+
+    def take(self, config: MockConfig, tokens: int) -> Tuple[bool, int, int, float]:
+        with self.lock:
+            now = time.monotonic()
+            if now - self.window_start >= config.quota_window:
+                self.window_start, self.requests, self.tokens = now, 0, 0
+            reset_in = config.quota_window - (now - self.window_start)
+            over = ((config.rpm_limit and self.requests + 1 > config.rpm_limit) or
+                    (config.tpm_limit and self.tokens + tokens > config.tpm_limit))
+            if not over:
+                self.requests += 1
+                self.tokens += tokens
+            remaining_requests = (config.rpm_limit - self.requests) if config.rpm_limit else 1_000_000
+            remaining_tokens = (config.tpm_limit - self.tokens) if config.tpm_limit else 100_000_000
+            return not over, remaining_requests, remaining_tokens, reset_in
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"   # keep-alive, like the real service
+    server: "MockOpenAIServer"
+
+    def log_message(self, *args: Any) -> None:
+        pass
+
+    def _send_json(self, status: int, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None) -> None:
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self) -> None:
+        if self.path.startswith("/stats"):
+            self._send_json(200, self.server.snapshot_stats())
+        else:
+            self._send_json(404, {"error": {"message": "not found"}})
+
+    def do_POST(self) -> None:
+        length = int(self.headers.get("Content-Length", 0))
+        raw = self.rfile.read(length)
+        path = self.path.split("?", 1)[0]
+        match = re.match(r"^/openai/deployments/([^/]+)/chat/completions$", path)
+        if not match and path not in ("/v1/chat/completions", "/chat/completions"):
+            self._send_json(404, {"error": {"code": "404", "message": f"Unknown path {path}"}})
+            return
+        try:
+            body = json.loads(raw or b"{}")
+        except ValueError:
+            self._send_json(400, {"error": {"code": "400", "message": "Invalid JSON body"}})
+            return
+
+        server = self.server
+        config = server.config
+        server.count("requests")
+        prompt_tokens = sum(estimate_tokens(str(m.get("content") or "")) for m in body.get("messages", []))
+        allowed, rem_req, rem_tok, reset_in = server.quota.take(
+            config, prompt_tokens + int(body.get("max_tokens") or 0))
+        limit_headers = {
+            "x-ratelimit-remaining-requests": str(max(rem_req, 0)),
+            "x-ratelimit-remaining-tokens": str(max(rem_tok, 0)),
+        }
+
+        if not allowed or config.rng.random() < config.rate_429:
+            server.count("429")
+            retry_after = config.retry_after if allowed else max(config.retry_after, reset_in)
+            self._send_json(429, {"error": {"code": "429", "message": "Rate limit is exceeded. Try again later."}},
+                            {"Retry-After": str(int(math.ceil(retry_after))),
+                             "retry-after-ms": str(int(retry_after * 1000)), **limit_headers})
+            return
+
+        time.sleep(config.sample_latency())
+
+        if config.rng.random() < config.error_rate:
+            server.count("500")
+            self._send_json(500, {"error": {"code": "500", "message": "Injected server error."}}, limit_headers)
+            return
+
+        content, tool_calls, finish_reason = build_reply(body, config.tool_calls_per_turn)
+        completion_tokens = estimate_tokens(content or json.dumps(tool_calls))
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                 "total_tokens": prompt_tokens + completion_tokens}
+        model = match.group(1) if match else body.get("model", "mock")
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        server.count("completion_tokens", completion_tokens)
+
+        if body.get("stream"):
+            self._stream(completion_id, model, content, tool_calls, finish_reason, usage, body, limit_headers)
+            return
+
+        message: Dict[str, Any] = {"role": "assistant", "content": content}
+        if tool_calls:
+            message["tool_calls"] = tool_calls
+        self._send_json(200, {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}],
+            "usage": usage,
+        }, limit_headers)
+
+    def _stream(self, completion_id: str, model: str, content: Optional[str],
+                tool_calls: List[Dict[str, Any]], finish_reason: str, usage: Dict[str, int],
+                body: Dict[str, Any], headers: Dict[str, str]) -> None:
+        """Server-sent events, chunked like the real service (content in small deltas)."""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        for k, v in headers.items():
+            self.send_header(k, v)
+        self.end_headers()
+        delay = self.server.config.token_delay
+
+        def emit(payload: Any) -> None:
+            data = ("data: " + (payload if isinstance(payload, str) else json.dumps(payload)) + "\n\n").encode()
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+            self.wfile.flush()
+
+        def chunk(delta: Dict[str, Any], finish: Optional[str] = None) -> Dict[str, Any]:
+            return {"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                    "model": model, "choices": [{"index": 0, "delta": delta, "finish_reason": finish}]}
+
+        try:
+            # Azure sends prompt filter results first, with no choices
+            emit({"id": "", "object": "", "created": 0, "model": "", "choices": [],
+                  "prompt_filter_results": [{"prompt_index": 0, "content_filter_results": {}}]})
+            emit(chunk({"role": "assistant", "content": "" if content is not None else None}))
+            if content:
+                for i in range(0, len(content), 4):
+                    emit(chunk({"content": content[i:i + 4]}))
+                    if delay:
+                        time.sleep(delay)
+            for index, call in enumerate(tool_calls):
+                emit(chunk({"tool_calls": [{"index": index, "id": call["id"], "type": "function",
+                                            "function": {"name": call["function"]["name"], "arguments": ""}}]}))
+                args = call["function"]["arguments"]
+                for i in range(0, len(args), 8):
+                    emit(chunk({"tool_calls": [{"index": index, "function": {"arguments": args[i:i + 8]}}]}))
+                    if delay:
+                        time.sleep(delay)
+            emit(chunk({}, finish_reason))
+            if (body.get("stream_options") or {}).get("include_usage"):
+                emit({"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                      "model": model, "choices": [], "usage": usage})
+            emit("[DONE]")
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            self.server.count("client_disconnects")
+            self.close_connection = True
+
+
+class MockOpenAIServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # socketserver's default backlog of 5 drops bursts of new connections (1 s SYN retry)
+    request_queue_size = 1024
+
+    def __init__(self, port: int = DEFAULT_PORT, config: Optional[MockConfig] = None):
+        super().__init__(("127.0.0.1", port), MockHandler)
+        self.config = config or MockConfig()
+        self.quota = _Quota()
+        self._stats: Dict[str, int] = {}
+        self._stats_lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        """azure_endpoint for AzureOpenAI clients."""
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def handle_error(self, request: Any, client_address: Any) -> None:
+        # Clients dropping idle keep-alive connections is normal, not an error
+        if isinstance(sys.exc_info()[1], (ConnectionResetError, BrokenPipeError)):
+            return
+        super().handle_error(request, client_address)
+
+    def count(self, key: str, n: int = 1) -> None:
+        with self._stats_lock:
+            self._stats[key] = self._stats.get(key, 0) + n
+
+    def snapshot_stats(self) -> Dict[str, int]:
+        with self._stats_lock:
+            return dict(self._stats)
+
+
+def start_mock_server(port: int = 0, **config: Any) -> MockOpenAIServer:
+    """Start a mock server on a background thread (port=0 picks a free port)."""
+    server = MockOpenAIServer(port, MockConfig(**config))
+    threading.Thread(target=server.serve_forever, name=f"mock-openai-{server.server_address[1]}",
+                     daemon=True).start()
+    return server
+
+
+def mock_credentials(server: MockOpenAIServer, api_version: str = "2024-06-01") -> Dict[str, str]:
+    """Keyword arguments for AzureOpenAI(...) that point at the mock server."""
+    return {"api_key": "mock-key", "azure_endpoint": server.url, "api_version": api_version}
+
+
+# -------------------------
+# Main entry point
+# -------------------------
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Local mock Azure OpenAI chat-completions server.")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--latency", default="fixed:0.05",
+                        help="fixed:S | uniform:LO,HI | lognormal:MEDIAN,SIGMA | exp:MEAN | straggler:S,P,FACTOR (seconds)")
+    parser.add_argument("--token-delay", type=float, default=0.005)
+    parser.add_argument("--rate-429", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=float, default=1.0)
+    parser.add_argument("--rpm", type=int, default=0, help="Requests-per-minute quota (0 = unlimited)")
+    parser.add_argument("--tpm", type=int, default=0, help="Tokens-per-minute quota (0 = unlimited)")
+    parser.add_argument("--tool-calls", type=int, default=1, help="Tool calls returned per assistant turn")
+    args = parser.parse_args()
+
+    server = MockOpenAIServer(args.port, MockConfig(
+        latency=args.latency, token_delay=args.token_delay, rate_429=args.rate_429,
+        error_rate=args.error_rate, retry_after=args.retry_after, rpm_limit=args.rpm,
+        tpm_limit=args.tpm, tool_calls_per_turn=args.tool_calls))
+    print(f"[MOCK] Azure OpenAI mock listening on {server.url} (Ctrl-C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n[MOCK] Stopped.")
+    print(f"[MOCK] Stats: {server.snapshot_stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,302 @@
+# Two-Tier Response Cache for Chat Completions
+
+"""
+demo for:
+- Canonical cache keys: hash of (deployment, messages, temperature, max_tokens, response_format, tools)
+- Tier 1: in-memory LRU (microsecond hits for repeat inputs)
+- Tier 2: on-disk SQLite (survives restarts, shared by processes on one machine)
+- TTLs, size-based eviction, hit/miss counters and a bypass flag
+- Async path: memory hits are served inline; SQLite reads/writes run in a worker thread
+  (asyncio.to_thread) so disk I/O never blocks the event loop
+
+Typical use:
+    cache = ResponseCache()
+    content = cache.get_or_create(client, model=DEPLOYMENT_NAME, messages=messages, temperature=0.1)
+"""
+
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Dict, Any, Callable, Optional, Tuple
+
+# -------------------------
+# Configuration
+# -------------------------
+
+DEFAULT_CACHE_PATH = ".llm_response_cache.sqlite3"
+DEFAULT_TTL_SECONDS = 24 * 3600
+DEFAULT_MAX_MEMORY_ENTRIES = 1024
+DEFAULT_MAX_DISK_BYTES = 256 * 1024 * 1024
+
+# Only these request fields decide whether two calls are "the same"
+KEY_FIELDS = ("model", "messages", "temperature", "max_tokens", "response_format", "tools")
+
+
+# -------------------------
+# Cache key
+# -------------------------
+
+def make_cache_key(**request: Any) -> str:
+    """
+    Hash the request fields that affect the completion.
+    sort_keys + compact separators make the JSON canonical, so dict ordering
+    and whitespace never produce two keys for the same request.
+    """
+    payload = {field: request.get(field) for field in KEY_FIELDS}
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+# -------------------------
+# Cache
+# -------------------------
+
+class ResponseCache:
+    """In-memory LRU in front of a SQLite table; both tiers honour the same TTL."""
+
+    def __init__(self,
+                 path: Optional[str] = DEFAULT_CACHE_PATH,
+                 ttl_seconds: float = DEFAULT_TTL_SECONDS,
+                 max_memory_entries: int = DEFAULT_MAX_MEMORY_ENTRIES,
+                 max_disk_bytes: int = DEFAULT_MAX_DISK_BYTES,
+                 enabled: bool = True):
+        self.ttl_seconds = ttl_seconds
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_bytes = max_disk_bytes
+        self.enabled = enabled
+
+        # key -> (expires_at, value); most recently used at the end
+        self._memory: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        # _lock guards the memory tier and counters, _db_lock the SQLite tier. They are never
+        # held together, so a memory lookup never waits behind disk I/O.
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "writes": 0,
+                          "bypassed": 0, "evictions": 0}
+
+        self._db: Optional[sqlite3.Connection] = None
+        self._disk_bytes = 0
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " key TEXT PRIMARY KEY,"
+                " value TEXT NOT NULL,"
+                " size INTEGER NOT NULL,"
+                " expires_at REAL NOT NULL,"
+                " last_access REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS idx_responses_last_access ON responses(last_access)")
+            self._disk_bytes = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    # ---- lookups ----
+
+    def get(self, key: str) -> Optional[str]:
+        """Return a cached value or None (memory first, then disk)."""
+        value = self._get_memory(key)
+        if value is None and self._db is not None:
+            value = self._get_disk(key)
+        if value is None:
+            self._count("misses")
+        return value
+
+    def set(self, key: str, value: str, ttl_seconds: Optional[float] = None) -> None:
+        """Store a value in both tiers."""
+        expires_at = self._set_memory(key, value, ttl_seconds)
+        if self._db is not None:
+            self._set_disk(key, value, expires_at)
+
+    def invalidate(self, key: str) -> None:
+        """Drop one key from both tiers (e.g. after the caller rejects the value)."""
+        with self._lock:
+            self._memory.pop(key, None)
+        if self._db is not None:
+            with self._db_lock:
+                self._delete_disk(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+        if self._db is not None:
+            with self._db_lock:
+                self._db.execute("DELETE FROM responses")
+                self._disk_bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters plus current tier sizes."""
+        with self._lock:
+            stats: Dict[str, Any] = dict(self._counters)
+            stats["memory_entries"] = len(self._memory)
+            stats["disk_bytes"] = self._disk_bytes
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = round((stats["memory_hits"] + stats["disk_hits"]) / lookups, 3) if lookups else 0.0
+        return stats
+
+    # ---- chat completion helpers ----
+
+    def get_or_create(self,
+                      client: Any,
+                      bypass: bool = False,
+                      cacheable: Optional[Callable[[str], bool]] = None,
+                      on_response: Optional[Callable[[Any], None]] = None,
+                      **request: Any) -> str:
+        """
+        Return the assistant message content for this request, calling
+        client.chat.completions.create only on a cache miss.
+        cacheable(content) can reject replies that should not be stored (e.g. invalid JSON).
+        on_response(response) sees every real API response (e.g. to record token usage).
+        """
+        if bypass or not self.enabled:
+            with self._lock:
+                self._counters["bypassed"] += 1
+            response = client.chat.completions.create(**request)
+            if on_response is not None:
+                on_response(response)
+            return response.choices[0].message.content
+
+        key = make_cache_key(**request)
+        content = self.get(key)
+        if content is not None:
+            return content
+
+        response = client.chat.completions.create(**request)
+        if on_response is not None:
+            on_response(response)
+        content = response.choices[0].message.content
+        if content is not None and (cacheable is None or cacheable(content)):
+            self.set(key, content)
+        return content
+
+    async def aget_or_create(self,
+                             client: Any,
+                             bypass: bool = False,
+                             cacheable: Optional[Callable[[str], bool]] = None,
+                             on_response: Optional[Callable[[Any], None]] = None,
+                             **request: Any) -> str:
+        """Async twin of get_or_create for AsyncAzureOpenAI clients."""
+        if bypass or not self.enabled:
+            with self._lock:
+                self._counters["bypassed"] += 1
+            response = await client.chat.completions.create(**request)
+            if on_response is not None:
+                on_response(response)
+            return response.choices[0].message.content
+
+        key = make_cache_key(**request)
+        content = self._get_memory(key)
+        if content is None and self._db is not None:
+            content = await asyncio.to_thread(self._get_disk, key)
+        if content is not None:
+            return content
+        self._count("misses")
+
+        response = await client.chat.completions.create(**request)
+        if on_response is not None:
+            on_response(response)
+        content = response.choices[0].message.content
+        if content is not None and (cacheable is None or cacheable(content)):
+            expires_at = self._set_memory(key, content)
+            if self._db is not None:
+                await asyncio.to_thread(self._set_disk, key, content, expires_at)
+        return content
+
+    # ---- tiers ----
+
+    def _count(self, counter: str, n: int = 1) -> None:
+        with self._lock:
+            self._counters[counter] += n
+
+    def _get_memory(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                return None
+            if entry[0] > now:
+                self._memory.move_to_end(key)
+                self._counters["memory_hits"] += 1
+                return entry[1]
+            del self._memory[key]
+            return None
+
+    def _get_disk(self, key: str) -> Optional[str]:
+        """SQLite lookup; a hit is promoted to the memory tier."""
+        now = time.time()
+        with self._db_lock:
+            row = self._db.execute(
+                "SELECT value, expires_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, expires_at = row
+            if expires_at <= now:
+                self._delete_disk(key)
+                return None
+            self._db.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+        with self._lock:
+            self._remember(key, expires_at, value)
+            self._counters["disk_hits"] += 1
+        return value
+
+    def _set_memory(self, key: str, value: str, ttl_seconds: Optional[float] = None) -> float:
+        """Store in the memory tier; returns the expiry time to use for the disk tier."""
+        expires_at = time.time() + (self.ttl_seconds if ttl_seconds is None else ttl_seconds)
+        with self._lock:
+            self._remember(key, expires_at, value)
+            self._counters["writes"] += 1
+        return expires_at
+
+    def _set_disk(self, key: str, value: str, expires_at: float) -> None:
+        now = time.time()
+        size = len(value.encode("utf-8"))
+        evicted = 0
+        with self._db_lock:
+            old = self._db.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (key, value, size, expires_at, last_access)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (key, value, size, expires_at, now),
+            )
+            self._disk_bytes += size - (old[0] if old else 0)
+            if self._disk_bytes > self.max_disk_bytes:
+                evicted = self._evict_disk(now)
+        if evicted:
+            self._count("evictions", evicted)
+
+    # ---- internals (caller holds self._lock for the memory tier, self._db_lock for disk) ----
+
+    def _remember(self, key: str, expires_at: float, value: str) -> None:
+        self._memory[key] = (expires_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+            self._counters["evictions"] += 1
+
+    def _delete_disk(self, key: str) -> None:
+        row = self._db.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+        if row:
+            self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self._disk_bytes -= row[0]
+
+    def _evict_disk(self, now: float) -> int:
+        """Drop expired rows, then least-recently-used rows until under ~90% of the byte budget."""
+        self._db.execute("DELETE FROM responses WHERE expires_at <= ?", (now,))
+        self._disk_bytes = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        target = int(self.max_disk_bytes * 0.9)
+        evicted = 0
+        while self._disk_bytes > target:
+            rows: List[Tuple[str, int]] = self._db.execute(
+                "SELECT key, size FROM responses ORDER BY last_access LIMIT 256"
+            ).fetchall()
+            if not rows:
+                break
+            self._db.executemany("DELETE FROM responses WHERE key = ?", [(k,) for k, _ in rows])
+            self._disk_bytes -= sum(size for _, size in rows)
+            evicted += len(rows)
+        return evicted
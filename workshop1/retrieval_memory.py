@@ -0,0 +1,301 @@
+# Retrieval Memory for Long Chat Sessions (NumPy hashing vectorizer)
+
+"""
+demo for:
+- Summaries lose specifics ("which KB update?", "what was the error code?"); retrieval keeps
+  every earlier exchange searchable and injects only the top-k relevant ones
+- Local embeddings: a signed hashing vectorizer over word unigrams + bigrams, L2-normalized,
+  with IDF weighting applied to the query. No model, no external service
+- Vectorized search: vectors are stored feature-major (one row per hash bucket), so a query
+  with ~40 non-zero features reads just those 40 rows and scores every turn in one
+  matrix-vector product. Cost follows the query's size, not the vector width
+- Prompt-token accounting: tokens actually sent vs what resending the full history would cost
+
+    retrieval = RetrievalMemory()
+    retrieval.add(user_text, assistant_text)                  # after every completed exchange
+    context = retrieval.context_for(user_input, limit=memory.summarized // 2)
+    messages = memory.messages(context)                       # system, summary, retrieved, recent
+    retrieval.record_request(messages)
+
+Needs numpy (pip install numpy).
+
+Benchmark (synthetic session with facts planted among thousands of turns):
+    python -m workshop1.retrieval_memory --bench --turns 5000
+"""
+
+import argparse
+import random
+import re
+import time
+import zlib
+from typing import List, Dict, Any, Iterable, Optional, Tuple
+import numpy as np
+from workshop1.chat_memory import ConversationMemory, count_tokens, message_tokens
+
+# -------------------------
+# Configuration
+# -------------------------
+
+N_FEATURES = 2 ** 11              # hash buckets; 8 KB of float32 per stored exchange
+INITIAL_CAPACITY = 256            # exchanges; the matrix doubles when full
+TOP_K = 3                         # earlier exchanges injected per request
+MIN_SCORE = 0.05                  # unrelated questions scored < 0.045 in the benchmark session
+RETRIEVAL_MAX_TOKENS = 600        # cap on the injected block
+RETRIEVED_CHARS = 500             # each retrieved message is clipped to this many characters
+
+# Each feature is hashed into two buckets: a rare term (a KB number, an error code) only loses
+# its weight if *both* of its buckets collide with common words
+HASH_SEEDS = (0, 0x9E3779B9)
+
+ASSISTANT_WEIGHT = 0.5            # reply vs question weight in an exchange's vector
+
+RETRIEVAL_PREFIX = "Relevant earlier turns from this conversation:\n"
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+# -------------------------
+# Vectorizer
+# -------------------------
+
+def features(text: str) -> List[str]:
+    words = _TOKEN_RE.findall(text.lower())
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+def hash_features(text: str, n_features: int = N_FEATURES) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Sparse hashed vector as (bucket indices, values): sublinear term frequency, a sign bit
+    from the hash so collisions cancel out on average instead of piling up, L2-normalized.
+    """
+    counts: Dict[int, float] = {}
+    for feature in features(text):
+        data = feature.encode("utf-8")
+        for seed in HASH_SEEDS:
+            h = zlib.crc32(data, seed)
+            bucket = h & (n_features - 1)
+            counts[bucket] = counts.get(bucket, 0.0) + (1.0 if h & 0x80000000 else -1.0)
+    if not counts:
+        return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.float32)
+    index = np.fromiter(counts.keys(), dtype=np.intp, count=len(counts))
+    raw = np.fromiter(counts.values(), dtype=np.float32, count=len(counts))
+    values = np.sign(raw) * (1.0 + np.log(np.maximum(np.abs(raw), 1.0)))
+    norm = float(np.linalg.norm(values))
+    if norm == 0.0:
+        return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.float32)
+    return index, (values / norm).astype(np.float32)
+
+
+# -------------------------
+# Memory
+# -------------------------
+
+class RetrievalMemory:
+    """
+    Stores every completed exchange (user + assistant) of one session.
+    self._matrix is (N_FEATURES, capacity): column t is exchange t's unit vector.
+    """
+
+    def __init__(self,
+                 top_k: int = TOP_K,
+                 min_score: float = MIN_SCORE,
+                 max_tokens: int = RETRIEVAL_MAX_TOKENS,
+                 n_features: int = N_FEATURES):
+        if n_features & (n_features - 1):
+            raise ValueError("n_features must be a power of two")
+        self.top_k = top_k
+        self.min_score = min_score
+        self.max_tokens = max_tokens
+        self.n_features = n_features
+        self._matrix = np.zeros((n_features, INITIAL_CAPACITY), dtype=np.float32)
+        self._doc_freq = np.zeros(n_features, dtype=np.float32)
+        self._turns: List[Tuple[str, str]] = []
+        self.history_tokens = 0          # tokens of every stored message (full-history cost)
+        self._counters = {"searches": 0, "injected": 0, "search_s": 0.0,
+                          "prompt_tokens_sent": 0, "full_history_tokens": 0}
+
+    def __len__(self) -> int:
+        return len(self._turns)
+
+    def add(self, user_text: str, assistant_text: str) -> int:
+        """Index one exchange; returns its turn number."""
+        turn = len(self._turns)
+        if turn == self._matrix.shape[1]:
+            grown = np.zeros((self.n_features, turn * 2), dtype=np.float32)
+            grown[:, :turn] = self._matrix
+            self._matrix = grown
+        # User and reply are normalized separately, then mixed: a long generic reply must not
+        # drown the few specific words of the question (or the other way round)
+        column = np.zeros(self.n_features, dtype=np.float32)
+        index, values = hash_features(user_text, self.n_features)
+        column[index] += values
+        index, values = hash_features(assistant_text, self.n_features)
+        column[index] += ASSISTANT_WEIGHT * values
+        norm = float(np.linalg.norm(column))
+        if norm > 0.0:
+            self._matrix[:, turn] = column / norm
+        self._doc_freq[np.flatnonzero(column)] += 1.0
+        self._turns.append((user_text, assistant_text))
+        self.history_tokens += (message_tokens({"content": user_text}) +
+                                message_tokens({"content": assistant_text}))
+        return turn
+
+    def add_messages(self, messages: Iterable[Dict[str, Any]]) -> None:
+        """Index a saved session (e.g. on resume): each user message with the reply after it."""
+        user_text = None
+        for m in messages:
+            if m["role"] == "user":
+                user_text = m["content"]
+            elif m["role"] == "assistant" and user_text is not None:
+                self.add(user_text, m["content"])
+                user_text = None
+
+    def search(self, query: str, k: Optional[int] = None, limit: Optional[int] = None) -> List[Tuple[int, float]]:
+        """
+        Top-k (turn, score) among the first `limit` exchanges (default: all), best first.
+        Only the query's non-zero rows are read: q[idx] @ M[idx, :limit].
+        """
+        k = self.top_k if k is None else k
+        limit = len(self._turns) if limit is None else min(limit, len(self._turns))
+        if k <= 0 or limit <= 0:
+            return []
+        started = time.perf_counter()
+        index, values = hash_features(query, self.n_features)
+        if not len(index):
+            return []
+        # IDF on the query side: words every turn shares ("my", "the", "laptop") count for little.
+        # Squared, because stored vectors carry no IDF (it changes as turns arrive): same ranking
+        # weight as tf-idf on both sides
+        idf = np.log((len(self._turns) + 1.0) / (self._doc_freq[index] + 1.0)) + 1.0
+        weights = values * idf * idf
+        weights /= np.linalg.norm(weights)
+        scores = weights @ self._matrix[index, :limit]
+        if limit > k:
+            top = np.argpartition(scores, -k)[-k:]
+        else:
+            top = np.arange(limit)
+        top = top[np.argsort(scores[top])[::-1]]
+        self._counters["searches"] += 1
+        self._counters["search_s"] += time.perf_counter() - started
+        return [(int(t), float(scores[t])) for t in top if scores[t] >= self.min_score]
+
+    def context_for(self, query: str, limit: Optional[int] = None) -> Optional[str]:
+        """The retrieved exchanges as one block (oldest first), within max_tokens; None if nothing matches."""
+        lines: List[str] = []
+        used = count_tokens(RETRIEVAL_PREFIX)
+        for turn, _ in sorted(self.search(query, limit=limit)):
+            user_text, assistant_text = self._turns[turn]
+            block = (f"[turn {turn + 1}] user: {_clip(user_text)}\n"
+                     f"[turn {turn + 1}] assistant: {_clip(assistant_text)}")
+            tokens = count_tokens(block)
+            if used + tokens > self.max_tokens:
+                break
+            lines.append(block)
+            used += tokens
+        if not lines:
+            return None
+        self._counters["injected"] += len(lines)
+        return RETRIEVAL_PREFIX + "\n".join(lines)
+
+    def record_request(self, messages: List[Dict[str, Any]]) -> None:
+        """Count what this request sends vs system prompt + every stored turn + the new question."""
+        self._counters["prompt_tokens_sent"] += sum(message_tokens(m) for m in messages)
+        self._counters["full_history_tokens"] += (self.history_tokens + message_tokens(messages[0]) +
+                                                  message_tokens(messages[-1]))
+
+    def stats(self) -> Dict[str, Any]:
+        c = self._counters
+        full = c["full_history_tokens"]
+        return {
+            "turns": len(self._turns),
+            "searches": c["searches"],
+            "injected": c["injected"],
+            "avg_search_us": round(c["search_s"] / c["searches"] * 1e6, 1) if c["searches"] else None,
+            "prompt_tokens_sent": c["prompt_tokens_sent"],
+            "full_history_tokens": full,
+            "token_savings": round(1 - c["prompt_tokens_sent"] / full, 3) if full else None,
+            "matrix_mb": round(self._matrix.nbytes / 1e6, 1),
+        }
+
+
+def _clip(text: str) -> str:
+    text = " ".join(text.split())
+    return text if len(text) <= RETRIEVED_CHARS else text[:RETRIEVED_CHARS - 3] + "..."
+
+
+# -------------------------
+# Benchmark
+# -------------------------
+
+_FILLER = [
+    "The laptop is still slow when I open several browser tabs at once.",
+    "I restarted as you suggested but the issue comes back after lunch.",
+    "Teams calls drop the audio for a few seconds every now and then.",
+    "The shared drive mapping disappears after I reconnect to the dock.",
+    "My password prompt keeps appearing in Outlook even after I type it.",
+    "The second monitor flickers when the laptop wakes from sleep.",
+]
+_REPLY = ("Let's check the basics first: confirm the device is up to date, restart it, "
+          "and tell me if the problem happens again and what exactly you see.")
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def run_benchmark(turns: int, queries: int, seed: int = 7) -> None:
+    rng = random.Random(seed)
+    system = {"role": "system", "content": "You are an IT support specialist."}
+    retrieval = RetrievalMemory()
+    memory = ConversationMemory(system["content"])
+    planted: List[Tuple[int, str, str]] = []   # (turn, error code, question)
+    for t in range(turns):
+        if t % max(1, turns // queries) == 0 and len(planted) < queries:
+            code = f"0x{rng.getrandbits(32):08X}"
+            kb = f"KB{rng.randrange(5000000, 5099999)}"
+            user_text = f"After installing update {kb} the installer failed with error {code}."
+            planted.append((t, code, f"What was the error code from the {kb} update again?"))
+        else:
+            user_text = rng.choice(_FILLER)
+        memory.add("user", user_text)
+        memory.add("assistant", _REPLY)
+        retrieval.add(user_text, _REPLY)
+
+    latencies, hits = [], 0
+    for turn, _, question in planted:
+        started = time.perf_counter()
+        results = retrieval.search(question, limit=memory.summarized // 2)
+        latencies.append(time.perf_counter() - started)
+        hits += turn in [t for t, _ in results]
+    print(f"[BENCH] {turns} stored turns, matrix {retrieval.stats()['matrix_mb']} MB")
+    print(f"[BENCH] search: p50 {_percentile(latencies, 50) * 1e6:.0f} us, "
+          f"p99 {_percentile(latencies, 99) * 1e6:.0f} us, max {max(latencies) * 1e6:.0f} us")
+    print(f"[BENCH] recall@{TOP_K}: {hits}/{len(planted)} planted facts found "
+          f"(the running summary still holds {sum(code in memory.summary for _, code, _ in planted)})")
+
+    # One request at the end of the session, with and without the memory layers
+    question = planted[len(planted) // 2][2]
+    memory.add("user", question)
+    messages = memory.messages(retrieval.context_for(question, limit=memory.summarized // 2))
+    retrieval.record_request(messages)
+    stats = retrieval.stats()
+    print(f"[BENCH] prompt tokens for one request: full history {stats['full_history_tokens']}, "
+          f"summary + retrieved + recent {stats['prompt_tokens_sent']} "
+          f"({stats['token_savings']:.1%} fewer)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Retrieval memory benchmark (no network).")
+    parser.add_argument("--bench", action="store_true")
+    parser.add_argument("--turns", type=int, default=5000)
+    parser.add_argument("--queries", type=int, default=50, help="facts planted and asked about")
+    args = parser.parse_args()
+    if not args.bench:
+        parser.print_help()
+        return
+    run_benchmark(args.turns, args.queries)
+
+
+if __name__ == "__main__":
+    main()
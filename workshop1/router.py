@@ -0,0 +1,435 @@
+# Multi-Deployment Router (latency-weighted, with failover)
+
+"""
+demo for:
+- One logical "deployment" backed by a pool of (endpoint, deployment, weight) targets,
+  e.g. the same model in several Azure regions
+- Power of two choices: sample two targets (by weight), send to the one with the better
+  score = EWMA latency x (1 + in flight) x (1 + error penalty) / weight
+- Transparent failover: a 429, 5xx or connection error is retried on another target
+- Outlier ejection: 3 consecutive failures eject a target (5 s, doubling up to 60 s);
+  a 429 takes it out for its Retry-After. When the ejection ends, one real request
+  probes it; success brings it back, failure ejects it again
+- snapshot() per target: requests, failures, 429s, ejections, EWMA latency, state
+
+    client = routed(load_pool())      # same .chat.completions.create API; `model` is ignored
+    client.router.snapshot()
+
+Pool config (JSON list, from a file path or inline JSON in WORKSHOP_DEPLOYMENTS):
+    [{"endpoint": "https://eastus.example.openai.azure.com", "deployment": "gpt-4o-mini", "weight": 2},
+     {"endpoint": "https://westeu.example.openai.azure.com", "deployment": "gpt-4o-mini", "api_key": "..."}]
+Missing api_key / api_version come from common.bc_config; with no pool configured,
+the single bc_config deployment is used.
+
+The router does its own 429 handling (SDK retries off), so routed clients are not
+wrapped in governed(): a quota 429 on one region moves traffic to the others.
+
+Demo (three local mock servers; one fails mid-run, then recovers):
+    python -m workshop1.router --demo
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+from typing import List, Dict, Any, Optional, Tuple
+from types import SimpleNamespace
+from openai import (
+    APIConnectionError, AsyncAzureOpenAI, AzureOpenAI, InternalServerError, RateLimitError,
+)
+from workshop1.governor import retry_after_seconds
+
+# -------------------------
+# Configuration
+# -------------------------
+
+POOL_ENV = "WORKSHOP_DEPLOYMENTS"     # file path or inline JSON list
+DEFAULT_API_VERSION = "2024-06-01"
+
+EWMA_ALPHA = 0.3                      # weight of the newest sample
+ERROR_PENALTY = 10.0                  # score multiplier per unit of EWMA error rate
+EJECT_AFTER_FAILURES = 3              # consecutive failures before a target is ejected
+EJECT_BASE_SECONDS = 5.0
+EJECT_MAX_SECONDS = 60.0
+MAX_WAIT_SECONDS = 30.0               # longest a call waits when every target is ejected
+RETRYABLE_ERRORS = (RateLimitError, InternalServerError, APIConnectionError)
+
+
+# -------------------------
+# Targets
+# -------------------------
+
+class Target:
+    """One deployment in the pool, with its health and latency statistics."""
+
+    def __init__(self,
+                 endpoint: str,
+                 deployment: str,
+                 weight: float = 1.0,
+                 api_key: Optional[str] = None,
+                 api_version: str = DEFAULT_API_VERSION,
+                 name: Optional[str] = None):
+        self.endpoint = endpoint
+        self.deployment = deployment
+        self.weight = max(float(weight), 0.001)
+        self.api_key = api_key
+        self.api_version = api_version
+        self.name = name or f"{endpoint.split('//')[-1].split('/')[0]}/{deployment}"
+
+        self.ewma_latency: Optional[float] = None     # None until the first success: try it early
+        self.ewma_error = 0.0
+        self.in_flight = 0
+        self.consecutive_failures = 0
+        self.ejections = 0
+        self.ejected_until = 0.0
+        self.probing = False
+        self.stats = {"requests": 0, "failures": 0, "429": 0}
+        self._client: Optional[AzureOpenAI] = None
+        self._async_client: Optional[AsyncAzureOpenAI] = None
+
+    # The SDK's retries are off: a failed attempt is retried on another target instead
+    @property
+    def client(self) -> AzureOpenAI:
+        if self._client is None:
+            self._client = AzureOpenAI(api_key=self.api_key, azure_endpoint=self.endpoint,
+                                       api_version=self.api_version, max_retries=0)
+        return self._client
+
+    @property
+    def async_client(self) -> AsyncAzureOpenAI:
+        if self._async_client is None:
+            self._async_client = AsyncAzureOpenAI(api_key=self.api_key, azure_endpoint=self.endpoint,
+                                                  api_version=self.api_version, max_retries=0)
+        return self._async_client
+
+    def score(self) -> float:
+        """Lower is better."""
+        latency = self.ewma_latency if self.ewma_latency is not None else 0.0
+        return latency * (1 + self.in_flight) * (1 + ERROR_PENALTY * self.ewma_error) / self.weight
+
+    def state(self, now: float) -> str:
+        if self.probing:
+            return "probing"
+        return "ejected" if self.ejected_until > now else "healthy"
+
+
+def load_pool(source: Optional[str] = None) -> List[Target]:
+    """
+    Targets from a JSON file path or inline JSON (default: $WORKSHOP_DEPLOYMENTS).
+    Without either, the single deployment from common.bc_config.
+    """
+    from common.bc_config import get_api_credentials, get_model_deployment_name
+
+    credentials = get_api_credentials()
+    source = source if source is not None else os.environ.get(POOL_ENV, "")
+    if not source.strip():
+        return [Target(credentials["azure_endpoint"], get_model_deployment_name(),
+                       api_key=credentials.get("api_key"),
+                       api_version=credentials.get("api_version", DEFAULT_API_VERSION))]
+    if not source.lstrip().startswith("["):
+        with open(source, "r", encoding="utf-8") as f:
+            source = f.read()
+    return [Target(entry["endpoint"], entry["deployment"],
+                   weight=entry.get("weight", 1.0),
+                   api_key=entry.get("api_key") or credentials.get("api_key"),
+                   api_version=entry.get("api_version") or credentials.get("api_version", DEFAULT_API_VERSION),
+                   name=entry.get("name"))
+            for entry in json.loads(source)]
+
+
+# -------------------------
+# Router
+# -------------------------
+
+class Router:
+    """
+    Picks a target per request and records how it went. pick/report never block,
+    so threads and event loops share the same state (like the governor).
+    """
+
+    def __init__(self, targets: List[Target], max_attempts: Optional[int] = None, seed: Optional[int] = None):
+        if not targets:
+            raise ValueError("Router needs at least one target")
+        self.targets = targets
+        self.max_attempts = max_attempts or max(3, len(targets) + 1)
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "failovers": 0, "failed": 0, "waited_s": 0.0}
+
+    # ---- choosing ----
+
+    def _pick(self, tried: List[Target]) -> Tuple[Optional[Target], float]:
+        """(target, 0) to send now, or (None, seconds) until the first ejected target is due."""
+        now = time.monotonic()
+        with self._lock:
+            available = [t for t in self.targets if not t.probing and t.ejected_until <= now]
+            fresh = [t for t in available if t not in tried] or available
+            if not fresh:
+                waiting = [t.ejected_until for t in self.targets if not t.probing]
+                due = min(waiting) if waiting else now + 0.05     # every target is mid-probe
+                return None, max(0.01, due - now)
+
+            # An ejected target whose time is up gets exactly one probe request
+            for target in fresh:
+                if target.ejections and target.consecutive_failures >= EJECT_AFTER_FAILURES:
+                    target.probing = True
+                    target.in_flight += 1
+                    return target, 0.0
+
+            if len(fresh) == 1:
+                target = fresh[0]
+            else:
+                first, second = self._two_choices(fresh)
+                target = first if first.score() <= second.score() else second
+            target.in_flight += 1
+            return target, 0.0
+
+    def _two_choices(self, candidates: List[Target]) -> Tuple[Target, Target]:
+        weights = [t.weight for t in candidates]
+        first = self._rng.choices(candidates, weights)[0]
+        rest = [t for t in candidates if t is not first]
+        return first, self._rng.choices(rest, [t.weight for t in rest])[0]
+
+    # ---- reporting ----
+
+    def _report(self, target: Target, seconds: float, error: Optional[BaseException]) -> None:
+        now = time.monotonic()
+        with self._lock:
+            target.in_flight -= 1
+            target.stats["requests"] += 1
+            was_probe, target.probing = target.probing, False
+            if error is not None and not isinstance(error, RETRYABLE_ERRORS):
+                # A 4xx other than 429 (or a cancelled call) says nothing about the target
+                return
+            if error is None:
+                target.ewma_error *= 1 - EWMA_ALPHA
+                target.ewma_latency = seconds if target.ewma_latency is None else (
+                    EWMA_ALPHA * seconds + (1 - EWMA_ALPHA) * target.ewma_latency)
+                target.consecutive_failures = 0
+                if was_probe:
+                    print(f"[ROUTER] {target.name} passed its probe, back in the pool.")
+                return
+
+            target.stats["failures"] += 1
+            target.ewma_error = EWMA_ALPHA + (1 - EWMA_ALPHA) * target.ewma_error
+            if isinstance(error, RateLimitError):
+                # Out of quota, not unhealthy: sit out the Retry-After only
+                target.stats["429"] += 1
+                retry_after = retry_after_seconds(error.response.headers)
+                target.ejected_until = max(target.ejected_until, now + retry_after)
+                return
+            target.consecutive_failures += 1
+            if was_probe or target.consecutive_failures == EJECT_AFTER_FAILURES:
+                target.ejections += 1
+                seconds_out = min(EJECT_MAX_SECONDS, EJECT_BASE_SECONDS * 2 ** (target.ejections - 1))
+                target.ejected_until = now + seconds_out
+                print(f"[ROUTER] Ejecting {target.name} for {seconds_out:g}s "
+                      f"({type(error).__name__}, {target.consecutive_failures} failures in a row).")
+
+    def _request_for(self, target: Target, request: Dict[str, Any]) -> Dict[str, Any]:
+        return {**request, "model": target.deployment}
+
+    def _count(self, key: str, amount: float = 1) -> None:
+        with self._lock:
+            self.stats[key] += amount
+
+    # ---- calls ----
+
+    def call(self, request: Dict[str, Any]) -> Any:
+        """chat.completions.create on the best target, failing over on 429 / 5xx / connection errors."""
+        self._count("requests")
+        tried: List[Target] = []
+        error: Optional[BaseException] = None
+        deadline = time.monotonic() + MAX_WAIT_SECONDS
+        while len(tried) < self.max_attempts:
+            target, wait = self._pick(tried)
+            if target is None:
+                if time.monotonic() + wait > deadline:
+                    break
+                self._count("waited_s", wait)
+                time.sleep(wait)
+                continue
+            if tried:
+                self._count("failovers")
+            tried.append(target)
+            started = time.monotonic()
+            try:
+                response = target.client.chat.completions.create(**self._request_for(target, request))
+            except BaseException as e:
+                self._report(target, time.monotonic() - started, e)
+                if not isinstance(e, RETRYABLE_ERRORS):
+                    raise
+                error = e
+                continue
+            self._report(target, time.monotonic() - started, None)
+            return response
+        self._count("failed")
+        raise error or RuntimeError("No deployment available within the wait limit")
+
+    async def acall(self, request: Dict[str, Any]) -> Any:
+        """Async twin of call() (one router per event loop: its async clients belong to that loop)."""
+        self._count("requests")
+        tried: List[Target] = []
+        error: Optional[BaseException] = None
+        deadline = time.monotonic() + MAX_WAIT_SECONDS
+        while len(tried) < self.max_attempts:
+            target, wait = self._pick(tried)
+            if target is None:
+                if time.monotonic() + wait > deadline:
+                    break
+                self._count("waited_s", wait)
+                await asyncio.sleep(wait)
+                continue
+            if tried:
+                self._count("failovers")
+            tried.append(target)
+            started = time.monotonic()
+            try:
+                response = await target.async_client.chat.completions.create(**self._request_for(target, request))
+            except BaseException as e:
+                self._report(target, time.monotonic() - started, e)
+                if not isinstance(e, RETRYABLE_ERRORS):
+                    raise
+                error = e
+                continue
+            self._report(target, time.monotonic() - started, None)
+            return response
+        self._count("failed")
+        raise error or RuntimeError("No deployment available within the wait limit")
+
+    def snapshot(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        with self._lock:
+            return {**self.stats, "waited_s": round(self.stats["waited_s"], 3), "targets": {
+                t.name: {**t.stats, "state": t.state(now), "in_flight": t.in_flight, "ejections": t.ejections,
+                         "ewma_ms": round(t.ewma_latency * 1000, 1) if t.ewma_latency is not None else None,
+                         "ewma_error": round(t.ewma_error, 3)}
+                for t in self.targets}}
+
+
+# -------------------------
+# Routed clients
+# -------------------------
+
+class _RoutedCompletions:
+    def __init__(self, router: Router, is_async: bool):
+        self._router = router
+        self._is_async = is_async
+
+    def create(self, **request: Any) -> Any:
+        if self._is_async:
+            return self._router.acall(request)   # awaitable, like the SDK's
+        return self._router.call(request)
+
+
+class RoutedClient:
+    """
+    Stand-in for AzureOpenAI / AsyncAzureOpenAI with only chat.completions.create:
+    each call goes to the router's pick, `model` is replaced by that target's deployment.
+    """
+
+    def __init__(self, router: Router, is_async: bool = False):
+        self.router = router
+        self.chat = SimpleNamespace(completions=_RoutedCompletions(router, is_async))
+
+    def close(self) -> Any:
+        if self.chat.completions._is_async:
+            return self._aclose()
+        for target in self.router.targets:
+            if target._client is not None:
+                target._client.close()
+
+    async def _aclose(self) -> None:
+        for target in self.router.targets:
+            if target._async_client is not None:
+                await target._async_client.close()
+
+
+def routed(pool: Any, is_async: bool = False) -> RoutedClient:
+    """routed(load_pool()) or routed(existing_router)."""
+    return RoutedClient(pool if isinstance(pool, Router) else Router(pool), is_async)
+
+
+# -------------------------
+# Demo
+# -------------------------
+
+def _send(client: RoutedClient, calls: int, threads: int) -> Tuple[List[float], int]:
+    """`calls` requests from `threads` threads; returns (latencies, calls that raised)."""
+    latencies: List[float] = []
+    failed = [0]
+    lock = threading.Lock()
+    remaining = [calls]
+
+    def worker() -> None:
+        while True:
+            with lock:
+                if remaining[0] == 0:
+                    return
+                remaining[0] -= 1
+            started = time.perf_counter()
+            try:
+                client.chat.completions.create(model="ignored", max_tokens=50,
+                                               messages=[{"role": "user", "content": "Payments API returns 503"}])
+            except Exception:
+                with lock:
+                    failed[0] += 1
+                continue
+            with lock:
+                latencies.append(time.perf_counter() - started)
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    return latencies, failed[0]
+
+
+def main() -> None:
+    from workshop1.mock_openai_server import start_mock_server
+
+    parser = argparse.ArgumentParser(description="Multi-deployment router demo (three local mock servers).")
+    parser.add_argument("--demo", action="store_true")
+    parser.add_argument("--calls", type=int, default=300, help="calls per phase")
+    parser.add_argument("--threads", type=int, default=8)
+    args = parser.parse_args()
+    if not args.demo:
+        parser.print_help()
+        return
+
+    regions = {
+        "eastus": start_mock_server(latency="lognormal:0.05,0.3", token_delay=0),
+        "westeu": start_mock_server(latency="lognormal:0.15,0.3", token_delay=0),
+        "japan": start_mock_server(latency="lognormal:0.3,0.3", token_delay=0, rate_429=0.05, retry_after=1.0),
+    }
+    router = Router([Target(server.url, "mock-deployment", api_key="mock", name=region)
+                     for region, server in regions.items()], seed=7)
+    client = routed(router)
+
+    def phase(label: str) -> None:
+        before = {name: dict(t.stats) for name, t in ((t.name, t) for t in router.targets)}
+        latencies, failed = _send(client, args.calls, args.threads)
+        latencies.sort()
+        p50 = latencies[len(latencies) // 2] if latencies else 0.0
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] if latencies else 0.0
+        share = ", ".join(f"{t.name} {t.stats['requests'] - before[t.name]['requests']}" for t in router.targets)
+        print(f"[DEMO] {label:<22}: {failed} failed calls, p50 {p50 * 1000:4.0f} ms, p99 {p99 * 1000:4.0f} ms | "
+              f"requests: {share}")
+
+    phase("all regions up")
+    regions["eastus"].config.error_rate = 1.0
+    phase("eastus returning 500s")
+    regions["eastus"].config.error_rate = 0.0
+    time.sleep(EJECT_BASE_SECONDS)
+    phase("eastus recovered")
+    print(f"[DEMO] router: {json.dumps(router.snapshot())}")
+    for server in regions.values():
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
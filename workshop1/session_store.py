@@ -0,0 +1,387 @@
+# Persistent Chat Sessions (append-only logs + offset index)
+
+"""
+demo for:
+- One append-only JSON-lines log per chat session: adding a turn is a single append, O(1)
+  no matter how long the session already is
+- A fixed-width binary index next to each log (8-byte offset + 4-byte length per message):
+  message i is one seek into the index and one seek into the log, so paging through a
+  long history never reads (or holds) the rest of it
+- Resumable sessions: the running summary and how many messages it covers live in a small
+  metadata file, so resume reads only the turns after the summary
+- Crash recovery: a torn last line or a missing index entry is repaired on first append
+- Scale: session files are spread over 1024 shard directories; nothing is kept open
+  between appends, so tens of thousands of sessions cost no file handles
+- Compaction job: idle logs are gzip-compressed in place (still pageable, rehydrated on the
+  next append) and, optionally, sessions past a retention age are deleted
+
+    store = SessionStore()
+    session_id = store.create(system_prompt)
+    store.append(session_id, "user", "VPN drops every few minutes")
+    store.page(session_id, start=0, limit=20)
+
+Compaction (e.g. from cron):
+    python -m workshop1.session_store --compact --idle-days 7 --delete-days 90
+
+Benchmark (temp dir):
+    python -m workshop1.session_store --bench --sessions 20000
+"""
+
+import argparse
+import gzip
+import json
+import os
+import random
+import re
+import shutil
+import struct
+import tempfile
+import threading
+import time
+from typing import List, Dict, Any, Iterator, Optional, Tuple
+from workshop1.ticket_ids import new_id
+
+# -------------------------
+# Configuration
+# -------------------------
+
+DEFAULT_ROOT = ".chat_sessions"
+SESSION_PREFIX = "CHAT-"
+HISTORY_PAGE_SIZE = 20
+COMPACT_IDLE_DAYS = 7             # logs untouched this long are compressed
+SHARD_CHARS = 2                   # 32**2 = 1024 shard directories
+
+INDEX_RECORD = struct.Struct("<QI")   # (offset, length) of one log line
+
+_SESSION_ID = re.compile(r"^" + re.escape(SESSION_PREFIX) + r"[0-9A-Z]{20}$")
+
+
+class SessionNotFound(KeyError):
+    pass
+
+
+# -------------------------
+# Store
+# -------------------------
+
+class SessionStore:
+    """
+    Files per session (in <root>/<shard>/):
+        <id>.log      one JSON message per line (or <id>.log.gz once compacted)
+        <id>.idx      INDEX_RECORD per message; message count = file size / 12
+        <id>.json     metadata: created_at, system_prompt, title, summary, summarized
+    One writer per session at a time; the log is written (and flushed) before its index
+    entry, so the index never points past the data.
+    """
+
+    def __init__(self, root: str = DEFAULT_ROOT, fsync: bool = False):
+        self.root = root
+        self.fsync = fsync
+        self._lock = threading.Lock()
+        self._checked: set = set()      # sessions whose log/index tail was verified this process
+        os.makedirs(root, exist_ok=True)
+
+    # ---- paths ----
+
+    def _base(self, session_id: str) -> str:
+        if not _SESSION_ID.match(session_id):
+            raise SessionNotFound(session_id)
+        # 96 ID bits fill 20 base32 chars with 4 bits of padding, so the last char is only
+        # ever '0' or 'G'; the chars before it are low sequence bits, which spread evenly
+        return os.path.join(self.root, session_id[-SHARD_CHARS - 1:-1], session_id)
+
+    def exists(self, session_id: str) -> bool:
+        try:
+            return os.path.exists(self._base(session_id) + ".json")
+        except SessionNotFound:
+            return False
+
+    # ---- metadata ----
+
+    def create(self, system_prompt: str, title: Optional[str] = None) -> str:
+        session_id = new_id(SESSION_PREFIX)
+        base = self._base(session_id)
+        os.makedirs(os.path.dirname(base), exist_ok=True)
+        open(base + ".log", "ab").close()
+        open(base + ".idx", "ab").close()
+        self._write_meta(session_id, {"session_id": session_id, "created_at": time.time(),
+                                      "system_prompt": system_prompt, "title": title,
+                                      "summary": "", "summarized": 0})
+        return session_id
+
+    def meta(self, session_id: str) -> Dict[str, Any]:
+        try:
+            with open(self._base(session_id) + ".json", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise SessionNotFound(session_id) from None
+
+    def update_meta(self, session_id: str, **fields: Any) -> None:
+        meta = self.meta(session_id)
+        meta.update(fields)
+        self._write_meta(session_id, meta)
+
+    def _write_meta(self, session_id: str, meta: Dict[str, Any]) -> None:
+        # Write-then-rename: readers see the old or the new file, never half of one
+        path = self._base(session_id) + ".json"
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(tmp, path)
+
+    # ---- writes ----
+
+    def append(self, session_id: str, role: str, content: str, **extra: Any) -> int:
+        """Append one message; returns its index in the session."""
+        base = self._base(session_id)
+        line = json.dumps({"role": role, "content": content, "ts": round(time.time(), 3), **extra},
+                          ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n"
+        with self._lock:
+            # A missing .log means the log was compacted since (possibly by another process)
+            if session_id not in self._checked or not os.path.exists(base + ".log"):
+                self._prepare(session_id, base)
+            with open(base + ".log", "ab") as log:
+                offset = log.tell()
+                log.write(line)
+                log.flush()
+                if self.fsync:
+                    os.fsync(log.fileno())
+            with open(base + ".idx", "ab") as idx:
+                position = idx.tell()
+                idx.write(INDEX_RECORD.pack(offset, len(line)))
+        return position // INDEX_RECORD.size
+
+    def _prepare(self, session_id: str, base: str) -> None:
+        """First append in this process: rehydrate a compacted log and repair a torn tail."""
+        if not os.path.exists(base + ".json"):
+            raise SessionNotFound(session_id)
+        if os.path.exists(base + ".log.gz") and not os.path.exists(base + ".log"):
+            with gzip.open(base + ".log.gz", "rb") as src, open(base + ".log.tmp", "wb") as dst:
+                shutil.copyfileobj(src, dst)
+            os.replace(base + ".log.tmp", base + ".log")
+            os.remove(base + ".log.gz")
+        self._repair(base)
+        self._checked.add(session_id)
+
+    def _repair(self, base: str) -> None:
+        with open(base + ".idx", "r+b") as idx:
+            size = os.fstat(idx.fileno()).st_size
+            size -= size % INDEX_RECORD.size           # torn index record
+            end = 0
+            log_size = os.path.getsize(base + ".log")
+            # Drop entries that point past the log (index written, log data lost)
+            while size:
+                idx.seek(size - INDEX_RECORD.size)
+                offset, length = INDEX_RECORD.unpack(idx.read(INDEX_RECORD.size))
+                if offset + length <= log_size:
+                    end = offset + length
+                    break
+                size -= INDEX_RECORD.size
+            idx.truncate(size)
+            if log_size == end:
+                return
+            # Index the complete lines written after the last index entry; cut a torn last line
+            idx.seek(size)
+            with open(base + ".log", "r+b") as log:
+                log.seek(end)
+                for line in iter(log.readline, b""):
+                    if not line.endswith(b"\n"):
+                        break
+                    idx.write(INDEX_RECORD.pack(end, len(line)))
+                    end += len(line)
+                log.truncate(end)
+
+    def delete(self, session_id: str) -> None:
+        base = self._base(session_id)
+        with self._lock:
+            for suffix in (".log", ".log.gz", ".idx", ".json"):
+                try:
+                    os.remove(base + suffix)
+                except FileNotFoundError:
+                    pass
+            self._checked.discard(session_id)
+
+    # ---- reads ----
+
+    def count(self, session_id: str) -> int:
+        try:
+            return os.path.getsize(self._base(session_id) + ".idx") // INDEX_RECORD.size
+        except FileNotFoundError:
+            raise SessionNotFound(session_id) from None
+
+    def _open_log(self, base: str) -> Any:
+        if os.path.exists(base + ".log"):
+            return open(base + ".log", "rb")
+        # Compacted: gzip seeks forward by decompressing, still without holding the file in memory
+        return gzip.open(base + ".log.gz", "rb")
+
+    def iter_messages(self, session_id: str, start: int = 0, stop: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        """Messages [start, stop) read one line at a time."""
+        base = self._base(session_id)
+        total = self.count(session_id)
+        start = max(0, start + total if start < 0 else start)
+        stop = total if stop is None else min(stop, total)
+        if start >= stop:
+            return
+        with open(base + ".idx", "rb") as idx:
+            idx.seek(start * INDEX_RECORD.size)
+            offset, _ = INDEX_RECORD.unpack(idx.read(INDEX_RECORD.size))
+        with self._open_log(base) as log:
+            log.seek(offset)
+            for _ in range(stop - start):
+                line = log.readline()
+                if not line:
+                    return
+                yield json.loads(line)
+
+    def page(self, session_id: str, start: int = 0, limit: int = HISTORY_PAGE_SIZE) -> List[Dict[str, Any]]:
+        return list(self.iter_messages(session_id, start, start + limit))
+
+    def get(self, session_id: str, index: int) -> Dict[str, Any]:
+        if index < 0:
+            index += self.count(session_id)     # page(-1, 1) would be the empty range [-1, 0)
+        messages = self.page(session_id, index, 1) if index >= 0 else []
+        if not messages:
+            raise IndexError(index)
+        return messages[0]
+
+    def list_sessions(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """Most recently active sessions first (index mtime = time of the last append)."""
+        recent: List[Tuple[float, str]] = []
+        for shard in os.scandir(self.root):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.name.endswith(".idx"):
+                    recent.append((entry.stat().st_mtime, entry.name[:-4]))
+        recent.sort(reverse=True)
+        sessions = []
+        for updated_at, session_id in recent[:limit]:
+            meta = self.meta(session_id)
+            meta.update(updated_at=updated_at, messages=self.count(session_id))
+            sessions.append(meta)
+        return sessions
+
+    # ---- maintenance ----
+
+    def compact(self, idle_days: float = COMPACT_IDLE_DAYS, delete_days: Optional[float] = None) -> Dict[str, int]:
+        """Gzip logs idle for idle_days; delete sessions idle for delete_days (if given)."""
+        now = time.time()
+        stats = {"scanned": 0, "compacted": 0, "deleted": 0, "bytes_before": 0, "bytes_after": 0}
+        for shard in os.scandir(self.root):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if not entry.name.endswith(".idx"):
+                    continue
+                session_id = entry.name[:-4]
+                idle = now - entry.stat().st_mtime
+                stats["scanned"] += 1
+                if delete_days is not None and idle >= delete_days * 86400:
+                    self.delete(session_id)
+                    stats["deleted"] += 1
+                    continue
+                base = os.path.join(shard.path, session_id)
+                if idle < idle_days * 86400 or not os.path.exists(base + ".log"):
+                    continue
+                with self._lock:
+                    with open(base + ".log", "rb") as src, gzip.open(base + ".log.gz.tmp", "wb") as dst:
+                        shutil.copyfileobj(src, dst)
+                    stats["bytes_before"] += os.path.getsize(base + ".log")
+                    stats["bytes_after"] += os.path.getsize(base + ".log.gz.tmp")
+                    os.replace(base + ".log.gz.tmp", base + ".log.gz")
+                    os.remove(base + ".log")
+                    self._checked.discard(session_id)
+                stats["compacted"] += 1
+        return stats
+
+
+# -------------------------
+# Benchmark
+# -------------------------
+
+def _percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def run_benchmark(sessions: int, messages: int, long_messages: int, root: str) -> None:
+    store = SessionStore(root)
+    text = "The VPN client still drops every few minutes after the reinstall. " * 3
+
+    started = time.perf_counter()
+    ids = [store.create("You are an IT support specialist.") for _ in range(sessions)]
+    print(f"[BENCH] created {sessions} sessions in {time.perf_counter() - started:.1f} s")
+
+    latencies = []
+    started = time.perf_counter()
+    for i in range(messages):
+        for session_id in ids:
+            t = time.perf_counter()
+            store.append(session_id, "user" if i % 2 == 0 else "assistant", text)
+            latencies.append(time.perf_counter() - t)
+    elapsed = time.perf_counter() - started
+    print(f"[BENCH] {len(latencies)} appends across {sessions} sessions: {len(latencies) / elapsed:.0f}/s, "
+          f"p50 {_percentile(latencies, 50) * 1e6:.0f} us, p99 {_percentile(latencies, 99) * 1e6:.0f} us")
+
+    # One long session: appends and page reads should not depend on its length
+    long_id = store.create("You are an IT support specialist.")
+    for checkpoint in (long_messages // 100, long_messages):
+        while store.count(long_id) < checkpoint:
+            store.append(long_id, "user", text)
+        appends, pages = [], []
+        for _ in range(200):
+            t = time.perf_counter()
+            store.append(long_id, "assistant", text)
+            appends.append(time.perf_counter() - t)
+            start = random.randrange(store.count(long_id) - HISTORY_PAGE_SIZE)
+            t = time.perf_counter()
+            store.page(long_id, start)
+            pages.append(time.perf_counter() - t)
+        print(f"[BENCH] session with {store.count(long_id):>7} messages: append p50 "
+              f"{_percentile(appends, 50) * 1e6:.0f} us, random page of {HISTORY_PAGE_SIZE} p50 "
+              f"{_percentile(pages, 50) * 1e6:.0f} us")
+
+    stats = store.compact(idle_days=0)
+    print(f"[BENCH] compaction: {stats['compacted']} logs, {stats['bytes_before'] / 1e6:.1f} MB -> "
+          f"{stats['bytes_after'] / 1e6:.1f} MB")
+    t = time.perf_counter()
+    store.page(long_id, store.count(long_id) - HISTORY_PAGE_SIZE)
+    print(f"[BENCH] last page of the compacted long session: {(time.perf_counter() - t) * 1000:.1f} ms")
+    t = time.perf_counter()
+    store.append(long_id, "user", text)
+    print(f"[BENCH] first append after compaction (rehydrate): {(time.perf_counter() - t) * 1000:.1f} ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Chat session store utilities.")
+    parser.add_argument("--root", default=DEFAULT_ROOT)
+    parser.add_argument("--list", type=int, default=0, metavar="N", help="Show the N most recent sessions")
+    parser.add_argument("--compact", action="store_true", help="Compress idle logs (and delete expired sessions)")
+    parser.add_argument("--idle-days", type=float, default=COMPACT_IDLE_DAYS)
+    parser.add_argument("--delete-days", type=float, default=None)
+    parser.add_argument("--bench", action="store_true", help="Run the benchmark in a temp dir")
+    parser.add_argument("--sessions", type=int, default=10000)
+    parser.add_argument("--messages", type=int, default=10, help="messages per session (benchmark)")
+    parser.add_argument("--long-session", type=int, default=100000, help="messages in the long session (benchmark)")
+    args = parser.parse_args()
+
+    if args.bench:
+        root = tempfile.mkdtemp(prefix="sessions-")
+        try:
+            run_benchmark(args.sessions, args.messages, args.long_session, root)
+        finally:
+            shutil.rmtree(root, ignore_errors=True)
+        return
+
+    store = SessionStore(args.root)
+    if args.compact:
+        print(f"[COMPACT] {store.compact(args.idle_days, args.delete_days)}")
+        return
+    for session in store.list_sessions(args.list or 10):
+        updated = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(session["updated_at"]))
+        print(f"{updated}  {session['session_id']}  {session['messages']:>6} messages  {session.get('title') or ''}")
+
+
+if __name__ == "__main__":
+    main()
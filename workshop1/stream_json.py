@@ -0,0 +1,139 @@
+# Incremental JSON Parser for Streamed Completions
+
+"""
+demo for:
+- Reading a JSON object while it is still being generated token by token
+- Publishing each top-level field (e.g. "severity") the moment its value is complete
+- No re-parsing of the whole buffer on every token: each character is scanned once
+
+Example:
+    parser = IncrementalJSONObjectParser()
+    for delta in ['{"summary": "DB do', 'wn", "severity": "CRI', 'SIS", "actions": [...']:
+        for key, value in parser.feed(delta):
+            print(key, value)   # summary first, then severity — before actions arrive
+"""
+
+import json
+from typing import List, Dict, Any, Tuple
+
+_WHITESPACE = " \t\r\n"
+
+
+class IncrementalJSONObjectParser:
+    """
+    Scan a streamed JSON object and return top-level (key, value) pairs as they complete.
+    Nested values (lists/objects) are returned once their closing bracket arrives.
+    """
+
+    def __init__(self) -> None:
+        self._buf: List[str] = []
+        self._pos = 0             # next index of self._buf to scan
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._expect = "start"    # start | key | key_in | colon | value | value_in | primitive | container | comma | done
+        self._key_start = 0
+        self._value_start = 0
+        self._key = ""
+        self.fields: Dict[str, Any] = {}
+
+    @property
+    def done(self) -> bool:
+        """True once the closing brace of the top-level object has been seen."""
+        return self._expect == "done"
+
+    @property
+    def text(self) -> str:
+        """Everything fed so far."""
+        return "".join(self._buf)
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        """Consume a chunk and return the fields completed by it (in order)."""
+        if not chunk:
+            return []
+        self._buf.extend(chunk)
+        completed: List[Tuple[str, Any]] = []
+        buf = self._buf
+
+        for i in range(self._pos, len(buf)):
+            c = buf[i]
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    if self._expect == "key_in":
+                        self._key = json.loads("".join(buf[self._key_start:i + 1]))
+                        self._expect = "colon"
+                    elif self._expect == "value_in":
+                        self._emit(completed, json.loads("".join(buf[self._value_start:i + 1])))
+                        self._expect = "comma"
+                continue
+
+            if self._expect == "done":
+                break
+
+            if self._depth >= 2:
+                # Inside a nested list/object: only track strings and bracket depth
+                if c == '"':
+                    self._in_string = True
+                elif c in "[{":
+                    self._depth += 1
+                elif c in "]}":
+                    self._depth -= 1
+                    if self._depth == 1:
+                        self._emit(completed, json.loads("".join(buf[self._value_start:i + 1])))
+                        self._expect = "comma"
+                continue
+
+            if self._expect == "start":
+                if c == "{":
+                    self._depth = 1
+                    self._expect = "key"
+            elif self._expect == "key":
+                if c == '"':
+                    self._in_string = True
+                    self._key_start = i
+                    self._expect = "key_in"
+                elif c == "}":
+                    self._close()
+            elif self._expect == "colon":
+                if c == ":":
+                    self._expect = "value"
+            elif self._expect == "value":
+                if c in _WHITESPACE:
+                    continue
+                self._value_start = i
+                if c == '"':
+                    self._in_string = True
+                    self._expect = "value_in"
+                elif c in "[{":
+                    self._depth = 2
+                    self._expect = "container"
+                else:
+                    self._expect = "primitive"
+            elif self._expect == "primitive":
+                if c == "," or c == "}" or c in _WHITESPACE:
+                    self._emit(completed, json.loads("".join(buf[self._value_start:i])))
+                    self._expect = "key" if c == "," else "comma"
+                    if c == "}":
+                        self._close()
+            elif self._expect == "comma":
+                if c == ",":
+                    self._expect = "key"
+                elif c == "}":
+                    self._close()
+
+        self._pos = len(buf)
+        return completed
+
+    def _emit(self, completed: List[Tuple[str, Any]], value: Any) -> None:
+        self.fields[self._key] = value
+        completed.append((self._key, value))
+
+    def _close(self) -> None:
+        self._depth = 0
+        self._expect = "done"
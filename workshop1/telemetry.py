@@ -0,0 +1,335 @@
+# Per-Stage Timing and Token Telemetry
+
+"""
+demo for:
+- Spans around each workflow stage (LLM call, JSON parse, ticket, DB save, email, dashboard)
+- Prompt/completion tokens and finish_reason captured from every chat completion
+- Nested spans share a trace_id, so one incident's stages can be read back together
+- Exports: Prometheus text format (histograms + counters) and one JSON log line per span
+- Near-zero overhead when disabled: span() hands back a shared no-op object
+
+Overhead check:
+    python -m workshop1.telemetry --bench
+
+Typical use:
+    telemetry = Telemetry(enabled=True, service="exercise7")
+    with telemetry.span("llm_call"):
+        response = client.chat.completions.create(...)
+        telemetry.record_response(response)
+    print(telemetry.prometheus_text())
+"""
+
+import argparse
+import contextvars
+import functools
+import io
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Dict, Any, Callable, Optional, TextIO, Tuple
+
+# -------------------------
+# Configuration
+# -------------------------
+
+# Histogram buckets (seconds): sub-millisecond DB writes up to slow LLM calls
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_current_span: "contextvars.ContextVar[Optional[Span]]" = contextvars.ContextVar("current_span", default=None)
+
+
+# -------------------------
+# Spans
+# -------------------------
+
+class Span:
+    """One timed stage. Use as a context manager; set() adds attributes to its log line."""
+
+    __slots__ = ("telemetry", "name", "trace_id", "span_id", "parent_id", "attrs",
+                 "started", "duration", "status", "_token")
+
+    def __init__(self, telemetry: "Telemetry", name: str, attrs: Dict[str, Any]):
+        self.telemetry = telemetry
+        self.name = name
+        self.attrs = attrs
+        self.span_id = uuid.uuid4().hex[:16]
+        self.duration = 0.0
+        self.status = "ok"
+
+    def __enter__(self) -> "Span":
+        parent = _current_span.get()
+        self.parent_id = parent.span_id if parent is not None else None
+        self.trace_id = parent.trace_id if parent is not None else uuid.uuid4().hex
+        self._token = _current_span.set(self)
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type: Any, exc: Any, tb: Any) -> None:
+        self.duration = time.perf_counter() - self.started
+        _current_span.reset(self._token)
+        if exc_type is not None:
+            # sys.exit() inside a stage is still a failed stage
+            self.status = "error"
+            self.attrs["error"] = exc_type.__name__
+        self.telemetry._finish(self)
+
+    def set(self, **attrs: Any) -> None:
+        self.attrs.update(attrs)
+
+    def fail(self, error: str) -> None:
+        """Mark the stage failed when the error is handled inside the span."""
+        self.status = "error"
+        self.attrs["error"] = error
+
+    def record_response(self, response: Any) -> None:
+        self.telemetry.record_response(response, span=self)
+
+
+class _NoopSpan:
+    """Shared stand-in returned while telemetry is off."""
+
+    __slots__ = ()
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, exc_type: Any, exc: Any, tb: Any) -> None:
+        return None
+
+    def set(self, **attrs: Any) -> None:
+        pass
+
+    def fail(self, error: str) -> None:
+        pass
+
+    def record_response(self, response: Any) -> None:
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+# -------------------------
+# Telemetry
+# -------------------------
+
+class Telemetry:
+    """
+    Collects span timings and LLM token usage.
+    Metrics are aggregated in memory; spans are also written as JSON lines
+    to log_stream (stderr by default) or appended to log_path.
+    """
+
+    def __init__(self,
+                 enabled: bool = False,
+                 service: str = "workshop",
+                 log_stream: Optional[TextIO] = None,
+                 log_path: Optional[str] = None,
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.enabled = enabled
+        self.service = service
+        self.buckets = buckets
+        self._log_stream = log_stream
+        self._log_path = log_path
+        self._lock = threading.Lock()
+        # (stage, status) -> [bucket counts..., sum, count]
+        self._durations: Dict[Tuple[str, str], List[float]] = {}
+        # (stage, kind) -> tokens, kind in prompt/completion
+        self._tokens: Dict[Tuple[str, str], int] = {}
+        # (stage, finish_reason) -> count
+        self._finish_reasons: Dict[Tuple[str, str], int] = {}
+
+    # ---- recording ----
+
+    def span(self, name: str, **attrs: Any) -> Any:
+        """Context manager timing one stage (a no-op while disabled)."""
+        if not self.enabled:
+            return _NOOP_SPAN
+        return Span(self, name, attrs)
+
+    def instrument(self, name: str) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
+        """Decorator form of span(); checks `enabled` on every call."""
+        def decorator(fn: Callable[..., Any]) -> Callable[..., Any]:
+            @functools.wraps(fn)
+            def wrapper(*args: Any, **kwargs: Any) -> Any:
+                if not self.enabled:
+                    return fn(*args, **kwargs)
+                with Span(self, name, {}):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def current_span(self) -> Any:
+        span = _current_span.get()
+        return span if span is not None and self.enabled else _NOOP_SPAN
+
+    def record_response(self, response: Any, span: Optional[Span] = None) -> None:
+        """Capture usage and finish_reason from a ChatCompletion (non-streaming)."""
+        if not self.enabled:
+            return
+        choices = getattr(response, "choices", None) or []
+        finish_reason = choices[0].finish_reason if choices else None
+        self.record_usage(getattr(response, "usage", None), finish_reason,
+                          model=getattr(response, "model", None), span=span)
+
+    def record_usage(self,
+                     usage: Any,
+                     finish_reason: Optional[str],
+                     model: Optional[str] = None,
+                     span: Optional[Span] = None) -> None:
+        """Capture token counts from a usage object (streaming callers pass the final chunk's usage)."""
+        if not self.enabled:
+            return
+        span = span if span is not None else _current_span.get()
+        stage = span.name if span is not None else "llm"
+        prompt = getattr(usage, "prompt_tokens", 0) or 0
+        completion = getattr(usage, "completion_tokens", 0) or 0
+        with self._lock:
+            self._tokens[(stage, "prompt")] = self._tokens.get((stage, "prompt"), 0) + prompt
+            self._tokens[(stage, "completion")] = self._tokens.get((stage, "completion"), 0) + completion
+            reason = finish_reason or "unknown"
+            self._finish_reasons[(stage, reason)] = self._finish_reasons.get((stage, reason), 0) + 1
+        if span is not None:
+            span.set(source="llm", prompt_tokens=prompt, completion_tokens=completion,
+                     finish_reason=finish_reason, model=model)
+
+    def _finish(self, span: Span) -> None:
+        key = (span.name, span.status)
+        with self._lock:
+            row = self._durations.get(key)
+            if row is None:
+                row = self._durations[key] = [0.0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if span.duration <= bound:
+                    row[i] += 1
+            row[-2] += span.duration
+            row[-1] += 1
+        self._log(span)
+
+    def _log(self, span: Span) -> None:
+        record = {
+            "ts": round(time.time(), 3),
+            "service": self.service,
+            "trace_id": span.trace_id,
+            "span_id": span.span_id,
+            "parent_id": span.parent_id,
+            "stage": span.name,
+            "duration_ms": round(span.duration * 1000, 3),
+            "status": span.status,
+        }
+        record.update(span.attrs)
+        line = json.dumps(record, default=str) + "\n"
+        with self._lock:
+            if self._log_path:
+                with open(self._log_path, "a", encoding="utf-8") as f:
+                    f.write(line)
+            else:
+                (self._log_stream or sys.stderr).write(line)
+
+    # ---- export ----
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Aggregates as plain dicts: per-stage count/total/mean seconds, tokens, finish reasons."""
+        with self._lock:
+            stages = {
+                f"{stage}:{status}": {"count": int(row[-1]), "total_s": round(row[-2], 6),
+                                      "mean_ms": round(row[-2] / row[-1] * 1000, 3) if row[-1] else 0.0}
+                for (stage, status), row in self._durations.items()
+            }
+            tokens = {f"{stage}:{kind}": n for (stage, kind), n in self._tokens.items()}
+            reasons = {f"{stage}:{reason}": n for (stage, reason), n in self._finish_reasons.items()}
+        return {"service": self.service, "stages": stages, "tokens": tokens, "finish_reasons": reasons}
+
+    def prometheus_text(self) -> str:
+        """Metrics in the Prometheus text exposition format (version 0.0.4)."""
+        svc = _label(self.service)
+        lines = [
+            "# HELP workshop_stage_duration_seconds Time spent in each workflow stage.",
+            "# TYPE workshop_stage_duration_seconds histogram",
+        ]
+        with self._lock:
+            durations = sorted(self._durations.items())
+            tokens = sorted(self._tokens.items())
+            reasons = sorted(self._finish_reasons.items())
+        for (stage, status), row in durations:
+            labels = f'service="{svc}",stage="{_label(stage)}",status="{status}"'
+            for bound, n in zip(self.buckets, row):
+                lines.append(f'workshop_stage_duration_seconds_bucket{{{labels},le="{bound}"}} {int(n)}')
+            lines.append(f'workshop_stage_duration_seconds_bucket{{{labels},le="+Inf"}} {int(row[-1])}')
+            lines.append(f"workshop_stage_duration_seconds_sum{{{labels}}} {row[-2]:.6f}")
+            lines.append(f"workshop_stage_duration_seconds_count{{{labels}}} {int(row[-1])}")
+
+        lines.append("# HELP workshop_llm_tokens_total Tokens reported by the chat completions API.")
+        lines.append("# TYPE workshop_llm_tokens_total counter")
+        for (stage, kind), n in tokens:
+            lines.append(f'workshop_llm_tokens_total{{service="{svc}",stage="{_label(stage)}",type="{kind}"}} {n}')
+
+        lines.append("# HELP workshop_llm_finish_reason_total Completions by finish_reason.")
+        lines.append("# TYPE workshop_llm_finish_reason_total counter")
+        for (stage, reason), n in reasons:
+            lines.append(f'workshop_llm_finish_reason_total{{service="{svc}",stage="{_label(stage)}",'
+                         f'finish_reason="{_label(reason)}"}} {n}')
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: str) -> None:
+        """Write metrics for node_exporter's textfile collector (atomic rename)."""
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(self.prometheus_text())
+        os.replace(tmp, path)
+
+    def serve_metrics(self, port: int = 9464) -> ThreadingHTTPServer:
+        """Serve GET /metrics on a background thread for Prometheus to scrape."""
+        telemetry = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def log_message(self, *args: Any) -> None:
+                pass
+
+            def do_GET(self) -> None:
+                body = telemetry.prometheus_text().encode("utf-8")
+                self.send_response(200 if self.path.startswith("/metrics") else 404)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        server = ThreadingHTTPServer(("127.0.0.1", port), MetricsHandler)
+        threading.Thread(target=server.serve_forever, name="telemetry-metrics", daemon=True).start()
+        return server
+
+
+def _label(value: str) -> str:
+    """Escape a Prometheus label value."""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+# -------------------------
+# Benchmark
+# -------------------------
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Measure span overhead with telemetry on and off.")
+    parser.add_argument("--bench", action="store_true")
+    parser.add_argument("--count", type=int, default=200_000)
+    args = parser.parse_args()
+    if not args.bench:
+        parser.print_help()
+        return
+
+    for enabled in (False, True):
+        telemetry = Telemetry(enabled=enabled, service="bench", log_stream=io.StringIO())
+        started = time.perf_counter()
+        for _ in range(args.count):
+            with telemetry.span("stage"):
+                pass
+        per_span = (time.perf_counter() - started) / args.count
+        print(f"[BENCH] enabled={str(enabled):<5} {per_span * 1e9:>8.0f} ns per span")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+import random
+
+import pytest
+
+from workshop1.fast_triage import AhoCorasick, KeywordTriage, MAX_LABELLED
+
+
+def brute_force(phrases, text):
+    found = []
+    for phrase in set(phrases):
+        start = text.find(phrase)
+        while start != -1:
+            found.append((start, phrase))
+            start = text.find(phrase, start + 1)
+    return sorted(found)
+
+
+@pytest.mark.parametrize("phrases, text", [
+    (["he", "she", "his", "hers"], "ushers"),
+    (["a", "aa", "aaa"], "aaaaa"),
+    (["abcd", "bc", "c"], "abcabcd"),
+    (["is down", "down", "site down"], "the site down, db is down, downloads ok"),
+    ([], "anything"),
+    (["x"], ""),
+])
+def test_known_cases(phrases, text):
+    assert sorted(AhoCorasick(phrases).find(text)) == brute_force(phrases, text)
+
+
+def test_matches_brute_force_on_random_inputs():
+    rng = random.Random(42)
+    for _ in range(500):
+        alphabet = "ab" if rng.random() < 0.5 else "abc "
+        phrases = ["".join(rng.choice(alphabet) for _ in range(rng.randint(1, 5)))
+                   for _ in range(rng.randint(1, 12))]
+        text = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 60)))
+        assert sorted(AhoCorasick(phrases).find(text)) == brute_force(phrases, text), (phrases, text)
+
+
+def test_duplicate_phrases_are_reported_once_per_occurrence():
+    assert AhoCorasick(["down", "down"]).find("down") == [(0, "down")]
+
+
+@pytest.mark.parametrize("description", [
+    "The production database backup finished, nothing is down",
+    "No outage, just checking the production database dashboards",
+    "Ransomware scan found no ransomware",
+    "There was never an outage, all users are fine",
+])
+def test_negated_phrases_fall_through_to_the_llm(description):
+    candidate = KeywordTriage().match(description)
+    assert candidate["negated"]
+    assert not candidate["confident"]
+
+
+@pytest.mark.parametrize("description", [
+    "The printer on floor 3 is down",
+    "Scheduled outage tonight for maintenance window",
+    "Is there an outage? just asking",
+])
+def test_a_single_phrase_is_not_a_confident_crisis(description):
+    candidate = KeywordTriage().match(description)
+    assert candidate["severity"] == "CRISIS" and candidate["phrases"] == 1
+    assert not candidate["confident"]
+
+
+def test_a_phrase_inside_another_is_not_counted_twice():
+    triage = KeywordTriage(phrases={"CRISIS": {"is down": 1.0, "production database is down": 1.0}})
+    candidate = triage.match("Production database is down")
+    assert candidate["score"] == 2.0 and candidate["phrases"] == 1
+    assert not candidate["confident"]
+
+
+def test_two_independent_phrases_are_confident():
+    candidate = KeywordTriage().match("Production database is down for all users")
+    assert candidate["severity"] == "CRISIS" and candidate["phrases"] == 3
+    assert candidate["confident"]
+
+
+def test_negation_only_applies_within_the_clause():
+    candidate = KeywordTriage().match("Nothing changed. Production database is down")
+    assert candidate["negated"] == []
+    assert candidate["severity"] == "CRISIS" and candidate["confident"]
+
+
+def test_labelled_history_is_bounded():
+    triage = KeywordTriage()
+    candidate = triage.match("Production database is down")
+    for _ in range(MAX_LABELLED + 10):
+        triage.record_llm_severity(candidate, "CRISIS")
+    assert triage.metrics()["labelled"] == MAX_LABELLED
+
+
+def test_agreement_confident_uses_the_fast_path_rule():
+    triage = KeywordTriage(min_score=2.0, min_margin=1.0)
+    confident = triage.match("production database outage")     # score 2.0, margin 2.0
+    weak = triage.match("outage")                               # margin 1.0 but score below min_score
+    assert confident["confident"] and not weak["confident"]
+    triage.record_llm_severity(confident, "CRISIS")
+    triage.record_llm_severity(weak, "NORMAL")
+    assert triage.metrics()["agreement_confident"] == 1.0
+    assert triage.metrics()["agreement_all"] == 0.5
@@ -0,0 +1,96 @@
+import json
+import os
+
+from workshop1.session_store import INDEX_RECORD, SessionStore
+
+
+def _texts(store, session_id):
+    return [m["content"] for m in store.iter_messages(session_id)]
+
+
+def _line(content):
+    return json.dumps({"role": "user", "content": content}).encode("utf-8") + b"\n"
+
+
+def test_append_and_page(tmp_path):
+    store = SessionStore(str(tmp_path))
+    session_id = store.create("system")
+    for i in range(5):
+        assert store.append(session_id, "user", f"m{i}") == i
+    assert store.count(session_id) == 5
+    assert [m["content"] for m in store.page(session_id, start=1, limit=2)] == ["m1", "m2"]
+    assert store.get(session_id, -1)["content"] == "m4"
+
+
+def test_shard_is_taken_before_the_last_id_char(tmp_path):
+    store = SessionStore(str(tmp_path))
+    session_id = store.create("system")
+    shard = os.path.basename(os.path.dirname(store._base(session_id)))
+    assert shard == session_id[-3:-1]
+
+
+def test_torn_last_line_is_cut_on_next_append(tmp_path):
+    store = SessionStore(str(tmp_path))
+    session_id = store.create("system")
+    store.append(session_id, "user", "m0")
+    store.append(session_id, "assistant", "m1")
+    base = store._base(session_id)
+    with open(base + ".log", "ab") as log:
+        log.write(b'{"role":"user","cont')          # crash in the middle of a write
+
+    # A new store is a new process: the first append checks the tail
+    store = SessionStore(str(tmp_path))
+    assert store.append(session_id, "user", "m2") == 2
+    assert _texts(store, session_id) == ["m0", "m1", "m2"]
+
+
+def test_unindexed_log_line_is_recovered(tmp_path):
+    store = SessionStore(str(tmp_path))
+    session_id = store.create("system")
+    store.append(session_id, "user", "m0")
+    base = store._base(session_id)
+    with open(base + ".log", "ab") as log:
+        log.write(_line("m1"))                      # log written, crash before the index entry
+
+    store = SessionStore(str(tmp_path))
+    assert store.count(session_id) == 1
+    assert store.append(session_id, "user", "m2") == 2
+    assert _texts(store, session_id) == ["m0", "m1", "m2"]
+
+
+def test_index_entries_past_the_log_are_dropped(tmp_path):
+    store = SessionStore(str(tmp_path))
+    session_id = store.create("system")
+    store.append(session_id, "user", "m0")
+    base = store._base(session_id)
+    size = os.path.getsize(base + ".log")
+    with open(base + ".idx", "ab") as idx:
+        idx.write(INDEX_RECORD.pack(size, 40))      # index entry whose log data was lost
+        idx.write(INDEX_RECORD.pack(size + 40, 40)[:5])   # and a torn index record
+
+    store = SessionStore(str(tmp_path))
+    assert store.append(session_id, "user", "m1") == 1
+    assert os.path.getsize(base + ".idx") == 2 * INDEX_RECORD.size
+    assert _texts(store, session_id) == ["m0", "m1"]
+
+
+def test_compact_then_rehydrate_on_append(tmp_path):
+    store = SessionStore(str(tmp_path))
+    session_id = store.create("system")
+    for i in range(3):
+        store.append(session_id, "user", f"m{i}")
+    base = store._base(session_id)
+
+    stats = store.compact(idle_days=0)
+    assert stats["compacted"] == 1
+    assert os.path.exists(base + ".log.gz") and not os.path.exists(base + ".log")
+    assert [m["content"] for m in store.page(session_id, start=1)] == ["m1", "m2"]
+
+    assert store.append(session_id, "user", "m3") == 3
+    assert os.path.exists(base + ".log") and not os.path.exists(base + ".log.gz")
+    assert _texts(store, session_id) == ["m0", "m1", "m2", "m3"]
+
+    # Compacted by another process after this store last appended: still rehydrated
+    SessionStore(str(tmp_path)).compact(idle_days=0)
+    assert store.append(session_id, "assistant", "m4") == 4
+    assert _texts(store, session_id) == ["m0", "m1", "m2", "m3", "m4"]
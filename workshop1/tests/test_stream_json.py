@@ -0,0 +1,91 @@
+import json
+import random
+
+import pytest
+
+from workshop1.stream_json import IncrementalJSONObjectParser
+
+DOCUMENTS = [
+    '{"summary": "Production DB is down", "severity": "CRISIS", "actions": ["page on-call", "fail over"]}',
+    '{"severity":"HIGH","score":7,"ok":true,"reason":null,"ratio":-1.5e3}',
+    '{ "summary" : "Quote \\" and backslash \\\\ and brace } in text" ,\n  "severity" : "NORMAL" }',
+    '{"nested": {"a": [1, {"b": "]}"}], "c": {}}, "tail": "\\u00e9t\\u00e9", "empty": []}',
+    '{"unicode": "café — 文字", "n": 0, "list": [[], [[]], "x"]}',
+    '{}',
+]
+
+
+def feed_chunks(chunks):
+    parser = IncrementalJSONObjectParser()
+    completed = []
+    for chunk in chunks:
+        completed.extend(parser.feed(chunk))
+    return parser, completed
+
+
+def random_chunks(text, rng):
+    cuts = sorted(rng.sample(range(1, len(text)), k=min(len(text) - 1, rng.randint(1, 12))))
+    return [text[i:j] for i, j in zip([0] + cuts, cuts + [len(text)])]
+
+
+@pytest.mark.parametrize("doc", DOCUMENTS)
+def test_whole_document(doc):
+    parser, completed = feed_chunks([doc])
+    assert parser.done
+    assert completed == list(json.loads(doc).items())
+    assert parser.fields == json.loads(doc)
+    assert parser.text == doc
+
+
+@pytest.mark.parametrize("doc", DOCUMENTS)
+def test_every_single_split_point(doc):
+    expected = list(json.loads(doc).items())
+    for i in range(len(doc) + 1):
+        parser, completed = feed_chunks([doc[:i], doc[i:]])
+        assert completed == expected, f"split at {i}: {doc[:i]!r} | {doc[i:]!r}"
+        assert parser.done
+
+
+@pytest.mark.parametrize("doc", DOCUMENTS)
+def test_one_character_at_a_time(doc):
+    parser, completed = feed_chunks(list(doc))
+    assert completed == list(json.loads(doc).items())
+    assert parser.done
+
+
+def test_random_chunk_boundaries():
+    rng = random.Random(1234)
+    for _ in range(2000):
+        doc = rng.choice(DOCUMENTS[:-1])
+        parser, completed = feed_chunks(random_chunks(doc, rng))
+        assert completed == list(json.loads(doc).items())
+        assert parser.done
+
+
+def test_fields_are_published_before_the_object_closes():
+    parser = IncrementalJSONObjectParser()
+    assert parser.feed('{"summary": "DB do') == []
+    assert parser.feed('wn", "severity": "CRI') == [("summary", "DB down")]
+    assert parser.feed('SIS", "actions": ["page') == [("severity", "CRISIS")]
+    assert not parser.done
+    assert parser.feed('"]}') == [("actions", ["page"])]
+    assert parser.done
+
+
+def test_primitive_is_published_only_once_its_terminator_arrives():
+    parser = IncrementalJSONObjectParser()
+    # "12" could still become "123"
+    assert parser.feed('{"score": 12') == []
+    assert parser.feed('3, "ok": tr') == [("score", 123)]
+    assert parser.feed('ue}') == [("ok", True)]
+
+
+def test_text_after_the_object_is_ignored():
+    parser, completed = feed_chunks(['{"a": 1}', ' trailing {"b": 2}'])
+    assert completed == [("a", 1)]
+    assert parser.fields == {"a": 1}
+
+
+def test_empty_chunks_are_ignored():
+    parser, completed = feed_chunks(["", '{"a":', "", ' "b"}', ""])
+    assert completed == [("a", "b")]
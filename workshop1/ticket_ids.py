@@ -0,0 +1,169 @@
+# Time-Ordered Ticket IDs (ULID / snowflake style)
+
+"""
+demo for:
+- 96-bit IDs: 48-bit millisecond timestamp | 22-bit process id | 26-bit sequence
+- Crockford base32 text (20 chars): string order == creation order, so IDs sort
+  and range-scan (e.g. "all tickets from the last hour" is a primary-key range)
+- Collision-free on one host: the pid separates processes, the sequence separates
+  IDs inside one millisecond (random start per millisecond, then +1 under a lock)
+- Monotonic inside a process even if the wall clock steps backwards
+
+Replaces uuid4().hex[:6]: only 16.7M values, ~50% collision chance after ~4.8k tickets.
+
+Benchmark:
+    python -m workshop1.ticket_ids --bench --threads 8 --processes 4
+"""
+
+import argparse
+import base64
+import multiprocessing
+import os
+import random
+import threading
+import time
+from typing import List, Tuple
+
+# -------------------------
+# Configuration
+# -------------------------
+
+TIMESTAMP_BITS = 48     # milliseconds since the Unix epoch, good until the year 10889
+PID_BITS = 22           # Linux pid_max is at most 2**22
+SEQUENCE_BITS = 26      # > 67M IDs per millisecond per process
+
+ID_CHARS = 20           # ceil(96 / 5)
+TICKET_PREFIX = "TICKET-"
+
+_PID_MASK = (1 << PID_BITS) - 1
+_SEQUENCE_LIMIT = 1 << SEQUENCE_BITS
+
+# base64.b32encode does the bit-packing in C; translate its RFC 4648 alphabet
+# to Crockford's, which is in ASCII order (so text order matches numeric order)
+_RFC4648 = b"ABCDEFGHIJKLMNOPQRSTUVWXYZ234567"
+_CROCKFORD = b"0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+_TO_CROCKFORD = bytes.maketrans(_RFC4648, _CROCKFORD)
+_FROM_CROCKFORD = bytes.maketrans(_CROCKFORD, _RFC4648)
+
+
+def encode(timestamp_ms: int, pid: int, sequence: int) -> str:
+    value = (timestamp_ms << (PID_BITS + SEQUENCE_BITS)) | ((pid & _PID_MASK) << SEQUENCE_BITS) | sequence
+    return base64.b32encode(value.to_bytes(12, "big"))[:ID_CHARS].translate(_TO_CROCKFORD).decode("ascii")
+
+
+def decode(id_text: str) -> Tuple[int, int, int]:
+    """Return (timestamp_ms, pid, sequence) for an ID, with or without its prefix."""
+    body = id_text[-ID_CHARS:].upper().encode("ascii").translate(_FROM_CROCKFORD) + b"===="
+    value = int.from_bytes(base64.b32decode(body), "big")
+    return (value >> (PID_BITS + SEQUENCE_BITS),
+            (value >> SEQUENCE_BITS) & _PID_MASK,
+            value & (_SEQUENCE_LIMIT - 1))
+
+
+def id_range(start: float, end: float, prefix: str = TICKET_PREFIX) -> Tuple[str, str]:
+    """Bounds (low inclusive, high exclusive) covering IDs created in [start, end) Unix seconds."""
+    return (prefix + encode(int(start * 1000), 0, 0), prefix + encode(int(end * 1000), 0, 0))
+
+
+# -------------------------
+# Allocator
+# -------------------------
+
+class IdAllocator:
+    """Thread-safe generator; one per process (the module-level default is fork-aware)."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self) -> None:
+        self._pid = os.getpid()
+        self._last_ms = 0
+        self._sequence = 0
+
+    def new(self, prefix: str = "") -> str:
+        now_ms = time.time_ns() // 1_000_000
+        with self._lock:
+            if now_ms > self._last_ms:
+                self._last_ms = now_ms
+                # Random start in the lower half leaves >33M increments before overflow
+                self._sequence = random.getrandbits(SEQUENCE_BITS - 1)
+            else:
+                # Same millisecond, or the clock stepped back: keep counting from the last ID
+                self._sequence += 1
+                if self._sequence >= _SEQUENCE_LIMIT:
+                    self._last_ms += 1
+                    self._sequence = 0
+            ms, sequence = self._last_ms, self._sequence
+        return prefix + encode(ms, self._pid, sequence)
+
+
+_default_allocator = IdAllocator()
+if hasattr(os, "register_at_fork"):
+    # A forked child gets a new pid: start its own sequence from scratch
+    os.register_at_fork(after_in_child=_default_allocator._reset)
+
+
+def new_id(prefix: str = "") -> str:
+    return _default_allocator.new(prefix)
+
+
+def new_ticket_id() -> str:
+    """e.g. TICKET-01JAE4Q7V5X3M0CK2F8R"""
+    return _default_allocator.new(TICKET_PREFIX)
+
+
+# -------------------------
+# Benchmark
+# -------------------------
+
+def _generate(args: Tuple[int, int]) -> List[str]:
+    threads, per_thread = args
+    results: List[List[str]] = [[] for _ in range(threads)]
+
+    def worker(n: int) -> None:
+        out = results[n]
+        for _ in range(per_thread):
+            out.append(new_ticket_id())
+
+    workers = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    for out in results:
+        # Per-thread output is strictly increasing (one process, one lock)
+        assert all(a < b for a, b in zip(out, out[1:])), "IDs went backwards"
+    return [i for out in results for i in out]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Ticket ID allocator.")
+    parser.add_argument("--bench", action="store_true")
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--count", type=int, default=200_000, help="IDs per process")
+    args = parser.parse_args()
+    if not args.bench:
+        print(new_ticket_id())
+        return
+
+    per_thread = args.count // args.threads
+    started = time.perf_counter()
+    single = _generate((args.threads, per_thread))
+    elapsed = time.perf_counter() - started
+    print(f"[BENCH] 1 process x {args.threads} threads: {len(single) / elapsed:,.0f} IDs/s")
+
+    started = time.perf_counter()
+    with multiprocessing.get_context("fork").Pool(args.processes) as pool:
+        batches = pool.map(_generate, [(args.threads, per_thread)] * args.processes)
+    elapsed = time.perf_counter() - started
+    all_ids = single + [i for batch in batches for i in batch]
+    print(f"[BENCH] {args.processes} processes x {args.threads} threads: "
+          f"{sum(map(len, batches)) / elapsed:,.0f} IDs/s (incl. pool start-up)")
+    print(f"[BENCH] {len(all_ids):,} IDs, {len(all_ids) - len(set(all_ids))} duplicates")
+    print(f"[BENCH] sample {all_ids[-1]} -> {decode(all_ids[-1])}")
+
+
+if __name__ == "__main__":
+    main()
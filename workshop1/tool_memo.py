@@ -0,0 +1,240 @@
+# Memoized Tool Results and Tool-Loop Guards
+
+"""
+demo for:
+- Tool results keyed on (tool name, canonicalized arguments)
+- Per-tool cache policy declared at registration (see tool_registry.CACHE_POLICIES):
+  "loop" for side effects (a repeated escalate_crisis returns the first ticket, no second email),
+  "ttl" for read-only lookups shared across incidents, "never" to always run
+- Single-flight: identical calls running at the same time (parallel tool_calls) run once
+- Loop detection: stop when the model repeats a turn it already made
+- Hard caps on tool-loop iterations and total tokens
+- Terminal tools (registered with terminal=True): the loop ends once they succeed,
+  skipping the follow-up round trip; summary() reports the round trips and tokens saved
+- calls(name): arguments of the memoized calls already started, so a fallback path
+  (e.g. degraded triage after a failed stream) can reuse them instead of running the tool again
+
+    loop = ToolLoop(registry, run_tool, shared=tool_result_cache, max_iterations=5, max_total_tokens=4000)
+    loop.record_response(response)
+    while response.choices[0].message.tool_calls:
+        stop = loop.next_turn(response.choices[0].message.tool_calls)
+        if stop: break
+        outcomes = run_tool_calls(tool_calls, loop.run)
+        ...
+        if loop.finished(outcomes): break     # terminal tool ran: no closing message needed
+"""
+
+import json
+import threading
+import time
+from concurrent.futures import Future
+from typing import List, Dict, Any, Callable, Optional, Set, Tuple
+from workshop1.tool_registry import ToolRegistry
+from workshop1.tool_runner import is_error_payload
+
+# -------------------------
+# Configuration
+# -------------------------
+
+DEFAULT_MAX_ITERATIONS = 5
+DEFAULT_MAX_TOTAL_TOKENS = 8000
+DEFAULT_MAX_ENTRIES = 10_000
+
+
+# -------------------------
+# Shared (cross-incident) cache
+# -------------------------
+
+class ToolResultCache:
+    """Process-wide TTL cache for tools registered with cache="ttl"."""
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: Dict[str, Tuple[float, str]] = {}   # key -> (expires_at, content)
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "expired": 0}
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            if entry[0] <= now:
+                del self._entries[key]
+                self.stats["expired"] += 1
+                self.stats["misses"] += 1
+                return None
+            self.stats["hits"] += 1
+            return entry[1]
+
+    def set(self, key: str, content: str, ttl: float) -> None:
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                # Drop expired entries first, then the oldest inserted
+                now = time.monotonic()
+                for k in [k for k, (exp, _) in self._entries.items() if exp <= now]:
+                    del self._entries[k]
+                while len(self._entries) >= self.max_entries:
+                    del self._entries[next(iter(self._entries))]
+            self._entries[key] = (time.monotonic() + ttl, content)
+
+
+# -------------------------
+# One tool loop
+# -------------------------
+
+class ToolLoop:
+    """
+    State for one call_triage_llm_with_tools run: memoized results, the turns seen
+    so far, and the iteration / token budget. run() is safe to call from the
+    tool_runner worker threads.
+    """
+
+    def __init__(self,
+                 registry: ToolRegistry,
+                 handler: Callable[[str, Dict[str, Any]], str],
+                 shared: Optional[ToolResultCache] = None,
+                 max_iterations: int = DEFAULT_MAX_ITERATIONS,
+                 max_total_tokens: int = DEFAULT_MAX_TOTAL_TOKENS,
+                 verbose: bool = True):
+        self.registry = registry
+        self.handler = handler
+        self.shared = shared
+        self.max_iterations = max_iterations
+        self.max_total_tokens = max_total_tokens
+        self.verbose = verbose
+
+        self.iterations = 0
+        self.total_tokens = 0
+        self.round_trips = 0
+        self.round_trips_saved = 0
+        self.tokens_saved = 0              # estimate: prompt of the skipped follow-up request
+        self._last_usage: Any = None
+        self.stop_reason: Optional[str] = None
+        self._memo: Dict[str, "Future[str]"] = {}
+        self._arguments: Dict[str, Tuple[str, Dict[str, Any]]] = {}   # memo key -> (name, arguments)
+        self._turns: Set[Tuple[str, ...]] = set()
+        self._lock = threading.Lock()
+        self.stats = {"tool_runs": 0, "loop_hits": 0, "shared_hits": 0}
+
+    # ---- budget + loop detection ----
+
+    def record_response(self, response: Any) -> None:
+        """Add a response's usage (a ChatCompletion or a tool_stream.StreamedTurn)."""
+        usage = getattr(response, "usage", None)
+        self.round_trips += 1
+        self.total_tokens += getattr(usage, "total_tokens", 0) or 0
+        self._last_usage = usage
+
+    def over_budget(self) -> Optional[str]:
+        """Iteration or token cap reached (checked before tools start, e.g. while streaming)."""
+        if self.iterations >= self.max_iterations:
+            return f"iteration cap ({self.max_iterations}) reached"
+        if self.total_tokens >= self.max_total_tokens:
+            return f"token cap ({self.total_tokens}/{self.max_total_tokens}) reached"
+        return None
+
+    def next_turn(self, tool_calls: List[Any]) -> Optional[str]:
+        """Call before running a turn's tools; returns a stop reason, or None to continue."""
+        signature = tuple(sorted(self._key(tc.function.name, tc.function.arguments) for tc in tool_calls))
+        self.stop_reason = self.over_budget()
+        if self.stop_reason is None and signature in self._turns:
+            self.stop_reason = "model repeated an earlier turn"
+        if self.stop_reason is None:
+            self._turns.add(signature)
+            self.iterations += 1
+        return self.stop_reason
+
+    def finished(self, outcomes: List[Any]) -> bool:
+        """
+        True when the turn ran a terminal tool and nothing in it failed: the loop can end
+        without another model call. (A failed turn goes back to the model so it can retry.)
+        """
+        terminal = [o.name for o in outcomes if getattr(self.registry.get(o.name), "terminal", False)]
+        if not terminal or not all(o.ok for o in outcomes):
+            return False
+        self.stop_reason = f"terminal tool {terminal[0]} ran"
+        self.round_trips_saved += 1
+        # The skipped request would have resent the whole conversation plus this turn and its results
+        usage = self._last_usage
+        self.tokens_saved += ((getattr(usage, "prompt_tokens", 0) or 0)
+                              + (getattr(usage, "completion_tokens", 0) or 0)
+                              + sum(len(o.content) for o in outcomes) // 4)
+        return True
+
+    # ---- memoized execution ----
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self.stats[key] += 1
+
+    def _key(self, name: str, raw_arguments: str) -> str:
+        try:
+            arguments = json.loads(raw_arguments or "{}")
+        except ValueError:
+            return f"{name}:{raw_arguments}"
+        tool = self.registry.get(name)
+        return tool.canonical_key(arguments) if tool is not None else f"{name}:{raw_arguments}"
+
+    def run(self, name: str, arguments: Dict[str, Any]) -> str:
+        """Tool handler honouring the tool's cache policy."""
+        tool = self.registry.get(name)
+        policy = tool.cache if tool is not None else "never"
+        if policy == "never":
+            self._count("tool_runs")
+            return self.handler(name, arguments)
+
+        key = tool.canonical_key(arguments)
+        with self._lock:
+            future = self._memo.get(key)
+            owner = future is None
+            if owner:
+                future = self._memo[key] = Future()
+                self._arguments[key] = (name, arguments)
+        if not owner:
+            # Same call already made (or running) in this loop: share its result
+            self._count("loop_hits")
+            if self.verbose:
+                print(f"[MEMO] Reusing {name} result from earlier in this loop (not run again).")
+            return future.result()
+
+        try:
+            content = self.shared.get(key) if policy == "ttl" and self.shared is not None else None
+            if content is not None:
+                self._count("shared_hits")
+                if self.verbose:
+                    print(f"[MEMO] {name} answered from the shared cache.")
+            else:
+                self._count("tool_runs")
+                content = self.handler(name, arguments)
+                if policy == "ttl" and self.shared is not None and not is_error_payload(content):
+                    self.shared.set(key, content, tool.cache_ttl)
+        except BaseException as e:
+            future.set_exception(e)
+            with self._lock:
+                self._memo.pop(key, None)   # let a later call retry
+                self._arguments.pop(key, None)
+            raise
+        # Error payloads are never memoized (the next call may succeed)
+        if is_error_payload(content):
+            with self._lock:
+                self._memo.pop(key, None)
+                self._arguments.pop(key, None)
+        future.set_result(content)
+        return content
+
+    def calls(self, name: str) -> List[Dict[str, Any]]:
+        """
+        Arguments of the memoized `name` calls made (or still running) in this loop, oldest
+        first; failed calls are not listed. run() with the same arguments shares their result.
+        """
+        with self._lock:
+            return [arguments for key, (n, arguments) in self._arguments.items()
+                    if n == name and key in self._memo]
+
+    def summary(self) -> Dict[str, Any]:
+        return {"iterations": self.iterations, "round_trips": self.round_trips,
+                "total_tokens": self.total_tokens, "round_trips_saved": self.round_trips_saved,
+                "tokens_saved_est": self.tokens_saved, "stop_reason": self.stop_reason, **self.stats}
@@ -0,0 +1,317 @@
+# Decorator-Based Tool Registry (schemas + dispatch)
+
+"""
+demo for:
+- Adding a tool = writing one typed Python function and decorating it
+- The JSON schema for `tools=[...]` is generated from the signature once and cached
+- Dispatch is a dict lookup (flat cost with hundreds of tools), not an if/else chain
+- Argument validation/coercion is compiled once per tool into a list of small converters
+
+Types understood: str, int, float, bool, List[X], Dict[str, X], Literal[...] (enum),
+Optional[X] (not required), and Annotated[X, "description"] for parameter descriptions.
+
+    registry = ToolRegistry()
+
+    @registry.tool(description="Escalate a CRISIS-level incident to on-call team.")
+    def escalate_crisis(summary: Annotated[str, "Incident summary"],
+                        severity: Annotated[Literal["NORMAL", "ALERT", "CRISIS"], "Severity level"]) -> dict:
+        ...
+
+    client.chat.completions.create(..., tools=registry.schemas())
+    registry.dispatch(tool_call.function.name, json.loads(tool_call.function.arguments))
+
+Benchmark:
+    python -m workshop1.tool_registry --bench
+"""
+
+import argparse
+import inspect
+import json
+import time
+import typing
+from typing import List, Dict, Any, Callable, Optional, Tuple
+
+# -------------------------
+# Errors
+# -------------------------
+
+class ToolArgumentError(ValueError):
+    """The model sent arguments that do not match the tool's signature."""
+
+
+# -------------------------
+# Schema + converter compilation
+# -------------------------
+
+_JSON_TYPES = {str: "string", int: "integer", float: "number", bool: "boolean"}
+
+# How a tool's results may be reused (see workshop1.tool_memo):
+#   "never" - run every time (default)
+#   "loop"  - same arguments inside one tool loop reuse the first result (side-effecting tools)
+#   "ttl"   - reused across loops/incidents for cache_ttl seconds (read-only lookups)
+CACHE_POLICIES = ("never", "loop", "ttl")
+# terminal=True: once the tool has run successfully, the tool loop ends without asking the
+# model for a closing message (the tool result *is* the answer)
+DEFAULT_CACHE_TTL = 300.0
+_TRUE = {"true", "1", "yes"}
+_FALSE = {"false", "0", "no"}
+
+
+def _unwrap(annotation: Any) -> Tuple[Any, Optional[str], bool]:
+    """Strip Annotated/Optional: return (type, description, optional)."""
+    description = None
+    if typing.get_origin(annotation) is typing.Annotated:
+        annotation, *extras = typing.get_args(annotation)
+        description = next((e for e in extras if isinstance(e, str)), None)
+    optional = False
+    if typing.get_origin(annotation) is typing.Union:
+        args = [a for a in typing.get_args(annotation) if a is not type(None)]
+        optional = len(args) < len(typing.get_args(annotation))
+        annotation = args[0] if len(args) == 1 else Any
+    return annotation, description, optional
+
+
+def _compile(annotation: Any, path: str) -> Tuple[Dict[str, Any], Callable[[Any], Any]]:
+    """JSON schema fragment and a converter function for one type."""
+    origin = typing.get_origin(annotation)
+    args = typing.get_args(annotation)
+
+    if annotation in _JSON_TYPES:
+        target = annotation
+
+        def convert_scalar(value: Any) -> Any:
+            if target is bool:
+                if isinstance(value, bool):
+                    return value
+                text = str(value).strip().lower()
+                if text in _TRUE or text in _FALSE:
+                    return text in _TRUE
+                raise ToolArgumentError(f"{path}: expected boolean, got {value!r}")
+            if target is str:
+                if isinstance(value, (dict, list)):
+                    raise ToolArgumentError(f"{path}: expected string, got {type(value).__name__}")
+                return value if isinstance(value, str) else str(value)
+            if isinstance(value, bool):
+                raise ToolArgumentError(f"{path}: expected {_JSON_TYPES[target]}, got boolean")
+            try:
+                converted = target(value)
+            except (TypeError, ValueError):
+                raise ToolArgumentError(f"{path}: expected {_JSON_TYPES[target]}, got {value!r}") from None
+            if target is int and isinstance(value, float) and converted != value:
+                raise ToolArgumentError(f"{path}: expected integer, got {value!r}")
+            return converted
+        return {"type": _JSON_TYPES[annotation]}, convert_scalar
+
+    if origin is typing.Literal:
+        allowed = list(args)
+        lookup = {str(a).upper(): a for a in allowed}
+
+        def convert_enum(value: Any) -> Any:
+            if value in allowed:
+                return value
+            # Models sometimes change case ("crisis"); accept it, return the canonical value
+            match = lookup.get(str(value).upper())
+            if match is None:
+                raise ToolArgumentError(f"{path}: expected one of {allowed}, got {value!r}")
+            return match
+        base = _JSON_TYPES.get(type(allowed[0]), "string")
+        return {"type": base, "enum": allowed}, convert_enum
+
+    if origin is list or annotation is list:
+        item_schema, convert_item = _compile(args[0] if args else Any, path + "[]")
+
+        def convert_list(value: Any) -> List[Any]:
+            if isinstance(value, str):
+                value = [value]   # a single string where a list was expected
+            if not isinstance(value, (list, tuple)):
+                raise ToolArgumentError(f"{path}: expected array, got {type(value).__name__}")
+            return [convert_item(v) for v in value]
+        return {"type": "array", "items": item_schema}, convert_list
+
+    if origin is dict or annotation is dict:
+        value_schema, convert_value = _compile(args[1] if len(args) == 2 else Any, path + "{}")
+
+        def convert_dict(value: Any) -> Dict[str, Any]:
+            if not isinstance(value, dict):
+                raise ToolArgumentError(f"{path}: expected object, got {type(value).__name__}")
+            return {str(k): convert_value(v) for k, v in value.items()}
+        schema: Dict[str, Any] = {"type": "object"}
+        if value_schema:
+            schema["additionalProperties"] = value_schema
+        return schema, convert_dict
+
+    # Any / unknown annotations: accept as-is, no schema constraint
+    return {}, lambda value: value
+
+
+# -------------------------
+# Registry
+# -------------------------
+
+class Tool:
+    """One registered function with its cached schema and compiled argument converters."""
+
+    __slots__ = ("name", "fn", "schema", "cache", "cache_ttl", "terminal", "_params")
+
+    def __init__(self,
+                 fn: Callable[..., Any],
+                 name: Optional[str] = None,
+                 description: Optional[str] = None,
+                 cache: str = "never",
+                 cache_ttl: float = DEFAULT_CACHE_TTL,
+                 terminal: bool = False):
+        if cache not in CACHE_POLICIES:
+            raise ValueError(f"cache must be one of {CACHE_POLICIES}, got {cache!r}")
+        self.fn = fn
+        self.name = name or fn.__name__
+        self.cache = cache
+        self.cache_ttl = cache_ttl
+        self.terminal = terminal
+        hints = typing.get_type_hints(fn, include_extras=True)
+        properties: Dict[str, Any] = {}
+        required: List[str] = []
+        # (name, converter, required, default)
+        self._params: List[Tuple[str, Callable[[Any], Any], bool, Any]] = []
+
+        for param in inspect.signature(fn).parameters.values():
+            if param.kind in (param.VAR_POSITIONAL, param.VAR_KEYWORD):
+                continue
+            annotation, param_description, optional = _unwrap(hints.get(param.name, Any))
+            schema, convert = _compile(annotation, f"{self.name}.{param.name}")
+            if param_description:
+                schema = {**schema, "description": param_description}
+            properties[param.name] = schema
+            is_required = param.default is inspect.Parameter.empty and not optional
+            if is_required:
+                required.append(param.name)
+            if optional:
+                convert = (lambda inner: lambda v: None if v is None else inner(v))(convert)
+            default = None if param.default is inspect.Parameter.empty else param.default
+            self._params.append((param.name, convert, is_required, default))
+
+        doc = inspect.getdoc(fn) or ""
+        self.schema = {
+            "type": "function",
+            "function": {
+                "name": self.name,
+                "description": description or doc.split("\n\n")[0].replace("\n", " "),
+                "parameters": {"type": "object", "properties": properties, "required": required},
+            },
+        }
+
+    def coerce(self, arguments: Dict[str, Any]) -> Dict[str, Any]:
+        """Validate and convert model arguments; unknown keys are dropped."""
+        kwargs = {}
+        for name, convert, required, default in self._params:
+            if name in arguments:
+                kwargs[name] = convert(arguments[name])
+            elif required:
+                raise ToolArgumentError(f"{self.name}: missing required argument '{name}'")
+            else:
+                kwargs[name] = default
+        return kwargs
+
+    def canonical_key(self, arguments: Dict[str, Any]) -> str:
+        """(name, coerced arguments) as canonical JSON: "crisis" and "CRISIS" give the same key."""
+        try:
+            kwargs: Any = self.coerce(arguments)
+        except ToolArgumentError:
+            kwargs = arguments
+        return self.name + ":" + json.dumps(kwargs, sort_keys=True, separators=(",", ":"), default=str)
+
+    def __call__(self, arguments: Dict[str, Any]) -> Any:
+        return self.fn(**self.coerce(arguments))
+
+
+class ToolRegistry:
+    """Name -> Tool map; schemas() returns the same cached list until a tool is added."""
+
+    def __init__(self) -> None:
+        self._tools: Dict[str, Tool] = {}
+        self._schemas: Optional[List[Dict[str, Any]]] = None
+
+    def tool(self, fn: Optional[Callable[..., Any]] = None, *,
+             name: Optional[str] = None,
+             description: Optional[str] = None,
+             cache: str = "never",
+             cache_ttl: float = DEFAULT_CACHE_TTL,
+             terminal: bool = False) -> Any:
+        """Register a function; usable as @registry.tool or @registry.tool(name=..., cache="loop")."""
+        def register(f: Callable[..., Any]) -> Callable[..., Any]:
+            t = Tool(f, name=name, description=description, cache=cache, cache_ttl=cache_ttl, terminal=terminal)
+            self._tools[t.name] = t
+            self._schemas = None
+            return f    # the function itself is unchanged and still callable directly
+        return register(fn) if fn is not None else register
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._tools
+
+    def __len__(self) -> int:
+        return len(self._tools)
+
+    def get(self, name: str) -> Optional[Tool]:
+        return self._tools.get(name)
+
+    def tool_choice(self, name: Optional[str]) -> Any:
+        """tool_choice value that forces one registered tool; None -> "auto"."""
+        if name is None:
+            return "auto"
+        if name not in self._tools:
+            raise KeyError(f"Unknown tool: {name}")
+        return {"type": "function", "function": {"name": name}}
+
+    def schemas(self) -> List[Dict[str, Any]]:
+        """The `tools=` list for chat.completions.create."""
+        if self._schemas is None:
+            self._schemas = [t.schema for t in self._tools.values()]
+        return self._schemas
+
+    def call(self, name: str, arguments: Dict[str, Any]) -> Any:
+        """Run a tool and return its Python result (raises KeyError / ToolArgumentError)."""
+        return self._tools[name](arguments)
+
+    def dispatch(self, name: str, arguments: Dict[str, Any]) -> str:
+        """Run a tool and return the JSON string for the role=tool message; errors become payloads."""
+        t = self._tools.get(name)
+        if t is None:
+            return json.dumps({"error": f"Unknown tool: {name}"})
+        try:
+            return json.dumps(t(arguments))
+        except ToolArgumentError as e:
+            return json.dumps({"error": f"Invalid arguments: {e}"})
+
+
+# -------------------------
+# Benchmark
+# -------------------------
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Tool registry dispatch benchmark.")
+    parser.add_argument("--bench", action="store_true")
+    parser.add_argument("--count", type=int, default=200_000)
+    args = parser.parse_args()
+    if not args.bench:
+        parser.print_help()
+        return
+
+    arguments = {"summary": "Database down", "severity": "crisis", "actions": ["Page on-call"]}
+    for size in (1, 10, 100, 1000):
+        registry = ToolRegistry()
+        for i in range(size):
+            def handler(summary: typing.Annotated[str, "Incident summary"],
+                        severity: typing.Literal["NORMAL", "ALERT", "CRISIS"],
+                        actions: List[str],
+                        note: Optional[str] = None) -> Dict[str, Any]:
+                return {"ok": True}
+            registry.tool(handler, name=f"tool_{i}")
+        target = f"tool_{size - 1}"   # worst case for an if/else chain
+        started = time.perf_counter()
+        for _ in range(args.count):
+            registry.dispatch(target, arguments)
+        per_call = (time.perf_counter() - started) / args.count
+        print(f"[BENCH] {size:>5} tools: {per_call * 1e6:6.2f} us per dispatch (validate + call + json.dumps)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+# Parallel Tool-Call Execution
+
+"""
+demo for:
+- Running every tool_call from one assistant turn at the same time (bounded thread pool)
+- Results come back in the order the model asked for them, ready to append as role=tool messages
+- Per-tool timeouts; a failing or slow tool returns an error payload, its siblings still finish
+- Wall-clock time per turn ≈ the slowest tool, not the sum of all of them
+- async def tools are supported (sync runner: asyncio.run in the worker; async runner: awaited)
+
+Demo:
+    python -m workshop1.tool_runner --demo
+"""
+
+import argparse
+import asyncio
+import contextvars
+import inspect
+import json
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from dataclasses import dataclass
+from typing import List, Dict, Any, Callable, Optional, Tuple
+from types import SimpleNamespace
+
+# -------------------------
+# Configuration
+# -------------------------
+
+DEFAULT_MAX_WORKERS = 8
+DEFAULT_TOOL_TIMEOUT = 30.0       # seconds, per tool call
+
+# Shared pool: tool loops in many threads reuse the same bounded set of workers.
+# A timed-out tool keeps its worker until it returns (threads cannot be killed).
+_executor = ThreadPoolExecutor(max_workers=DEFAULT_MAX_WORKERS, thread_name_prefix="tool-runner")
+
+
+@dataclass
+class ToolOutcome:
+    """One executed tool call."""
+    tool_call_id: str
+    name: str
+    arguments: Dict[str, Any]
+    content: str                  # JSON string sent back to the model
+    ok: bool
+    elapsed: float
+
+    def message(self) -> Dict[str, Any]:
+        return {"role": "tool", "tool_call_id": self.tool_call_id, "content": self.content}
+
+
+def _error_payload(name: str, message: str) -> str:
+    return json.dumps({"error": message, "tool": name})
+
+
+def is_error_payload(content: str) -> bool:
+    """True for an {"error": ...} result: a failed tool, or ToolRegistry.dispatch rejecting the arguments."""
+    try:
+        data = json.loads(content)
+    except ValueError:
+        return False
+    return isinstance(data, dict) and "error" in data
+
+
+def _result_content(result: Any) -> Tuple[str, bool]:
+    """(content, ok) for a tool's return value; an error payload it returned counts as a failure."""
+    content = result if isinstance(result, str) else json.dumps(result)
+    return content, not is_error_payload(content)
+
+
+def _invoke(handler: Callable[[str, Dict[str, Any]], Any], name: str, raw_arguments: str) -> Dict[str, Any]:
+    """Parse arguments and run one tool; never raises."""
+    started = time.perf_counter()
+    arguments: Dict[str, Any] = {}
+    try:
+        arguments = json.loads(raw_arguments or "{}")
+        result = handler(name, arguments)
+        if inspect.isawaitable(result):
+            result = asyncio.run(result)
+        content, ok = _result_content(result)
+    except Exception as e:
+        content, ok = _error_payload(name, f"{type(e).__name__}: {e}"), False
+    return {"arguments": arguments, "content": content, "ok": ok, "elapsed": time.perf_counter() - started}
+
+
+def _timeout_for(name: str, timeout: float, timeouts: Optional[Dict[str, float]]) -> float:
+    return (timeouts or {}).get(name, timeout)
+
+
+def submit_tool_call(handler: Callable[[str, Dict[str, Any]], Any],
+                     name: str,
+                     raw_arguments: str,
+                     executor: Optional[ThreadPoolExecutor] = None) -> "Future[Dict[str, Any]]":
+    """Start one tool call on the pool; pass the future to collect_outcome()."""
+    # copy_context(): telemetry spans opened by the handler join the caller's trace
+    return (executor or _executor).submit(contextvars.copy_context().run, _invoke, handler, name, raw_arguments)
+
+
+def collect_outcome(tool_call_id: str, name: str, future: "Future[Dict[str, Any]]",
+                    deadline: float, limit: float) -> ToolOutcome:
+    """Wait for a submitted call until deadline (time.perf_counter() value); a timeout becomes an error payload."""
+    try:
+        r = future.result(timeout=max(0.0, deadline - time.perf_counter()))
+    except FutureTimeout:
+        future.cancel()
+        r = {"arguments": {}, "content": _error_payload(name, f"Tool timed out after {limit:g}s"),
+             "ok": False, "elapsed": limit}
+    return ToolOutcome(tool_call_id, name, r["arguments"], r["content"], r["ok"], r["elapsed"])
+
+
+# -------------------------
+# Runners
+# -------------------------
+
+def run_tool_calls(tool_calls: List[Any],
+                   handler: Callable[[str, Dict[str, Any]], Any],
+                   timeout: float = DEFAULT_TOOL_TIMEOUT,
+                   timeouts: Optional[Dict[str, float]] = None,
+                   executor: Optional[ThreadPoolExecutor] = None) -> List[ToolOutcome]:
+    """
+    Run one turn's tool calls concurrently and return outcomes in the original order.
+    handler(name, arguments) returns a JSON string (or a JSON-able object);
+    timeouts maps tool name -> seconds, overriding the default timeout.
+    """
+    started = time.perf_counter()
+    futures = [submit_tool_call(handler, tc.function.name, tc.function.arguments, executor) for tc in tool_calls]
+
+    outcomes: List[ToolOutcome] = []
+    for tc, future in zip(tool_calls, futures):
+        limit = _timeout_for(tc.function.name, timeout, timeouts)
+        outcomes.append(collect_outcome(tc.id, tc.function.name, future, started + limit, limit))
+    return outcomes
+
+
+async def arun_tool_calls(tool_calls: List[Any],
+                          handler: Callable[[str, Dict[str, Any]], Any],
+                          timeout: float = DEFAULT_TOOL_TIMEOUT,
+                          timeouts: Optional[Dict[str, float]] = None) -> List[ToolOutcome]:
+    """Async twin: async handlers are awaited, sync ones run in a thread; gather keeps the order."""
+
+    async def one(tc: Any) -> ToolOutcome:
+        name = tc.function.name
+        limit = _timeout_for(name, timeout, timeouts)
+        started = time.perf_counter()
+        try:
+            arguments = json.loads(tc.function.arguments or "{}")
+        except ValueError as e:
+            return ToolOutcome(tc.id, name, {}, _error_payload(name, f"Invalid arguments: {e}"), False, 0.0)
+        try:
+            if inspect.iscoroutinefunction(handler):
+                result = await asyncio.wait_for(handler(name, arguments), limit)
+            else:
+                result = await asyncio.wait_for(asyncio.to_thread(handler, name, arguments), limit)
+            content, ok = _result_content(result)
+        except asyncio.TimeoutError:
+            content, ok = _error_payload(name, f"Tool timed out after {limit:g}s"), False
+        except Exception as e:
+            content, ok = _error_payload(name, f"{type(e).__name__}: {e}"), False
+        return ToolOutcome(tc.id, name, arguments, content, ok, time.perf_counter() - started)
+
+    return list(await asyncio.gather(*(one(tc) for tc in tool_calls)))
+
+
+# -------------------------
+# Demo
+# -------------------------
+
+def _fake_call(call_id: str, name: str, arguments: Dict[str, Any]) -> Any:
+    """Same shape as openai's ChatCompletionMessageToolCall."""
+    return SimpleNamespace(id=call_id, function=SimpleNamespace(name=name, arguments=json.dumps(arguments)))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Parallel tool-call runner demo.")
+    parser.add_argument("--demo", action="store_true")
+    args = parser.parse_args()
+    if not args.demo:
+        parser.print_help()
+        return
+
+    def handler(name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
+        if name == "broken_tool":
+            raise RuntimeError("downstream API returned 500")
+        time.sleep(arguments["seconds"])
+        return {"tool": name, "slept": arguments["seconds"]}
+
+    calls = [
+        _fake_call("call_1", "lookup_user", {"seconds": 0.3}),
+        _fake_call("call_2", "check_dashboards", {"seconds": 0.5}),
+        _fake_call("call_3", "broken_tool", {}),
+        _fake_call("call_4", "slow_tool", {"seconds": 3}),
+        _fake_call("call_5", "create_ticket", {"seconds": 0.2}),
+    ]
+    started = time.perf_counter()
+    outcomes = run_tool_calls(calls, handler, timeouts={"slow_tool": 1.0})
+    wall = time.perf_counter() - started
+    for o in outcomes:
+        print(f"[TOOL] {o.tool_call_id} {o.name:<17} ok={o.ok!s:<5} {o.elapsed:5.2f}s  {o.content}")
+    print(f"[TOOL] Wall clock {wall:.2f}s (sequential would be ≥ {0.3 + 0.5 + 1.0 + 0.2:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
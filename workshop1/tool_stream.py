@@ -0,0 +1,207 @@
+# Streaming Tool Calls with Early Dispatch
+
+"""
+demo for:
+- stream=True on tool-calling requests: tool_calls[i].function.arguments arrive as string deltas
+- Each call's argument JSON is scanned incrementally (stream_json) as it arrives
+- A tool starts on the tool_runner pool the moment its arguments are complete,
+  while later tool calls (or the rest of the response) are still streaming
+- The assembled turn has the same shape as a non-streamed message: content, tool_calls, outcomes
+
+    turn = stream_tool_turn(client.chat.completions.create(..., tools=TOOLS, stream=True), run_tool)
+    messages.append(turn.assistant_message())
+    messages.extend(o.message() for o in turn.outcomes)
+
+Demo (local mock server, 3 tool calls per turn; tools after the whole turn vs early dispatch):
+    python -m workshop1.tool_stream --demo
+"""
+
+import argparse
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import List, Dict, Any, Callable, Iterable, Optional
+from types import SimpleNamespace
+from workshop1.stream_json import IncrementalJSONObjectParser
+from workshop1.tool_runner import (
+    DEFAULT_TOOL_TIMEOUT, ToolOutcome, collect_outcome, run_tool_calls, submit_tool_call, _timeout_for,
+)
+
+
+# -------------------------
+# Assembly
+# -------------------------
+
+class _PendingCall:
+    """One tool call being assembled from deltas."""
+
+    def __init__(self, index: int) -> None:
+        self.index = index
+        self.id = ""
+        self.name = ""
+        self.parser = IncrementalJSONObjectParser()
+        self.future: Optional["Future[Dict[str, Any]]"] = None
+        self.dispatched_at: Optional[float] = None
+
+    def as_tool_call(self) -> Any:
+        """Same shape as openai's ChatCompletionMessageToolCall."""
+        return SimpleNamespace(id=self.id, type="function",
+                               function=SimpleNamespace(name=self.name, arguments=self.parser.text))
+
+
+@dataclass
+class StreamedTurn:
+    """One streamed assistant turn with its (already running or finished) tools."""
+    content: str = ""
+    tool_calls: List[Any] = field(default_factory=list)
+    outcomes: List[ToolOutcome] = field(default_factory=list)
+    finish_reason: Optional[str] = None
+    usage: Any = None
+    stream_seconds: float = 0.0
+    dispatch_seconds: Dict[str, float] = field(default_factory=dict)   # tool_call_id -> seconds after request
+
+    def assistant_message(self) -> Dict[str, Any]:
+        return {
+            "role": "assistant",
+            "content": self.content,
+            "tool_calls": [
+                {"id": tc.id, "type": "function",
+                 "function": {"name": tc.function.name, "arguments": tc.function.arguments}}
+                for tc in self.tool_calls
+            ],
+        }
+
+
+def stream_tool_turn(stream: Iterable[Any],
+                     handler: Callable[[str, Dict[str, Any]], Any],
+                     dispatch: bool = True,
+                     timeout: float = DEFAULT_TOOL_TIMEOUT,
+                     timeouts: Optional[Dict[str, float]] = None,
+                     executor: Optional[ThreadPoolExecutor] = None,
+                     on_dispatch: Optional[Callable[[Any], None]] = None,
+                     started: Optional[float] = None) -> StreamedTurn:
+    """
+    Consume a chat.completions stream, starting each tool call as soon as its arguments
+    are a complete JSON object. Calls whose arguments never complete (truncated stream,
+    malformed JSON) start when the stream ends, so the runner reports the error.
+    dispatch=False only assembles the turn (outcomes stay empty).
+    started: perf_counter() when the request was sent (for dispatch_seconds).
+    """
+    started = time.perf_counter() if started is None else started
+    turn = StreamedTurn()
+    pending: Dict[int, _PendingCall] = {}
+    content: List[str] = []
+
+    def start(call: _PendingCall) -> None:
+        call.dispatched_at = time.perf_counter()
+        call.future = submit_tool_call(handler, call.name, call.parser.text, executor)
+        turn.dispatch_seconds[call.id] = call.dispatched_at - started
+        if on_dispatch is not None:
+            on_dispatch(call.as_tool_call())
+
+    for chunk in stream:
+        if getattr(chunk, "usage", None) is not None:
+            turn.usage = chunk.usage
+        # Azure sends a content-filter chunk with no choices first
+        if not chunk.choices:
+            continue
+        choice = chunk.choices[0]
+        turn.finish_reason = choice.finish_reason or turn.finish_reason
+        delta = choice.delta
+        if delta is None:
+            continue
+        if delta.content:
+            content.append(delta.content)
+        for tc in delta.tool_calls or []:
+            call = pending.get(tc.index)
+            if call is None:
+                call = pending[tc.index] = _PendingCall(tc.index)
+            # id and name come once, in the first delta of each call
+            if tc.id:
+                call.id = tc.id
+            if tc.function is not None:
+                if tc.function.name:
+                    call.name += tc.function.name
+                if tc.function.arguments:
+                    call.parser.feed(tc.function.arguments)
+            if dispatch and call.future is None and call.parser.done:
+                start(call)
+    turn.stream_seconds = time.perf_counter() - started
+
+    calls = [pending[i] for i in sorted(pending)]
+    turn.content = "".join(content)
+    turn.tool_calls = [c.as_tool_call() for c in calls]
+    if not dispatch:
+        return turn
+
+    for call in calls:
+        if call.future is None:
+            start(call)
+    for call in calls:
+        limit = _timeout_for(call.name, timeout, timeouts)
+        turn.outcomes.append(collect_outcome(call.id, call.name, call.future, call.dispatched_at + limit, limit))
+    return turn
+
+
+# -------------------------
+# Demo
+# -------------------------
+
+def _demo_tools() -> List[Dict[str, Any]]:
+    def schema(name: str, description: str) -> Dict[str, Any]:
+        return {"type": "function", "function": {
+            "name": name, "description": description,
+            "parameters": {"type": "object", "required": ["summary", "severity"], "properties": {
+                "summary": {"type": "string"},
+                "severity": {"type": "string", "enum": ["NORMAL", "ALERT", "CRISIS"]},
+                "actions": {"type": "array", "items": {"type": "string"}}}}}}
+    return [schema("escalate_crisis", "Page the on-call team."),
+            schema("open_bridge", "Open a major-incident bridge."),
+            schema("update_status_page", "Post a status page update.")]
+
+
+def main() -> None:
+    from openai import OpenAI
+    from workshop1.mock_openai_server import start_mock_server
+
+    parser = argparse.ArgumentParser(description="Streaming tool-call assembly demo (local mock server).")
+    parser.add_argument("--demo", action="store_true")
+    parser.add_argument("--token-delay", type=float, default=0.01, help="mock seconds between chunks")
+    parser.add_argument("--tool-seconds", type=float, default=0.3, help="simulated tool latency")
+    args = parser.parse_args()
+    if not args.demo:
+        parser.print_help()
+        return
+
+    server = start_mock_server(latency="fixed:0.05", token_delay=args.token_delay, tool_calls_per_turn=3)
+    client = OpenAI(base_url=server.url + "/v1", api_key="mock")
+    request = dict(model="mock", tools=_demo_tools(), tool_choice="auto",
+                   messages=[{"role": "user", "content": "Production database down, all users affected"}])
+    first_tool: Dict[str, float] = {}
+
+    def handler(name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
+        first_tool.setdefault("at", time.perf_counter())
+        time.sleep(args.tool_seconds)
+        return {"tool": name, "ok": True}
+
+    # Baseline: same generation time, but tools wait for the complete message (like stream=False)
+    started = time.perf_counter()
+    turn = stream_tool_turn(client.chat.completions.create(stream=True, **request), handler, dispatch=False)
+    run_tool_calls(turn.tool_calls, handler)
+    blocking = (first_tool["at"] - started, time.perf_counter() - started)
+
+    first_tool.clear()
+    started = time.perf_counter()
+    turn = stream_tool_turn(client.chat.completions.create(stream=True, **request), handler, started=started)
+    streaming = (first_tool["at"] - started, time.perf_counter() - started)
+
+    for call in turn.tool_calls:
+        print(f"[STREAM] {call.function.name:<19} dispatched at {turn.dispatch_seconds[call.id] * 1000:5.0f} ms "
+              f"(stream ended at {turn.stream_seconds * 1000:.0f} ms)")
+    print(f"[DEMO] whole turn first: first tool started {blocking[0] * 1000:5.0f} ms, turn done {blocking[1] * 1000:5.0f} ms")
+    print(f"[DEMO] early dispatch  : first tool started {streaming[0] * 1000:5.0f} ms, turn done {streaming[1] * 1000:5.0f} ms")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()